@@ -0,0 +1,6 @@
+"""Lightweight monitoring agent for remote hosts.
+
+Runs with ``python -m agent`` and depends on psutil and the standard
+library only: nothing in this package may import Flask, SQLAlchemy or any
+other web-app dependency. The web app imports the collectors from here.
+"""
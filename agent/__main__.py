@@ -0,0 +1,95 @@
+"""Command-line entry point: ``python -m agent``."""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+
+from agent.client import IngestClient
+from agent.collectors import collect_metrics, collect_sample, collectors
+from agent.cpu import CpuSampler
+from agent.runner import Agent
+from agent.server import SnapshotCache, make_server
+from agent.spool import MemorySpool, RingLog
+
+DEFAULT_SPOOL = os.path.join(os.path.expanduser('~'), '.system-monitor-agent', 'spool.ring')
+
+
+def parse_args(argv=None):
+    env = os.environ.get
+    parser = argparse.ArgumentParser(prog='agent', description='System Monitor agent')
+    parser.add_argument('--server-url', default=env('CENTRAL_SERVER_URL'),
+                        help='Central dashboard URL to push samples to')
+    parser.add_argument('--api-key', default=env('AGENT_API_KEY'),
+                        help="This server's API key from the dashboard")
+    parser.add_argument('--interval', type=float, default=float(env('AGENT_INTERVAL', 5)),
+                        help='Seconds between samples')
+    parser.add_argument('--push-interval', type=float, default=float(env('AGENT_PUSH_INTERVAL', 30)),
+                        help='Seconds between pushes')
+    parser.add_argument('--spool', default=env('AGENT_SPOOL_PATH', DEFAULT_SPOOL),
+                        help='Ring log file holding samples until delivered (memory only if empty)')
+    parser.add_argument('--spool-size-mb', type=int, default=int(env('AGENT_SPOOL_SIZE_MB', 16)),
+                        help='Size of the ring log; the oldest samples are overwritten when full')
+    parser.add_argument('--replay-rate', type=float, default=float(env('AGENT_REPLAY_RATE', 50)),
+                        help='Maximum samples per second sent to the server')
+    parser.add_argument('--connections-max-age', type=float,
+                        default=float(env('AGENT_CONNECTIONS_MAX_AGE', 30)),
+                        help='Seconds a socket table scan is reused for connection counts')
+    parser.add_argument('--listen', default=env('AGENT_LISTEN', ''),
+                        help='host:port to serve /api/metrics on for pull mode (disabled if empty)')
+    parser.add_argument('--once', action='store_true',
+                        help='Print one sample as JSON and exit')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    collectors.configure(connections=args.connections_max_age)
+
+    if args.once:
+        json.dump(collect_sample(CpuSampler()), sys.stdout)
+        sys.stdout.write('\n')
+        return 0
+
+    if not args.api_key:
+        print('AGENT_API_KEY (or --api-key) is required', file=sys.stderr)
+        return 2
+    if not args.server_url and not args.listen:
+        print('Set CENTRAL_SERVER_URL to push and/or AGENT_LISTEN to serve /api/metrics', file=sys.stderr)
+        return 2
+
+    client = IngestClient(args.server_url, args.api_key) if args.server_url else None
+    spool = RingLog(args.spool, args.spool_size_mb * 1024 * 1024) if args.spool and client else MemorySpool()
+    if len(spool):
+        logging.getLogger(__name__).info(f"Replaying {len(spool)} spooled samples")
+    agent = Agent(client, interval=args.interval, push_interval=args.push_interval,
+                  spool=spool, replay_rate=args.replay_rate)
+
+    server = None
+    if args.listen:
+        host, _, port = args.listen.rpartition(':')
+        routes = {
+            # Dashboard live view
+            '/api/metrics': SnapshotCache(collect_metrics),
+            # One ingest-format sample for the dashboard's remote poller
+            '/api/sample': SnapshotCache(lambda cpu=CpuSampler(): collect_sample(cpu)),
+        }
+        server = make_server((host or '0.0.0.0', int(port)), args.api_key, routes)
+        threading.Thread(target=server.serve_forever, name='agent-http', daemon=True).start()
+
+    signal.signal(signal.SIGTERM, lambda *_: agent.stop())
+    try:
+        agent.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server is not None:
+            server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""Push samples to the central server's ingest endpoint."""
+import gzip
+import json
+import urllib.request
+
+
+class IngestClient:
+    """POST batches of samples to ``/api/ingest`` as gzip-compressed JSON."""
+
+    def __init__(self, server_url, api_key, timeout=10):
+        self.url = server_url.rstrip('/') + '/api/ingest'
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def send(self, samples):
+        """
+        Send one batch.
+
+        Returns:
+            dict: The server's response
+
+        Raises:
+            OSError: On network errors or a non-2xx response (urllib's HTTPError is an OSError)
+        """
+        body = gzip.compress(json.dumps({'samples': samples}, separators=(',', ':')).encode())
+        request = urllib.request.Request(self.url, data=body, method='POST', headers={
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+            'X-API-Key': self.api_key
+        })
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read() or b'{}')
@@ -0,0 +1,332 @@
+"""psutil collectors shared by the agent and the web app."""
+import threading
+import time
+
+import psutil
+
+from agent.cpu import CpuSampler
+from agent.formatting import get_size
+
+# Network filesystems whose usage is never queried (a stale mount hangs statvfs)
+REMOTE_FSTYPES = {'nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'sshfs', 'fuse.sshfs', '9p', 'ceph', 'glusterfs'}
+
+
+def read_cpu_temp():
+    """Return the CPU package temperature in Celsius, or None if unavailable."""
+    try:
+        temps = psutil.sensors_temperatures()
+    except Exception:
+        return None
+    for sensor in ('coretemp', 'cpu_thermal', 'k10temp'):
+        if temps.get(sensor):
+            return temps[sensor][0].current
+    return None
+
+
+def count_connections():
+    """Count inet connections by state."""
+    try:
+        connections = psutil.net_connections(kind='inet')
+    except Exception:
+        return {'established': 0, 'listen': 0, 'time_wait': 0, 'total': 0}
+    return {
+        'established': sum(1 for c in connections if c.status == 'ESTABLISHED'),
+        'listen': sum(1 for c in connections if c.status == 'LISTEN'),
+        'time_wait': sum(1 for c in connections if c.status == 'TIME_WAIT'),
+        'total': len(connections)
+    }
+
+
+def collect_cpu(cpu_sampler):
+    """CPU utilisation since ``cpu_sampler``'s previous sample, frequency and temperature."""
+    cpu = cpu_sampler.sample()
+    cpu_freq = psutil.cpu_freq()
+    cpu_freq_current = cpu_freq.current if cpu_freq else 0
+
+    cpu_temp_c = read_cpu_temp()
+    cpu_temp_f = (cpu_temp_c * 9/5) + 32 if cpu_temp_c is not None else None
+
+    return {
+        'percent': cpu['percent'],
+        'freq': f"{cpu_freq_current:.2f}Mhz",
+        'temp_c': cpu_temp_c,
+        'temp_f': cpu_temp_f,
+        'per_core': cpu['per_core'],
+        'iowait': cpu['iowait'],
+        'steal': cpu['steal']
+    }
+
+
+def collect_memory():
+    """Virtual memory and swap usage."""
+    svmem = psutil.virtual_memory()
+    swap = psutil.swap_memory()
+    return {
+        'total': get_size(svmem.total),
+        'available': get_size(svmem.available),
+        'used': get_size(svmem.used),
+        'percent': svmem.percent,
+        'swap_total': get_size(swap.total),
+        'swap_used': get_size(swap.used),
+        'swap_free': get_size(swap.free),
+        'swap_percent': swap.percent
+    }
+
+
+def collect_disk_usage():
+    """
+    Usage of every local partition.
+
+    Network filesystems are skipped: ``statvfs`` on a stale mount blocks
+    until the server answers, which can be forever.
+    """
+    disk_usage_info = []
+    for partition in psutil.disk_partitions():
+        if partition.fstype in REMOTE_FSTYPES:
+            continue
+        try:
+            partition_usage = psutil.disk_usage(partition.mountpoint)
+        except PermissionError:
+            continue
+        disk_usage_info.append({
+            'device': partition.device,
+            'mountpoint': partition.mountpoint,
+            'total': get_size(partition_usage.total),
+            'used': get_size(partition_usage.used),
+            'free': get_size(partition_usage.free),
+            'percent': partition_usage.percent
+        })
+    return disk_usage_info
+
+
+def collect_disk_io():
+    """Cumulative disk I/O counters."""
+    disk_io = psutil.disk_io_counters()
+    return {
+        'read_bytes': get_size(disk_io.read_bytes),
+        'write_bytes': get_size(disk_io.write_bytes),
+        'read_bytes_raw': disk_io.read_bytes,
+        'write_bytes_raw': disk_io.write_bytes,
+        'read_count': disk_io.read_count,
+        'write_count': disk_io.write_count
+    }
+
+
+def collect_network_io():
+    """Cumulative network I/O counters."""
+    net_io = psutil.net_io_counters()
+    return {
+        'bytes_sent': get_size(net_io.bytes_sent),
+        'bytes_recv': get_size(net_io.bytes_recv),
+        'bytes_sent_raw': net_io.bytes_sent,
+        'bytes_recv_raw': net_io.bytes_recv,
+        'packets_sent': net_io.packets_sent,
+        'packets_recv': net_io.packets_recv
+    }
+
+
+class Collector:
+    """One registered collector with its last result and cost counters."""
+
+    def __init__(self, name, collect, max_age=0.0):
+        self.name = name
+        self.collect = collect
+        self.max_age = max_age
+        self.value = None
+        self.collected_at = None
+        self.calls = 0
+        self.reused = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.last_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def stats(self):
+        return {
+            'max_age': self.max_age,
+            'calls': self.calls,
+            'reused': self.reused,
+            'errors': self.errors,
+            'total_seconds': round(self.total_seconds, 6),
+            'avg_seconds': round(self.total_seconds / self.calls, 6) if self.calls else None,
+            'last_seconds': round(self.last_seconds, 6),
+            'max_seconds': round(self.max_seconds, 6)
+        }
+
+
+class CollectorRegistry:
+    """
+    Named collectors, one per top-level key of the ``/api/metrics`` payload.
+
+    Callers ask for the keys they need and only those collectors run. A
+    collector registered with ``max_age`` reuses its previous result for that
+    many seconds, so expensive scans (the socket table, every mounted
+    filesystem) can run less often than cheap counters. Every run is timed.
+    """
+
+    def __init__(self):
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    @property
+    def names(self):
+        return list(self._collectors)
+
+    def register(self, name, collect, max_age=0.0):
+        """Add (or replace) the collector filling ``name``."""
+        self._collectors[name] = Collector(name, collect, max_age)
+
+    def configure(self, **max_ages):
+        """Change the ``max_age`` of registered collectors by name."""
+        for name, max_age in max_ages.items():
+            self._collectors[name].max_age = max_age
+
+    def collect(self, names=None, max_age=None):
+        """
+        Run the requested collectors (all by default).
+
+        Args:
+            names: Collector names; unknown names raise KeyError
+            max_age: Seconds a previous result may be reused, overriding each
+                collector's own ``max_age``
+
+        Returns:
+            dict: ``{name: result}`` in registration order
+        """
+        names = set(self._collectors if names is None else names)
+        unknown = names - set(self._collectors)
+        if unknown:
+            raise KeyError(f"Unknown collectors: {', '.join(sorted(unknown))}")
+        return {name: self._run(collector, max_age) for name, collector in self._collectors.items() if name in names}
+
+    def _run(self, collector, max_age=None):
+        if max_age is None:
+            max_age = collector.max_age
+        now = time.monotonic()
+        with self._lock:
+            if collector.collected_at is not None and now - collector.collected_at < max_age:
+                collector.reused += 1
+                return collector.value
+
+        started = time.perf_counter()
+        try:
+            value = collector.collect()
+        except Exception:
+            with self._lock:
+                collector.errors += 1
+            raise
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            collector.calls += 1
+            collector.total_seconds += elapsed
+            collector.last_seconds = elapsed
+            collector.max_seconds = max(collector.max_seconds, elapsed)
+            collector.value = value
+            collector.collected_at = now
+        return value
+
+    def stats(self):
+        """Cost counters of every collector."""
+        with self._lock:
+            return {name: collector.stats() for name, collector in self._collectors.items()}
+
+
+def metrics_registry(cpu_sampler, connections_max_age=0.0, disk_max_age=0.0):
+    """
+    Registry of the ``/api/metrics`` collectors.
+
+    Args:
+        cpu_sampler: CpuSampler owned by the caller; utilisation covers the
+            time since its previous sample
+        connections_max_age: Seconds a socket table count is reused
+        disk_max_age: Seconds partition usage is reused
+    """
+    registry = CollectorRegistry()
+    registry.register('cpu', lambda: collect_cpu(cpu_sampler))
+    registry.register('memory', collect_memory)
+    registry.register('disk', collect_disk_usage, max_age=disk_max_age)
+    registry.register('io', collect_disk_io)
+    registry.register('network', collect_network_io)
+    registry.register('connections', count_connections, max_age=connections_max_age)
+    return registry
+
+
+# Process-wide /api/metrics collectors: their max_age caches and cost
+# counters are shared by every caller in the process
+collectors = metrics_registry(CpuSampler())
+
+
+def collect_metrics(fields=None):
+    """
+    Collect real-time metrics in the ``/api/metrics`` format.
+
+    CPU utilisation covers the time since the previous call.
+
+    Args:
+        fields: Top-level keys to collect (default: all)
+    """
+    return collectors.collect(fields)
+
+
+def collect_system(cpu_sampler):
+    """Collect one ``system_metrics`` row (without server_id/timestamp)."""
+    cpu = cpu_sampler.sample()
+    cpu_freq = psutil.cpu_freq()
+    svmem = psutil.virtual_memory()
+    disk_usage = psutil.disk_usage('/')
+    disk_io = psutil.disk_io_counters()
+
+    row = {
+        'cpu_percent': cpu['percent'],
+        'cpu_iowait': cpu['iowait'],
+        'cpu_steal': cpu['steal'],
+        'cpu_freq': cpu_freq.current if cpu_freq else None,
+        'cpu_temp_c': read_cpu_temp(),
+        'memory_total': svmem.total,
+        'memory_used': svmem.used,
+        'memory_percent': svmem.percent,
+        'disk_total': disk_usage.total,
+        'disk_used': disk_usage.used,
+        'disk_percent': disk_usage.percent
+    }
+    # disk_io_counters() returns None on hosts without disks (e.g. some containers)
+    if disk_io is not None:
+        row.update({
+            'io_read_bytes': disk_io.read_bytes,
+            'io_write_bytes': disk_io.write_bytes,
+            'io_read_count': disk_io.read_count,
+            'io_write_count': disk_io.write_count
+        })
+    return row
+
+
+def collect_network(connections_max_age=None):
+    """
+    Collect one ``network_metrics`` row (without server_id/timestamp).
+
+    The connection counts go through the shared ``connections`` collector, so
+    a socket table scan from the last ``connections_max_age`` seconds (by
+    default the collector's own ``max_age``) is reused instead of walking
+    every socket again.
+    """
+    net_io = psutil.net_io_counters()
+    connections = collectors.collect(['connections'], max_age=connections_max_age)['connections']
+    return {
+        'bytes_sent': net_io.bytes_sent,
+        'bytes_recv': net_io.bytes_recv,
+        'packets_sent': net_io.packets_sent,
+        'packets_recv': net_io.packets_recv,
+        'connections_established': connections['established'],
+        'connections_listen': connections['listen'],
+        'connections_time_wait': connections['time_wait']
+    }
+
+
+def collect_sample(cpu_sampler):
+    """Collect one sample in the ``POST /api/ingest`` format."""
+    return {
+        'timestamp': round(time.time(), 3),
+        'system': collect_system(cpu_sampler),
+        'network': collect_network()
+    }
@@ -0,0 +1,91 @@
+"""Non-blocking CPU utilisation sampling based on ``cpu_times`` deltas."""
+import threading
+
+import psutil
+
+
+def _total_time(times):
+    """Total CPU time, excluding guest time already counted in user/nice."""
+    total = sum(times)
+    total -= getattr(times, 'guest', 0)
+    total -= getattr(times, 'guest_nice', 0)
+    return total
+
+
+def _busy_time(times):
+    """Time spent doing work (neither idle nor waiting on I/O)."""
+    return _total_time(times) - times.idle - getattr(times, 'iowait', 0)
+
+
+def _percent(part, whole):
+    if whole <= 0:
+        return 0.0
+    return round(min(100.0, max(0.0, part / whole * 100)), 1)
+
+
+def _utilisation(previous, current):
+    """
+    Compute utilisation between two ``cpu_times`` readings.
+
+    Returns:
+        tuple: (busy_percent, {field: percent}) for the interval
+    """
+    if previous is None:
+        # First reading: report averages since boot instead of a meaningless 0
+        deltas = current
+    else:
+        deltas = type(current)(*(max(0.0, c - p) for c, p in zip(current, previous)))
+
+    total = _total_time(deltas)
+    busy = _percent(_busy_time(deltas), total)
+    breakdown = {field: _percent(getattr(deltas, field), total) for field in deltas._fields}
+    return busy, breakdown
+
+
+class CpuSampler:
+    """
+    Compute CPU utilisation between successive calls.
+
+    Unlike ``psutil.cpu_percent(interval=1)`` this never sleeps: each call
+    reads the cumulative ``cpu_times`` counters and diffs them against the
+    previous call, so sampling costs microseconds and the result covers the
+    whole interval since the last tick.
+    """
+
+    def __init__(self):
+        self._last_total = None
+        self._last_per_core = None
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """
+        Sample CPU utilisation since the previous call.
+
+        Returns:
+            dict: percent, per_core, iowait, steal and the full per-state breakdown
+        """
+        total = psutil.cpu_times()
+        per_core = psutil.cpu_times(percpu=True)
+
+        with self._lock:
+            percent, breakdown = _utilisation(self._last_total, total)
+
+            last_per_core = self._last_per_core
+            if last_per_core is None or len(last_per_core) != len(per_core):
+                # CPU hotplug or first call: no usable previous reading
+                last_per_core = [None] * len(per_core)
+            per_core_percent = [
+                _utilisation(previous, current)[0]
+                for previous, current in zip(last_per_core, per_core)
+            ]
+
+            self._last_total = total
+            self._last_per_core = per_core
+
+        return {
+            'percent': percent,
+            'per_core': per_core_percent,
+            'iowait': breakdown.get('iowait'),
+            'steal': breakdown.get('steal'),
+            'times_percent': breakdown
+        }
@@ -0,0 +1,10 @@
+"""Formatting helpers shared by routes and collectors."""
+
+
+def get_size(bytes, suffix="B"):
+    """Scale bytes to its proper format (e.g., 1253656 => '1.20MB')."""
+    factor = 1024
+    for unit in ["", "K", "M", "G", "T", "P"]:
+        if bytes < factor:
+            return f"{bytes:.2f}{unit}{suffix}"
+        bytes /= factor
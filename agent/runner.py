@@ -0,0 +1,127 @@
+"""Agent main loop: sample on an interval and push batches."""
+import json
+import logging
+import random
+import threading
+import time
+
+from agent.collectors import collect_sample
+from agent.cpu import CpuSampler
+from agent.spool import MemorySpool
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket: ``rate`` tokens per second, holding at most ``burst``."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def available(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return int(self._tokens)
+
+    def take(self, count):
+        self._tokens -= count
+
+
+class Agent:
+    """
+    Sample the host every ``interval`` seconds and push what accumulated
+    every ``push_interval`` seconds, at most ``max_batch`` samples per request.
+
+    Samples go to ``spool`` (a RingLog on disk, or memory) first and are only
+    removed once the server accepted them, so an outage just grows the
+    backlog. Delivery is capped at ``replay_rate`` samples per second and
+    failed pushes back off exponentially with jitter, so a fleet coming back
+    after a partition drains its backlog gradually instead of all at once.
+    """
+
+    def __init__(self, client=None, interval=5.0, push_interval=30.0, max_batch=500,
+                 spool=None, replay_rate=50.0, max_backoff=600.0):
+        self.client = client
+        self.interval = interval
+        self.push_interval = push_interval
+        self.max_batch = max_batch
+        self.max_backoff = max_backoff
+        self.spool = spool if spool is not None else MemorySpool()
+        self.limiter = RateLimiter(replay_rate, max(max_batch, replay_rate * push_interval))
+        self.failures = 0
+        self.cpu_sampler = CpuSampler()
+        self._stop_event = threading.Event()
+
+    def tick(self):
+        """Take one sample and spool it."""
+        sample = collect_sample(self.cpu_sampler)
+        self.spool.append(json.dumps(sample, separators=(',', ':')).encode())
+
+    def push(self):
+        """
+        Push spooled samples in batches, within the replay rate, until the
+        spool is empty or a push fails.
+
+        Returns:
+            int: Number of samples delivered
+        """
+        sent = 0
+        while len(self.spool):
+            limit = min(self.max_batch, self.limiter.available())
+            if limit <= 0:
+                break
+            payloads = self.spool.peek(limit)
+            if not payloads:
+                break
+            try:
+                self.client.send([json.loads(payload) for payload in payloads])
+            except (OSError, ValueError) as e:
+                self.failures += 1
+                logger.warning(f"Push failed, {len(self.spool)} samples spooled: {e}")
+                break
+            self.spool.commit(len(payloads))
+            self.limiter.take(len(payloads))
+            self.failures = 0
+            sent += len(payloads)
+        return sent
+
+    def next_push_delay(self):
+        """Seconds until the next push: the push interval, or a jittered backoff after failures."""
+        if not self.failures:
+            return self.push_interval
+        backoff = min(self.max_backoff, self.push_interval * 2 ** (self.failures - 1))
+        return backoff * random.uniform(0.5, 1.5)
+
+    def run(self):
+        """Loop until ``stop`` is called."""
+        if self.client is None:
+            # Pull mode only: the HTTP server samples on demand
+            self._stop_event.wait()
+            return
+
+        # Spread the first push of agents started together (e.g. after a fleet-wide outage)
+        next_push = time.monotonic() + self.push_interval * random.uniform(0.5, 1.0)
+        next_tick = time.monotonic()
+        while not self._stop_event.wait(max(0.0, next_tick - time.monotonic())):
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Error collecting sample: {e}")
+            next_tick += self.interval
+
+            if time.monotonic() >= next_push:
+                self.push()
+                self.spool.flush()
+                next_push = time.monotonic() + self.next_push_delay()
+
+        # Deliver what is left on a clean shutdown; the spool keeps the rest
+        if len(self.spool):
+            self.push()
+        self.spool.close()
+
+    def stop(self):
+        self._stop_event.set()
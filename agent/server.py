@@ -0,0 +1,57 @@
+"""Minimal HTTP server exposing the agent's snapshots for pull-mode polling."""
+import hmac
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SnapshotCache:
+    """Serve one encoded snapshot to every request within ``max_age`` seconds."""
+
+    def __init__(self, collect, max_age=1.0):
+        self.collect = collect
+        self.max_age = max_age
+        self._body = None
+        self._taken = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._body is None or now - self._taken >= self.max_age:
+                self._body = json.dumps(self.collect(), separators=(',', ':')).encode()
+                self._taken = now
+            return self._body
+
+
+def make_server(address, api_key, routes):
+    """
+    Build (but don't start) the metrics HTTP server.
+
+    Args:
+        address: ``(host, port)`` to bind
+        api_key: Key callers must send in ``X-API-Key``
+        routes: ``{path: SnapshotCache}`` serving each GET path
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            snapshots = routes.get(self.path.split('?', 1)[0])
+            if snapshots is None:
+                return self._reply(404, b'{"error":"Not found"}')
+            # Compare bytes: str compare_digest raises TypeError on non-ASCII input
+            if not hmac.compare_digest(self.headers.get('X-API-Key', '').encode(), api_key.encode()):
+                return self._reply(401, b'{"error":"Invalid API key"}')
+            self._reply(200, snapshots.get())
+
+        def _reply(self, status, body):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer(address, Handler)
@@ -0,0 +1,200 @@
+"""Bounded on-disk spool of samples awaiting delivery."""
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import deque
+
+# magic, version, data size, head, tail, count, dropped
+HEADER = struct.Struct('<4sIQQQQQ')
+HEADER_SIZE = 64
+MAGIC = b'SMRL'
+VERSION = 1
+
+# length, crc32 of the payload
+RECORD = struct.Struct('<II')
+WRAP = 0xFFFFFFFF
+
+
+class RingLog:
+    """
+    Fixed-size ring of length-prefixed records in a memory-mapped file.
+
+    Appends never block and never grow the file: once it is full the oldest
+    records are overwritten (and counted in ``dropped``). Readers ``peek`` at
+    the oldest records and ``commit`` them once delivered, so a crash between
+    the two replays them rather than losing them. Data lives in the page cache
+    as soon as it is written, so it survives the agent process dying; call
+    ``flush`` to also survive the host going down.
+    """
+
+    def __init__(self, path, capacity=16 * 1024 * 1024):
+        self.path = path
+        self.capacity = capacity
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            size = HEADER_SIZE + capacity
+            fresh = os.fstat(fd).st_size != size
+            if fresh:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        if fresh or not self._load_header():
+            self._reset()
+
+    def _load_header(self):
+        magic, version, data_size, head, tail, count, dropped = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or data_size != self.capacity:
+            return False
+        if head > data_size or tail > data_size:
+            return False
+        self._head, self._tail, self._count, self.dropped = head, tail, count, dropped
+        return True
+
+    def _store_header(self):
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, self.capacity,
+                         self._head, self._tail, self._count, self.dropped)
+
+    def _reset(self):
+        self._head = self._tail = self._count = 0
+        self.dropped = 0
+        self._store_header()
+
+    def __len__(self):
+        return self._count
+
+    def _record_at(self, pos):
+        """Return (payload position, length, crc, next position), following wrap markers."""
+        if self.capacity - pos < RECORD.size:
+            pos = 0
+        length, crc = RECORD.unpack_from(self._map, HEADER_SIZE + pos)
+        if length == WRAP:
+            pos = 0
+            length, crc = RECORD.unpack_from(self._map, HEADER_SIZE + pos)
+        start = pos + RECORD.size
+        if start + length > self.capacity:
+            raise ValueError('corrupt record length')
+        return start, length, crc, start + length
+
+    def _drop_oldest(self):
+        _, _, _, self._head = self._record_at(self._head)
+        self._count -= 1
+        if self._count == 0:
+            self._head = self._tail = 0
+
+    def append(self, payload):
+        """
+        Append one record, overwriting the oldest ones if needed.
+
+        Returns:
+            bool: False if the record is larger than the whole log
+        """
+        size = RECORD.size + len(payload)
+        if size > self.capacity:
+            return False
+
+        with self._lock:
+            while True:
+                if self._count == 0:
+                    self._head = self._tail = 0
+                    pos = 0
+                    break
+                if self._tail > self._head:
+                    if size <= self.capacity - self._tail:
+                        pos = self._tail
+                        break
+                    if size <= self._head:
+                        # Not enough room before the end: mark the wrap and start over at 0
+                        if self.capacity - self._tail >= 4:
+                            struct.pack_into('<I', self._map, HEADER_SIZE + self._tail, WRAP)
+                        pos = 0
+                        break
+                elif size <= self._head - self._tail:
+                    pos = self._tail
+                    break
+                self._drop_oldest()
+                self.dropped += 1
+
+            RECORD.pack_into(self._map, HEADER_SIZE + pos, len(payload), zlib.crc32(payload))
+            start = HEADER_SIZE + pos + RECORD.size
+            self._map[start:start + len(payload)] = payload
+            self._tail = pos + size
+            self._count += 1
+            self._store_header()
+        return True
+
+    def peek(self, limit):
+        """Return up to ``limit`` of the oldest payloads without removing them."""
+        payloads = []
+        with self._lock:
+            pos = self._head
+            try:
+                for _ in range(min(limit, self._count)):
+                    start, length, crc, pos = self._record_at(pos)
+                    payload = bytes(self._map[HEADER_SIZE + start:HEADER_SIZE + start + length])
+                    if zlib.crc32(payload) != crc:
+                        raise ValueError('checksum mismatch')
+                    payloads.append(payload)
+            except (ValueError, struct.error):
+                # A torn write (e.g. power loss mid-append): keep what is readable, discard the rest
+                self.dropped += self._count - len(payloads)
+                self._count = len(payloads)
+                self._tail = pos if payloads else 0
+                if not payloads:
+                    self._head = 0
+                self._store_header()
+        return payloads
+
+    def commit(self, count):
+        """Remove the ``count`` oldest records after they were delivered."""
+        with self._lock:
+            for _ in range(min(count, self._count)):
+                self._drop_oldest()
+            self._store_header()
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        self._map.flush()
+        self._map.close()
+
+
+class MemorySpool:
+    """In-memory stand-in for RingLog when no spool file is configured."""
+
+    def __init__(self, max_records=10000):
+        self._records = deque()
+        self.max_records = max_records
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def append(self, payload):
+        if len(self._records) >= self.max_records:
+            self._records.popleft()
+            self.dropped += 1
+        self._records.append(payload)
+        return True
+
+    def peek(self, limit):
+        return [self._records[i] for i in range(min(limit, len(self._records)))]
+
+    def commit(self, count):
+        for _ in range(min(count, len(self._records))):
+            self._records.popleft()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
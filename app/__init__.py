@@ -63,6 +63,26 @@ def create_app(config_name='default', config_object=None):
     from app.auth import auth
     app.register_blueprint(auth, url_prefix='/auth')
     
+    # Size the shared outbound HTTP connection pools
+    from app.utils.http import init_http_sessions
+    init_http_sessions(app)
+    
+    # Start the shared real-time metrics sampler
+    from app.sampler import init_sampler
+    init_sampler(app)
+    
+    # Push sampler snapshots to live stream subscribers
+    from app.stream import init_stream
+    init_stream(app)
+    
+    # Deliver alert notifications from a worker pool
+    from app.notifications import init_notifications
+    init_notifications(app)
+    
+    # Run large exports in the background
+    from app.export_jobs import init_export_jobs
+    init_export_jobs(app)
+    
     # Initialize background scheduler
     from app.tasks import init_scheduler
     init_scheduler(app)
@@ -1,115 +1,411 @@
 """Alert service for threshold monitoring and notifications."""
+import functools
+import threading
+from collections import namedtuple
+
+import numpy as np
 from flask import current_app
 from flask_mail import Message
+from sqlalchemy import func, update
 from app import mail
-from app.models import db, AlertRule, AlertHistory, SystemMetric, NetworkMetric, Server
+from app.models import db, AlertRule, AlertHistory, Server, SystemMetric, NetworkMetric
+from app.notifications import notification_dispatcher
+from app.utils.http import http_sessions
+from app.rollups import as_utc
 from datetime import datetime, timedelta, timezone
 from twilio.rest import Client
 
 
+# Alert metric types and the server_latest_metrics column each one reads
+ALERT_METRIC_COLUMNS = {
+    'cpu': 'cpu_percent',
+    'memory': 'memory_percent',
+    'disk': 'disk_percent',
+    'cpu_temp': 'cpu_temp_c',
+    'network_sent': 'bytes_sent',
+    'network_recv': 'bytes_recv'
+}
+
+
+# Metric tables feeding the tracker and the alert columns each one holds
+ALERT_SOURCE_COLUMNS = {
+    model: [column for column in dict.fromkeys(ALERT_METRIC_COLUMNS.values()) if column in model.__table__.c]
+    for model in (SystemMetric, NetworkMetric)
+}
+
+
+# Vectorised comparison operators for the rules x servers matrix
+COMPARISON_OPERATORS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '==': np.equal
+}
+
+
+class SuppressionIndex:
+    """In-memory index of the last time each (rule, server) pair fired."""
+    
+    def __init__(self):
+        self.last_triggered = {}
+    
+    def load(self, since):
+        """Rebuild the index from alert history newer than ``since`` with one grouped query."""
+        rows = db.session.query(
+            AlertHistory.rule_id, AlertHistory.server_id, func.max(AlertHistory.triggered_at)
+        ).filter(
+            AlertHistory.triggered_at >= since
+        ).group_by(AlertHistory.rule_id, AlertHistory.server_id).all()
+        
+        self.last_triggered = {
+            (rule_id, server_id): as_utc(triggered_at)
+            for rule_id, server_id, triggered_at in rows
+        }
+    
+    def is_suppressed(self, rule, server_id, now):
+        """True if the pair already fired within the rule's duration."""
+        last = self.last_triggered.get((rule.id, server_id))
+        return last is not None and last >= now - timedelta(seconds=rule.duration or 0)
+    
+    def record(self, rule_id, server_id, when):
+        self.last_triggered[(rule_id, server_id)] = when
+
+
+# Global suppression index (the alert job runs on the lease holder only)
+suppression_index = SuppressionIndex()
+
+
+class CompiledRules:
+    """Active alert rules flattened into NumPy arrays for vectorised evaluation."""
+    
+    def __init__(self, rules):
+        self.columns = list(dict.fromkeys(ALERT_METRIC_COLUMNS.values()))
+        self.column_index = {column: i for i, column in enumerate(self.columns)}
+        self.ids = [rule.id for rule in rules]
+        self.index = {rule_id: i for i, rule_id in enumerate(self.ids)}
+        self.durations = [rule.duration or 0 for rule in rules]
+        self.metric_rows = np.array([
+            self.column_index.get(ALERT_METRIC_COLUMNS.get(rule.metric_type), len(self.columns))
+            for rule in rules
+        ], dtype=np.intp)
+        self.thresholds = np.array([rule.threshold for rule in rules], dtype=float)[:, None]
+        self.comparisons = np.array([rule.comparison for rule in rules])
+        self.targets = np.array([rule.server_id or -1 for rule in rules])[:, None]
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def evaluate(self, server_ids, active, latest):
+        """
+        Evaluate every rule against every server in one pass.
+        
+        Returns:
+            tuple: (breached, applicable, values) R x S matrices; ``applicable``
+            is True where the rule covers the server and a value is known
+        """
+        # Metric values as a (columns + 1) x S matrix; the extra NaN row serves unknown metric types
+        values = np.full((len(self.columns) + 1, len(server_ids)), np.nan)
+        for j, server_id in enumerate(server_ids):
+            for column, value in latest.get(server_id, {}).items():
+                if value is not None and column in self.column_index:
+                    values[self.column_index[column], j] = value
+        
+        rule_values = values[self.metric_rows]
+        
+        breached = np.zeros(rule_values.shape, dtype=bool)
+        # NaN (no data) compares False for every operator
+        with np.errstate(invalid='ignore'):
+            for comparison, operator in COMPARISON_OPERATORS.items():
+                selected = self.comparisons == comparison
+                if selected.any():
+                    breached[selected] = operator(rule_values[selected], self.thresholds[selected])
+        
+        # Server-specific rules only see their server; global rules see active servers
+        sids = np.asarray(server_ids)[None, :]
+        scope = np.where(self.targets == -1, np.asarray(active, dtype=bool)[None, :], self.targets == sids)
+        applicable = scope & ~np.isnan(rule_values)
+        return breached & scope, applicable, rule_values
+
+
+# Alert state transitions emitted by the tracker
+Transition = namedtuple('Transition', ['kind', 'rule_id', 'server_id', 'value', 'timestamp'])
+
+
+class AlertState:
+    """Sliding-window state of one (rule, server) pair."""
+    
+    __slots__ = ('status', 'since', 'last_at', 'value')
+    
+    def __init__(self, since, value):
+        self.status = 'pending'
+        self.since = since
+        self.last_at = since
+        self.value = value
+
+
+class AlertStateTracker:
+    """
+    Per-(rule, server) state machine: pending -> firing -> resolved.
+    
+    A pair turns ``pending`` on the first breaching sample and ``firing``
+    once the condition has held for the rule's whole duration; any
+    non-breaching sample resets it (emitting ``resolved`` if it was firing).
+    A gap longer than ``max_gap`` between samples restarts a pending window,
+    since nothing is known about the condition in between.
+    
+    Local samples are fed straight from collection. Rules are compiled once
+    per alert cycle by ``load_rules``; the alert job then feeds every row
+    stored since the previous cycle (``row_cursors``), whichever process
+    wrote it, and drains the resulting transitions.
+    
+    State lives only in the process holding the ``collect_metrics`` lease,
+    which runs both local collection and the alert job. Other processes are
+    ``reset`` and have no rules, so samples fed there are ignored.
+    """
+    
+    def __init__(self, max_gap=180):
+        self.max_gap = max_gap
+        self.states = {}
+        self._compiled = None
+        self._transitions = []
+        self._last_observed = {}
+        # Last metric row id read per model by the alert job's catch-up
+        self.row_cursors = {}
+        self._lock = threading.Lock()
+    
+    def reset(self):
+        """Forget rules, state and pending transitions (e.g. on a lease change)."""
+        with self._lock:
+            self._compiled = None
+            self.states = {}
+            self._transitions = []
+            self._last_observed = {}
+            self.row_cursors = {}
+    
+    def load_rules(self, rules):
+        """Swap in the current active rules, dropping state of removed ones."""
+        compiled = CompiledRules(rules)
+        with self._lock:
+            self._compiled = compiled if len(compiled) else None
+            self.states = {key: state for key, state in self.states.items() if key[0] in compiled.index}
+    
+    def observe(self, server_id, values, timestamp, active=True):
+        """
+        Feed one sample of ``server_id``.
+        
+        Args:
+            server_id: Server the sample belongs to
+            values: ``{column: value}``; rules on other columns are left untouched
+            timestamp: Aware UTC sample time
+            active: Whether global rules apply to this server
+        """
+        self.observe_many([server_id], [active], {server_id: values}, {server_id: timestamp})
+    
+    def observe_many(self, server_ids, active, latest, timestamps):
+        """Feed one sample per server, skipping samples already seen."""
+        with self._lock:
+            compiled = self._compiled
+            if compiled is None:
+                return
+            
+            fresh = [j for j, server_id in enumerate(server_ids)
+                     if timestamps.get(server_id) is not None
+                     and timestamps[server_id] > self._last_observed.get(server_id, _EPOCH)]
+            if not fresh:
+                return
+            server_ids = [server_ids[j] for j in fresh]
+            active = [active[j] for j in fresh]
+            for server_id in server_ids:
+                self._last_observed[server_id] = timestamps[server_id]
+            
+            breached, applicable, values = compiled.evaluate(server_ids, active, latest)
+            
+            for i, j in zip(*np.nonzero(breached)):
+                server_id = server_ids[j]
+                self._breach(compiled.ids[i], server_id, float(values[i, j]),
+                             timestamps[server_id], compiled.durations[i])
+            
+            # Only pairs already pending or firing can change on a healthy sample
+            columns = {server_id: j for j, server_id in enumerate(server_ids)}
+            for (rule_id, server_id) in list(self.states):
+                j = columns.get(server_id)
+                if j is None:
+                    continue
+                i = compiled.index[rule_id]
+                if applicable[i, j] and not breached[i, j]:
+                    self._clear(rule_id, server_id, float(values[i, j]), timestamps[server_id])
+    
+    def observe_batches(self, batches, active=None):
+        """
+        Feed every sample in ``{model: [row dicts]}``, oldest first.
+        
+        Args:
+            batches: Rows as written by ``write_metric_rows``
+            active: ``{server_id: is_active}``; servers missing from it are
+                skipped (default: every server counts as active)
+        """
+        for server_id, timestamp, values in merge_samples(batches):
+            if active is None:
+                self.observe(server_id, values, timestamp)
+            elif server_id in active:
+                self.observe(server_id, values, timestamp, active=active[server_id])
+    
+    def _breach(self, rule_id, server_id, value, timestamp, duration):
+        key = (rule_id, server_id)
+        state = self.states.get(key)
+        if state is None or (state.status == 'pending'
+                             and (timestamp - state.last_at).total_seconds() > self.max_gap):
+            state = self.states[key] = AlertState(timestamp, value)
+        state.last_at = timestamp
+        state.value = value
+        
+        if state.status == 'pending' and (timestamp - state.since).total_seconds() >= duration:
+            state.status = 'firing'
+            self._transitions.append(Transition('firing', rule_id, server_id, value, timestamp))
+    
+    def _clear(self, rule_id, server_id, value, timestamp):
+        state = self.states.pop((rule_id, server_id))
+        if state.status == 'firing':
+            self._transitions.append(Transition('resolved', rule_id, server_id, value, timestamp))
+    
+    def has_transitions(self):
+        return bool(self._transitions)
+    
+    def drain_transitions(self):
+        """Remove and return the transitions since the previous call."""
+        with self._lock:
+            transitions, self._transitions = self._transitions, []
+            return transitions
+
+
+_EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def merge_samples(batches):
+    """
+    Combine ``{model: [row dicts]}`` into one sample per (server, timestamp).
+    
+    The system and network rows of one sample share its timestamp; merged,
+    rules on either table see them as a single observation.
+    
+    Returns:
+        list: ``(server_id, timestamp, {column: value})`` tuples, oldest first
+    """
+    samples = {}
+    for rows in batches.values():
+        for row in rows:
+            samples.setdefault((row['server_id'], row['timestamp']), {}).update(row)
+    return sorted(((server_id, timestamp, values) for (server_id, timestamp), values in samples.items()),
+                  key=lambda sample: sample[1])
+
+# Global alert state (fed by the collect job, drained by the alert job; see reset)
+alert_tracker = AlertStateTracker()
+
+
+def load_new_rows(cursors, since):
+    """
+    Read the alert columns of metric rows stored since the previous call.
+    
+    Every written row is read once, whichever process wrote it, so the
+    tracker sees the same samples as if they had been fed to it directly.
+    
+    Args:
+        cursors: ``{model: last id read}``, advanced in place; a model
+            without a cursor starts at rows timestamped after ``since``
+        since: Aware UTC start of the window for a fresh tracker
+    
+    Returns:
+        dict: ``{model: [row dicts]}``
+    """
+    batches = {}
+    for model, columns in ALERT_SOURCE_COLUMNS.items():
+        query = db.session.query(model.id, model.server_id, model.timestamp,
+                                 *[model.__table__.c[column] for column in columns])
+        if model in cursors:
+            query = query.filter(model.id > cursors[model])
+        else:
+            query = query.filter(model.timestamp >= since)
+        rows = query.order_by(model.id).all()
+        
+        if rows:
+            cursors[model] = rows[-1].id
+        elif model not in cursors:
+            cursors[model] = db.session.query(func.coalesce(func.max(model.id), 0)).scalar()
+        batches[model] = [
+            {'server_id': row.server_id, 'timestamp': as_utc(row.timestamp),
+             **{column: getattr(row, column) for column in columns}}
+            for row in rows
+        ]
+    return batches
+
+
 def check_and_notify_alerts():
-    """Check all active alert rules and send notifications if thresholds are breached."""
+    """Advance alert state for every active rule and notify on newly firing pairs."""
     # Get all active alert rules
     alert_rules = AlertRule.query.filter_by(is_active=True).all()
+    alert_tracker.load_rules(alert_rules)
+    if not alert_rules:
+        return
+    rules_by_id = {rule.id: rule for rule in alert_rules}
     
-    for rule in alert_rules:
-        try:
-            check_alert_rule(rule)
-        except Exception as e:
-            current_app.logger.error(f"Error checking alert rule {rule.id}: {e}")
-
-
-def check_alert_rule(rule):
-    """Check a single alert rule and trigger notification if needed."""
-    # Determine which servers to check
-    if rule.server_id:
-        servers = [Server.query.get(rule.server_id)]
-    else:
-        servers = Server.query.filter_by(is_active=True).all()
+    # Active servers plus any server a rule targets explicitly
+    targeted = {rule.server_id for rule in alert_rules if rule.server_id}
+    servers = Server.query.filter(
+        db.or_(Server.is_active.is_(True), Server.id.in_(targeted))
+    ).all()
+    if not servers:
+        return
+    servers_by_id = {server.id: server for server in servers}
+    now = datetime.now(timezone.utc)
+    longest = max((rule.duration or 0) for rule in alert_rules)
+    
+    # Catch up on every row stored since the last cycle (pushed, polled or flushed
+    # by any worker); samples already fed to this process are skipped
+    since = now - timedelta(seconds=max(longest, alert_tracker.max_gap))
+    alert_tracker.observe_batches(load_new_rows(alert_tracker.row_cursors, since),
+                                  active={server.id: bool(server.is_active) for server in servers})
     
-    for server in servers:
-        if not server:
+    transitions = alert_tracker.drain_transitions()
+    if not transitions:
+        return
+    
+    # Never notify a pair twice within its duration, even if another process fired it
+    suppression_index.load(now - timedelta(seconds=longest))
+    
+    for transition in transitions:
+        rule = rules_by_id.get(transition.rule_id)
+        server = servers_by_id.get(transition.server_id)
+        if rule is None or server is None:
             continue
         
-        # Get the latest metric value
-        metric_value = get_latest_metric_value(server.id, rule.metric_type)
-        
-        if metric_value is None:
+        if transition.kind == 'resolved':
+            current_app.logger.info(
+                f"Alert resolved: {rule.name} on {server.name} "
+                f"({rule.metric_type} is {transition.value:.2f})"
+            )
             continue
         
-        # Check if threshold is breached
-        if evaluate_threshold(metric_value, rule.threshold, rule.comparison):
-            # Check if alert was already triggered recently (within duration)
-            recent_alert = AlertHistory.query.filter_by(
-                rule_id=rule.id,
-                server_id=server.id
-            ).filter(
-                AlertHistory.triggered_at >= datetime.now(timezone.utc) - timedelta(seconds=rule.duration)
-            ).first()
-            
-            # Only trigger if no recent alert exists
-            if not recent_alert:
-                trigger_alert(rule, server, metric_value)
-
-
-def get_latest_metric_value(server_id, metric_type):
-    """Get the latest metric value for a specific metric type."""
-    if metric_type == 'cpu':
-        metric = SystemMetric.query.filter_by(server_id=server_id).order_by(
-            SystemMetric.timestamp.desc()
-        ).first()
-        return metric.cpu_percent if metric else None
-    
-    elif metric_type == 'memory':
-        metric = SystemMetric.query.filter_by(server_id=server_id).order_by(
-            SystemMetric.timestamp.desc()
-        ).first()
-        return metric.memory_percent if metric else None
-    
-    elif metric_type == 'disk':
-        metric = SystemMetric.query.filter_by(server_id=server_id).order_by(
-            SystemMetric.timestamp.desc()
-        ).first()
-        return metric.disk_percent if metric else None
-    
-    elif metric_type == 'cpu_temp':
-        metric = SystemMetric.query.filter_by(server_id=server_id).order_by(
-            SystemMetric.timestamp.desc()
-        ).first()
-        return metric.cpu_temp_c if metric else None
-    
-    elif metric_type == 'network_sent':
-        metric = NetworkMetric.query.filter_by(server_id=server_id).order_by(
-            NetworkMetric.timestamp.desc()
-        ).first()
-        return metric.bytes_sent if metric else None
-    
-    elif metric_type == 'network_recv':
-        metric = NetworkMetric.query.filter_by(server_id=server_id).order_by(
-            NetworkMetric.timestamp.desc()
-        ).first()
-        return metric.bytes_recv if metric else None
-    
-    return None
-
-
-def evaluate_threshold(value, threshold, comparison):
-    """Evaluate if a value meets the threshold condition."""
-    if comparison == '>':
-        return value > threshold
-    elif comparison == '>=':
-        return value >= threshold
-    elif comparison == '<':
-        return value < threshold
-    elif comparison == '<=':
-        return value <= threshold
-    elif comparison == '==':
-        return value == threshold
-    return False
+        if suppression_index.is_suppressed(rule, server.id, now):
+            continue
+        try:
+            trigger_alert(rule, server, transition.value)
+            suppression_index.record(rule.id, server.id, now)
+        except Exception as e:
+            current_app.logger.error(f"Error triggering alert rule {rule.id}: {e}")
+            db.session.rollback()
+
+
+# Rule flag enabling each channel and the AlertHistory column recording delivery
+NOTIFICATION_CHANNELS = {
+    'email': ('notify_email', 'email_sent'),
+    'sms': ('notify_sms', 'sms_sent'),
+    'slack': ('notify_slack', 'slack_sent')
+}
 
 
 def trigger_alert(rule, server, metric_value):
-    """Trigger an alert and send notifications."""
+    """Record an alert and hand its notifications to the dispatcher."""
     # Create alert history record
     message = f"Alert: {rule.name} - {rule.metric_type} is {metric_value:.2f} (threshold: {rule.comparison} {rule.threshold})"
     
@@ -119,28 +415,62 @@ def trigger_alert(rule, server, metric_value):
         metric_value=metric_value,
         message=message
     )
+    db.session.add(alert_history)
+    db.session.commit()
     
-    # Send email notification
-    if rule.notify_email:
-        email_sent = send_email_alert(rule, server, metric_value, message)
-        alert_history.email_sent = email_sent
-    
-    # Send SMS notification
-    if rule.notify_sms:
-        sms_sent = send_sms_alert(rule, server, metric_value, message)
-        alert_history.sms_sent = sms_sent
-    
-    # Send Slack notification
-    if rule.notify_slack:
-        slack_sent = send_slack_alert(rule, server, metric_value, message)
-        alert_history.slack_sent = slack_sent
+    for channel, (enabled, sent_column) in NOTIFICATION_CHANNELS.items():
+        if not getattr(rule, enabled):
+            continue
+        if notification_dispatcher.running:
+            # Delivery flags are set by the worker once the send succeeds
+            notification_dispatcher.submit(
+                channel,
+                functools.partial(deliver_notification, channel, alert_history.id,
+                                  rule.id, server.id, metric_value, message),
+                description=f"{channel} alert '{rule.name}' for {server.name}"
+            )
+        else:
+            setattr(alert_history, sent_column, send_notification(channel, rule, server, metric_value, message))
     
-    db.session.add(alert_history)
     db.session.commit()
     
     current_app.logger.info(f"Alert triggered: {message}")
 
 
+def send_notification(channel, rule, server, metric_value, message):
+    """Send one notification over ``channel`` synchronously."""
+    if channel == 'email':
+        return send_email_alert(rule, server, metric_value, message)
+    elif channel == 'sms':
+        return send_sms_alert(rule, server, metric_value, message)
+    elif channel == 'slack':
+        return send_slack_alert(rule, server, metric_value, message)
+    return False
+
+
+def deliver_notification(channel, history_id, rule_id, server_id, metric_value, message):
+    """
+    Worker-side delivery of one queued notification.
+    
+    Reloads the rule and server in the worker's own session, sends, and sets
+    the AlertHistory flag on success. Returning False asks for a retry.
+    """
+    rule = db.session.get(AlertRule, rule_id)
+    server = db.session.get(Server, server_id)
+    if rule is None or server is None:
+        return True  # deleted meanwhile, nothing left to notify about
+    
+    if not send_notification(channel, rule, server, metric_value, message):
+        return False
+    
+    _, sent_column = NOTIFICATION_CHANNELS[channel]
+    db.session.execute(
+        update(AlertHistory).where(AlertHistory.id == history_id).values({sent_column: True})
+    )
+    db.session.commit()
+    return True
+
+
 def send_email_alert(rule, server, metric_value, message):
     """Send email alert notification."""
     try:
@@ -235,7 +565,6 @@ def test_alert_notification(rule_id, notification_type='email'):
 
 def send_slack_alert(rule, server, metric_value, message):
     """Send alert notification to Slack via webhook."""
-    import requests
     import json
     
     try:
@@ -296,7 +625,7 @@ def send_slack_alert(rule, server, metric_value, message):
             ]
         }
         
-        response = requests.post(
+        response = http_sessions.session('webhooks').post(
             webhook_url,
             data=json.dumps(slack_message),
             headers={'Content-Type': 'application/json'},
@@ -0,0 +1,144 @@
+"""Visual downsampling of metric history for charts.
+
+Both methods keep the first and last point and only ever return existing
+samples, so every plotted value is real.
+
+- ``lttb`` (Largest-Triangle-Three-Buckets) picks, per bucket, the point
+  forming the largest triangle with the previously kept point and the next
+  bucket's average, which keeps the visual shape including isolated spikes.
+- ``minmax`` keeps the minimum and maximum of every bucket, which preserves
+  the full envelope of noisy series.
+
+For multi-column points each column gets an equal share of the budget and
+the selected indices are merged, so a spike in any column survives.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from app.rollups import as_utc
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+
+def _bucket_edges(n, buckets):
+    """Split indices ``1..n-2`` into ``buckets`` contiguous non-empty ranges."""
+    edges = np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+    return edges[:-1], edges[1:]
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Indices of the ``threshold`` points LTTB keeps from the series ``(x, y)``.
+
+    Bucket averages are computed for all buckets at once from cumulative
+    sums; only the triangle selection, which depends on the previously kept
+    point, steps through the buckets. NaN values are never selected unless a
+    whole bucket is NaN.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    valid = ~np.isnan(y)
+    starts, ends = _bucket_edges(n, threshold - 2)
+
+    sum_x = np.concatenate(([0.0], np.cumsum(x)))
+    sum_y = np.concatenate(([0.0], np.cumsum(np.where(valid, y, 0.0))))
+    count_y = np.concatenate(([0], np.cumsum(valid)))
+    avg_x = (sum_x[ends] - sum_x[starts]) / (ends - starts)
+    counts = count_y[ends] - count_y[starts]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_y = np.where(counts > 0, (sum_y[ends] - sum_y[starts]) / counts, np.nan)
+    # Each bucket looks ahead to the next bucket's average; the last one to the final point
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - next_x[i]) * (by - y[a]) - (x[a] - bx) * (next_y[i] - y[a]))
+        if np.isnan(area).all():
+            # No reference value: keep any real sample of the bucket
+            candidates = np.flatnonzero(valid[start:end])
+            a = start + (candidates[0] if len(candidates) else 0)
+        else:
+            a = start + int(np.nanargmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, threshold):
+    """Indices of the minimum and maximum of each of ``threshold // 2`` buckets (plus the ends)."""
+    n = len(y)
+    if threshold >= n or threshold < 4:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    starts, ends = _bucket_edges(n, (threshold - 2) // 2)
+    sizes = ends - starts
+    segment = np.repeat(np.arange(len(starts)), sizes)
+    picked = [[0, n - 1]]
+    for reduce, missing in ((np.minimum, np.inf), (np.maximum, -np.inf)):
+        middle = np.where(np.isnan(y[1:n - 1]), missing, y[1:n - 1])
+        extremes = reduce.reduceat(middle, starts - 1)
+        # First sample of each bucket equal to the bucket's extreme
+        hits = np.flatnonzero(middle == np.repeat(extremes, sizes))
+        _, first = np.unique(segment[hits], return_index=True)
+        picked.append(hits[first] + 1)
+    return np.unique(np.concatenate(picked))
+
+
+def select_indices(x, columns, max_points, method='lttb'):
+    """
+    Indices of the samples to keep so that at most ``max_points`` remain.
+
+    Args:
+        x: Timestamps (epoch seconds) of the samples, ascending
+        columns: Value arrays (NaN for missing values), one per series
+        max_points: Point budget
+        method: 'lttb' or 'minmax'
+
+    Returns:
+        numpy.ndarray: Sorted indices into the samples
+    """
+    n = len(x)
+    columns = [column for column in columns if not np.isnan(column).all()]
+    if n <= max_points or not columns:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    # Both methods need a few points per series to pick anything
+    share = max(max_points // len(columns), 4)
+    if method == 'minmax':
+        picked = [minmax_indices(column, share) for column in columns]
+    else:
+        picked = [lttb_indices(x, column, share) for column in columns]
+    indices = np.unique(np.concatenate(picked))
+    if len(indices) > max_points:
+        # Budget below the per-series minimum: thin the merged picks evenly
+        indices = np.unique(indices[np.linspace(0, len(indices) - 1, max(max_points, 1)).round().astype(np.int64)])
+    return indices
+
+
+def downsample_points(points, columns, max_points, method='lttb'):
+    """
+    Thin a list of history point dicts to about ``max_points`` entries.
+
+    Args:
+        points: Dicts with an ISO ``timestamp`` and the ``columns``
+        columns: Keys whose shape must be preserved
+        max_points: Point budget
+        method: 'lttb' or 'minmax'
+    """
+    if len(points) <= max_points:
+        return points
+    x = np.array([as_utc(datetime.fromisoformat(point['timestamp'])).timestamp() for point in points])
+    values = [
+        np.array([point.get(column) for point in points], dtype=np.float64)
+        for column in columns
+    ]
+    return [points[i] for i in select_indices(x, values, max_points, method)]
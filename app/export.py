@@ -1,220 +1,397 @@
-"""Data export service for CSV and JSON exports."""
-import pandas as pd
-from flask import Response
-from io import StringIO, BytesIO
+"""Data export service for CSV, JSON, Parquet and Arrow exports.
+
+Exports are generators: rows are read in batches of ``batch_size`` (on a
+server-side cursor where the database driver supports one) and encoded as they
+arrive, so memory use stays flat however long the exported range is.
+"""
+import csv
 import json
+from collections import namedtuple
 from datetime import datetime, timedelta, timezone
-from app.models import SystemMetric, NetworkMetric, Server
+from io import StringIO
+
+from flask import Response
+from sqlalchemy import func, select
+
+from app.models import db, SystemMetric, NetworkMetric, Server
+
+
+GB = 1024 ** 3
+
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+
+
+def _gb(value):
+    return value / GB if value else None
+
+
+# One exported metric table: the columns read from ``model`` and how a row
+# becomes a CSV line and a JSON record
+ExportTable = namedtuple('ExportTable', ['title', 'model', 'columns', 'csv_header', 'csv_row', 'json_record'])
+
+EXPORT_TABLES = {
+    'system': ExportTable(
+        title='system_metrics',
+        model=SystemMetric,
+        columns=['cpu_percent', 'cpu_freq', 'cpu_temp_c', 'memory_total', 'memory_used',
+                 'memory_percent', 'disk_total', 'disk_used', 'disk_percent',
+                 'io_read_bytes', 'io_write_bytes', 'io_read_count', 'io_write_count'],
+        csv_header=['timestamp', 'server', 'cpu_percent', 'cpu_freq_mhz', 'cpu_temp_c',
+                    'memory_total_gb', 'memory_used_gb', 'memory_percent',
+                    'disk_total_gb', 'disk_used_gb', 'disk_percent', 'io_read_gb', 'io_write_gb'],
+        csv_row=lambda m, server: [
+            m.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            server,
+            m.cpu_percent,
+            m.cpu_freq,
+            m.cpu_temp_c,
+            _gb(m.memory_total),
+            _gb(m.memory_used),
+            m.memory_percent,
+            _gb(m.disk_total),
+            _gb(m.disk_used),
+            m.disk_percent,
+            _gb(m.io_read_bytes),
+            _gb(m.io_write_bytes),
+        ],
+        json_record=lambda m, server: {
+            'timestamp': m.timestamp.isoformat(),
+            'server': server,
+            'server_id': m.server_id,
+            'cpu': {
+                'percent': m.cpu_percent,
+                'freq_mhz': m.cpu_freq,
+                'temp_c': m.cpu_temp_c
+            },
+            'memory': {
+                'total_bytes': m.memory_total,
+                'used_bytes': m.memory_used,
+                'percent': m.memory_percent
+            },
+            'disk': {
+                'total_bytes': m.disk_total,
+                'used_bytes': m.disk_used,
+                'percent': m.disk_percent
+            },
+            'io': {
+                'read_bytes': m.io_read_bytes,
+                'write_bytes': m.io_write_bytes,
+                'read_count': m.io_read_count,
+                'write_count': m.io_write_count
+            }
+        }
+    ),
+    'network': ExportTable(
+        title='network_metrics',
+        model=NetworkMetric,
+        columns=['bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv',
+                 'connections_established', 'connections_listen', 'connections_time_wait'],
+        csv_header=['timestamp', 'server', 'bytes_sent_gb', 'bytes_recv_gb', 'packets_sent',
+                    'packets_recv', 'connections_established', 'connections_listen',
+                    'connections_time_wait'],
+        csv_row=lambda m, server: [
+            m.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            server,
+            m.bytes_sent / GB,
+            m.bytes_recv / GB,
+            m.packets_sent,
+            m.packets_recv,
+            m.connections_established,
+            m.connections_listen,
+            m.connections_time_wait,
+        ],
+        json_record=lambda m, server: {
+            'timestamp': m.timestamp.isoformat(),
+            'server': server,
+            'server_id': m.server_id,
+            'bytes_sent': m.bytes_sent,
+            'bytes_recv': m.bytes_recv,
+            'packets_sent': m.packets_sent,
+            'packets_recv': m.packets_recv,
+            'connections': {
+                'established': m.connections_established,
+                'listen': m.connections_listen,
+                'time_wait': m.connections_time_wait
+            }
+        }
+    ),
+}
+
+
+def _date_range(start_date, end_date):
+    # Set default date range if not provided
+    if not end_date:
+        end_date = datetime.now(timezone.utc)
+    if not start_date:
+        start_date = end_date - timedelta(days=7)  # Last 7 days by default
+    return start_date, end_date
+
+
+def server_names():
+    """Map every server id to its name with one query."""
+    return dict(db.session.execute(select(Server.id, Server.name)).all())
+
 
+def _range_filter(query, model, server_id, start_date, end_date):
+    query = query.where(
+        model.timestamp >= start_date,
+        model.timestamp <= end_date
+    )
+    if server_id:
+        query = query.where(model.server_id == server_id)
+    return query
+
+
+def count_metric_rows(metric_types, server_id=None, start_date=None, end_date=None):
+    """Number of rows an export of ``metric_types`` over the range will contain."""
+    start_date, end_date = _date_range(start_date, end_date)
+    total = 0
+    for metric_type in metric_types:
+        model = EXPORT_TABLES[metric_type].model
+        query = _range_filter(select(func.count()).select_from(model), model, server_id, start_date, end_date)
+        total += db.session.execute(query).scalar()
+    return total
+
+
+def iter_metric_rows(table, server_id, start_date, end_date, batch_size=1000, progress=None):
+    """
+    Read one metric table in timestamp order, ``batch_size`` rows at a time.
+    
+    Args:
+        table: ExportTable to read
+        server_id: Server ID to filter by (None = all servers)
+        start_date: Start of the range (inclusive)
+        end_date: End of the range (inclusive)
+        batch_size: Rows fetched from the cursor per batch
+        progress: Optional callable given the row count of each batch once it was consumed
+    
+    Yields:
+        list: Rows with ``timestamp``, ``server_id`` and the table's columns
+    """
+    model = table.model
+    query = _range_filter(
+        select(model.timestamp, model.server_id, *[getattr(model, c) for c in table.columns]),
+        model, server_id, start_date, end_date
+    )
+    
+    result = db.session.execute(query.order_by(model.timestamp).execution_options(yield_per=batch_size))
+    try:
+        for rows in result.partitions():
+            yield rows
+            if progress:
+                progress(len(rows))
+    finally:
+        result.close()
 
-def export_metrics_to_csv(server_id=None, start_date=None, end_date=None, metric_types=None):
+
+def export_metrics_to_csv(server_id=None, start_date=None, end_date=None, metric_types=None,
+                          batch_size=1000, progress=None):
     """
     Export system metrics to CSV format.
     
+    Each metric type with data gets its own ``# TITLE`` section and header row.
+    
     Args:
         server_id: Server ID to filter by (None = all servers)
         start_date: Start date for filtering (datetime object)
         end_date: End date for filtering (datetime object)
         metric_types: List of metric types to include ['system', 'network']
+        batch_size: Rows read and encoded per chunk
+        progress: Optional callable given the row count of each exported batch
     
-    Returns:
-        CSV string
+    Yields:
+        str: CSV chunks
     """
     if metric_types is None:
         metric_types = ['system', 'network']
+    start_date, end_date = _date_range(start_date, end_date)
+    names = server_names()
     
-    # Set default date range if not provided
-    if not end_date:
-        end_date = datetime.now(timezone.utc)
-    if not start_date:
-        start_date = end_date - timedelta(days=7)  # Last 7 days by default
-    
-    dataframes = []
-    
-    # Export system metrics
-    if 'system' in metric_types:
-        query = SystemMetric.query.filter(
-            SystemMetric.timestamp >= start_date,
-            SystemMetric.timestamp <= end_date
-        )
-        
-        if server_id:
-            query = query.filter_by(server_id=server_id)
-        
-        metrics = query.order_by(SystemMetric.timestamp).all()
-        
-        if metrics:
-            data = []
-            for m in metrics:
-                server = Server.query.get(m.server_id)
-                data.append({
-                    'timestamp': m.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    'server': server.name if server else 'Unknown',
-                    'cpu_percent': m.cpu_percent,
-                    'cpu_freq_mhz': m.cpu_freq,
-                    'cpu_temp_c': m.cpu_temp_c,
-                    'memory_total_gb': m.memory_total / (1024**3) if m.memory_total else None,
-                    'memory_used_gb': m.memory_used / (1024**3) if m.memory_used else None,
-                    'memory_percent': m.memory_percent,
-                    'disk_total_gb': m.disk_total / (1024**3) if m.disk_total else None,
-                    'disk_used_gb': m.disk_used / (1024**3) if m.disk_used else None,
-                    'disk_percent': m.disk_percent,
-                    'io_read_gb': m.io_read_bytes / (1024**3) if m.io_read_bytes else None,
-                    'io_write_gb': m.io_write_bytes / (1024**3) if m.io_write_bytes else None,
-                })
-            
-            df = pd.DataFrame(data)
-            dataframes.append(('system_metrics', df))
-    
-    # Export network metrics
-    if 'network' in metric_types:
-        query = NetworkMetric.query.filter(
-            NetworkMetric.timestamp >= start_date,
-            NetworkMetric.timestamp <= end_date
-        )
+    sections = 0
+    for metric_type, table in EXPORT_TABLES.items():
+        if metric_type not in metric_types:
+            continue
         
-        if server_id:
-            query = query.filter_by(server_id=server_id)
-        
-        metrics = query.order_by(NetworkMetric.timestamp).all()
-        
-        if metrics:
-            data = []
-            for m in metrics:
-                server = Server.query.get(m.server_id)
-                data.append({
-                    'timestamp': m.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    'server': server.name if server else 'Unknown',
-                    'bytes_sent_gb': m.bytes_sent / (1024**3),
-                    'bytes_recv_gb': m.bytes_recv / (1024**3),
-                    'packets_sent': m.packets_sent,
-                    'packets_recv': m.packets_recv,
-                    'connections_established': m.connections_established,
-                    'connections_listen': m.connections_listen,
-                    'connections_time_wait': m.connections_time_wait,
-                })
-            
-            df = pd.DataFrame(data)
-            dataframes.append(('network_metrics', df))
-    
-    # Combine all dataframes into CSV
-    output = StringIO()
-    
-    for i, (name, df) in enumerate(dataframes):
-        if i > 0:
-            output.write('\n\n')
-        output.write(f'# {name.upper()}\n')
-        df.to_csv(output, index=False)
-    
-    return output.getvalue()
-
-
-def export_metrics_to_json(server_id=None, start_date=None, end_date=None, metric_types=None):
+        started = False
+        for rows in iter_metric_rows(table, server_id, start_date, end_date, batch_size, progress):
+            output = StringIO()
+            writer = csv.writer(output, lineterminator='\n')
+            if not started:
+                if sections:
+                    output.write('\n\n')
+                output.write(f'# {table.title.upper()}\n')
+                writer.writerow(table.csv_header)
+                started = True
+                sections += 1
+            writer.writerows(table.csv_row(m, names.get(m.server_id, 'Unknown')) for m in rows)
+            yield output.getvalue()
+
+
+def export_metrics_to_json(server_id=None, start_date=None, end_date=None, metric_types=None,
+                           batch_size=1000, progress=None):
     """
     Export system metrics to JSON format.
     
+    The document is written incrementally, one record per line.
+    
     Args:
         server_id: Server ID to filter by (None = all servers)
         start_date: Start date for filtering (datetime object)
         end_date: End date for filtering (datetime object)
         metric_types: List of metric types to include ['system', 'network']
+        batch_size: Rows read and encoded per chunk
+        progress: Optional callable given the row count of each exported batch
     
-    Returns:
-        JSON string
+    Yields:
+        str: JSON chunks
     """
     if metric_types is None:
         metric_types = ['system', 'network']
+    start_date, end_date = _date_range(start_date, end_date)
+    names = server_names()
     
-    # Set default date range if not provided
-    if not end_date:
-        end_date = datetime.now(timezone.utc)
-    if not start_date:
-        start_date = end_date - timedelta(days=7)  # Last 7 days by default
-    
-    result = {
+    header = json.dumps({
         'export_date': datetime.now(timezone.utc).isoformat(),
         'start_date': start_date.isoformat(),
-        'end_date': end_date.isoformat(),
-        'metrics': {}
-    }
-    
-    # Export system metrics
-    if 'system' in metric_types:
-        query = SystemMetric.query.filter(
-            SystemMetric.timestamp >= start_date,
-            SystemMetric.timestamp <= end_date
-        )
-        
-        if server_id:
-            query = query.filter_by(server_id=server_id)
-        
-        metrics = query.order_by(SystemMetric.timestamp).all()
-        
-        system_data = []
-        for m in metrics:
-            server = Server.query.get(m.server_id)
-            system_data.append({
-                'timestamp': m.timestamp.isoformat(),
-                'server': server.name if server else 'Unknown',
-                'server_id': m.server_id,
-                'cpu': {
-                    'percent': m.cpu_percent,
-                    'freq_mhz': m.cpu_freq,
-                    'temp_c': m.cpu_temp_c
-                },
-                'memory': {
-                    'total_bytes': m.memory_total,
-                    'used_bytes': m.memory_used,
-                    'percent': m.memory_percent
-                },
-                'disk': {
-                    'total_bytes': m.disk_total,
-                    'used_bytes': m.disk_used,
-                    'percent': m.disk_percent
-                },
-                'io': {
-                    'read_bytes': m.io_read_bytes,
-                    'write_bytes': m.io_write_bytes,
-                    'read_count': m.io_read_count,
-                    'write_count': m.io_write_count
-                }
-            })
-        
-        result['metrics']['system'] = system_data
-    
-    # Export network metrics
-    if 'network' in metric_types:
-        query = NetworkMetric.query.filter(
-            NetworkMetric.timestamp >= start_date,
-            NetworkMetric.timestamp <= end_date
-        )
-        
-        if server_id:
-            query = query.filter_by(server_id=server_id)
-        
-        metrics = query.order_by(NetworkMetric.timestamp).all()
-        
-        network_data = []
-        for m in metrics:
-            server = Server.query.get(m.server_id)
-            network_data.append({
-                'timestamp': m.timestamp.isoformat(),
-                'server': server.name if server else 'Unknown',
-                'server_id': m.server_id,
-                'bytes_sent': m.bytes_sent,
-                'bytes_recv': m.bytes_recv,
-                'packets_sent': m.packets_sent,
-                'packets_recv': m.packets_recv,
-                'connections': {
-                    'established': m.connections_established,
-                    'listen': m.connections_listen,
-                    'time_wait': m.connections_time_wait
-                }
-            })
+        'end_date': end_date.isoformat()
+    }, indent=2)
+    yield header[:-2] + ',\n  "metrics": {'
+    
+    selected = [metric_type for metric_type in EXPORT_TABLES if metric_type in metric_types]
+    for i, metric_type in enumerate(selected):
+        table = EXPORT_TABLES[metric_type]
+        yield f'{"," if i else ""}\n    "{metric_type}": ['
+        separator = '\n      '
+        for rows in iter_metric_rows(table, server_id, start_date, end_date, batch_size, progress):
+            chunk = []
+            for m in rows:
+                chunk.append(separator)
+                chunk.append(json.dumps(table.json_record(m, names.get(m.server_id, 'Unknown'))))
+                separator = ',\n      '
+            yield ''.join(chunk)
+        yield '\n    ]'
+    
+    yield '\n  }\n}\n'
+
+
+class _ChunkSink:
+    """Write-only file object whose contents are drained as stream chunks."""
+    
+    closed = False
+    
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self._position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def arrow_schema(table):
+    """
+    Arrow schema of a metric table with native column types.
+    
+    Timestamps are UTC microseconds and byte counters stay integers; the
+    ``server`` name column compresses to a dictionary in Parquet.
+    """
+    import pyarrow as pa
+    
+    types = {'Float': pa.float64(), 'BigInteger': pa.int64(), 'Integer': pa.int32()}
+    fields = [
+        pa.field('timestamp', pa.timestamp('us', tz='UTC'), nullable=False),
+        pa.field('server_id', pa.int32(), nullable=False),
+        pa.field('server', pa.string()),
+    ]
+    for name in table.columns:
+        column = table.model.__table__.c[name]
+        fields.append(pa.field(name, types[type(column.type).__name__], nullable=column.nullable))
+    return pa.schema(fields)
+
+
+def export_metrics_to_arrow(format_type, server_id=None, start_date=None, end_date=None,
+                            metric_type='system', batch_size=65536, compression='zstd', progress=None):
+    """
+    Export one metric table as a Parquet or Arrow IPC file.
+    
+    Every cursor batch becomes one Parquet row group (or Arrow record batch)
+    and is streamed as soon as it is encoded.
+    
+    Args:
+        format_type: 'parquet' or 'arrow'
+        server_id: Server ID to filter by (None = all servers)
+        start_date: Start date for filtering (datetime object)
+        end_date: End date for filtering (datetime object)
+        metric_type: 'system' or 'network'
+        batch_size: Rows per row group / record batch
+        compression: Codec for the column data (e.g. 'zstd', 'lz4', None)
+        progress: Optional callable given the row count of each exported batch
+    
+    Returns:
+        generator: File chunks (bytes)
+    
+    Raises:
+        ImportError: if pyarrow is not installed
+        ValueError: for an unknown format or metric type
+    """
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+    
+    if format_type not in ('parquet', 'arrow'):
+        raise ValueError(f"Unknown export format: {format_type}")
+    if metric_type not in EXPORT_TABLES:
+        raise ValueError(f"Unknown metric type: {metric_type}")
+    table = EXPORT_TABLES[metric_type]
+    schema = arrow_schema(table)
+    start_date, end_date = _date_range(start_date, end_date)
+    
+    def generate():
+        names = server_names()
+        sink = _ChunkSink()
+        if format_type == 'parquet':
+            writer = pq.ParquetWriter(sink, schema, compression=compression or 'none')
+        else:
+            writer = pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(compression=compression))
         
-        result['metrics']['network'] = network_data
+        try:
+            for rows in iter_metric_rows(table, server_id, start_date, end_date, batch_size, progress):
+                columns = list(zip(*rows))
+                arrays = [
+                    pa.array(columns[0], type=schema.field('timestamp').type),
+                    pa.array(columns[1], type=pa.int32()),
+                    pa.array([names.get(server, 'Unknown') for server in columns[1]], type=pa.string()),
+                ]
+                arrays.extend(pa.array(values, type=field.type)
+                              for values, field in zip(columns[2:], list(schema)[3:]))
+                writer.write_batch(pa.record_batch(arrays, schema=schema))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
     
-    return json.dumps(result, indent=2)
+    return generate()
 
 
 def create_export_response(data, format_type, filename_prefix='system_monitor_export'):
@@ -222,8 +399,8 @@ def create_export_response(data, format_type, filename_prefix='system_monitor_ex
     Create a Flask Response object for file download.
     
     Args:
-        data: Export data (string)
-        format_type: 'csv' or 'json'
+        data: Export data (string, or an iterable of chunks to stream)
+        format_type: 'csv', 'json', 'parquet' or 'arrow'
         filename_prefix: Prefix for the filename
     
     Returns:
@@ -232,16 +409,9 @@ def create_export_response(data, format_type, filename_prefix='system_monitor_ex
     timestamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
     filename = f"{filename_prefix}_{timestamp}.{format_type}"
     
-    if format_type == 'csv':
-        mimetype = 'text/csv'
-    elif format_type == 'json':
-        mimetype = 'application/json'
-    else:
-        mimetype = 'text/plain'
-    
     return Response(
         data,
-        mimetype=mimetype,
+        mimetype=EXPORT_MIMETYPES.get(format_type, 'text/plain'),
         headers={
             'Content-Disposition': f'attachment; filename={filename}'
         }
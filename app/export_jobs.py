@@ -0,0 +1,375 @@
+"""Background export jobs that write their files to a spool directory.
+
+A job is identified by a hash of what it exports (format, server, range and
+metric types), so submitting the same export twice returns the running job
+or its finished file instead of computing it again. Job state lives in a
+small JSON file next to the artifact, which lets every worker process answer
+status and download requests for jobs started by another.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from app.export import (EXPORT_TABLES, count_metric_rows, export_metrics_to_arrow,
+                        export_metrics_to_csv, export_metrics_to_json)
+from app.ingest import parse_timestamp
+from app.leader import DatabaseLeaseBackend, default_holder_id
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'json', 'parquet', 'arrow')
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+JOB_ID = re.compile(r'^[0-9a-f]{20}$')
+
+
+ExportRequest = namedtuple('ExportRequest', ['format_type', 'server_id', 'start_date', 'end_date', 'metric_types'])
+
+
+def export_job_id(export):
+    """Stable id of an ExportRequest: identical exports share it."""
+    key = json.dumps([
+        export.format_type,
+        export.server_id,
+        export.start_date.isoformat(),
+        export.end_date.isoformat(),
+        sorted(export.metric_types)
+    ])
+    return hashlib.sha256(key.encode()).hexdigest()[:20]
+
+
+def parse_export_request(data, now=None):
+    """
+    Validate a ``POST /api/export/jobs`` body.
+
+    The range is ``start``/``end`` (ISO 8601 or epoch seconds) or the last
+    ``days`` days (default 7). A ``days`` range ends at the current minute,
+    so repeated requests within a minute map to the same job.
+
+    Returns:
+        ExportRequest
+
+    Raises:
+        ValueError: if a field is missing or invalid
+    """
+    format_type = data.get('format')
+    if format_type not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+
+    server_id = data.get('server_id')
+    if server_id is not None and (isinstance(server_id, bool) or not isinstance(server_id, int)):
+        raise ValueError('server_id must be an integer')
+
+    if data.get('start') is not None or data.get('end') is not None:
+        if data.get('start') is None or data.get('end') is None:
+            raise ValueError('start and end must be given together')
+        start_date = parse_timestamp(data['start'])
+        end_date = parse_timestamp(data['end'])
+    else:
+        days = data.get('days', 7)
+        if isinstance(days, bool) or not isinstance(days, (int, float)) or days <= 0:
+            raise ValueError('days must be a positive number')
+        end_date = (now or datetime.now(timezone.utc)).replace(second=0, microsecond=0)
+        try:
+            start_date = end_date - timedelta(days=days)
+        except OverflowError:
+            raise ValueError('days is out of range')
+    if start_date >= end_date:
+        raise ValueError('start must be before end')
+
+    default_metrics = ['system'] if format_type in COLUMNAR_FORMATS else list(EXPORT_TABLES)
+    metric_types = data.get('metrics') or default_metrics
+    if isinstance(metric_types, str):
+        metric_types = [metric_types]
+    if not isinstance(metric_types, list) or any(m not in EXPORT_TABLES for m in metric_types):
+        raise ValueError(f"metrics must be a list of {', '.join(EXPORT_TABLES)}")
+    if format_type in COLUMNAR_FORMATS and len(metric_types) != 1:
+        raise ValueError(f"{format_type} exports hold exactly one metric type")
+
+    return ExportRequest(format_type, server_id, start_date, end_date, sorted(set(metric_types)))
+
+
+class ExportJobManager:
+    """
+    Run exports on a worker pool and keep their files for ``ttl`` seconds.
+
+    Running jobs rewrite their status file with their progress at most every
+    ``heartbeat`` seconds. Independently of progress, a keep-alive thread
+    touches the status of every queued or running job of this process four
+    times per ``stale_after``, so a job waiting for a worker or stuck in a
+    long count stays live. A job whose status has not been touched for
+    ``stale_after`` seconds is assumed lost (e.g. its worker was restarted)
+    and is started again on the next submit.
+
+    Starting a job first claims it with a lease row in the database (see
+    ``app.leader``), renewed by the same keep-alive, so two worker processes
+    submitting the same export never run it side by side.
+    """
+
+    def __init__(self, spool_dir=None, workers=2, ttl=3600, stale_after=120, heartbeat=1.0,
+                 batch_size=1000, row_group_size=65536, compression='zstd'):
+        self.spool_dir = spool_dir
+        self.workers = workers
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self.heartbeat = heartbeat
+        self.batch_size = batch_size
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.app = None
+        self._executor = None
+        self._lock = threading.Lock()
+        # Serialises status writes so a keep-alive never lands after a newer status
+        self._status_lock = threading.Lock()
+        # Queued and running jobs of this process: job id -> status dict
+        self._active = {}
+        self._keepalive = None
+        self._stop_event = threading.Event()
+        self.leases = DatabaseLeaseBackend()
+        self.holder = default_holder_id()
+
+    def configure(self, **settings):
+        for name, value in settings.items():
+            if value is not None:
+                setattr(self, name, value)
+
+    @property
+    def running(self):
+        return self._executor is not None
+
+    def start(self, app):
+        """Start the worker pool, exporting inside ``app``'s context."""
+        self.app = app
+        os.makedirs(self.spool_dir, exist_ok=True)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='export')
+                self._stop_event.clear()
+                self._keepalive = threading.Thread(target=self._keep_alive, name='export-keepalive', daemon=True)
+                self._keepalive.start()
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            if self._executor is not None:
+                self._stop_event.set()
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+                self._keepalive = None
+                # Cancelled jobs are no longer kept alive and go stale
+                self._active.clear()
+
+    def _keep_alive(self):
+        """Touch the status and claim of this process's unfinished jobs until shutdown."""
+        while not self._stop_event.wait(self.stale_after / 4):
+            for status in list(self._active.values()):
+                try:
+                    self._write_status(status, keepalive=True)
+                    with self.app.app_context():
+                        self.leases.renew(self._lease(status['id']), self.holder, self.stale_after)
+                except Exception as e:
+                    logger.warning(f"Could not refresh export {status['id']}: {e}")
+
+    def _lease(self, job_id):
+        return f"export:{job_id}"
+
+    def _path(self, job_id, suffix):
+        return os.path.join(self.spool_dir, f"{job_id}.{suffix}")
+
+    def artifact_path(self, status):
+        return self._path(status['id'], status['format'])
+
+    def status(self, job_id):
+        """Return the status dict of ``job_id`` (None if unknown or expired)."""
+        if not JOB_ID.match(job_id or ''):
+            return None
+        try:
+            with open(self._path(job_id, 'json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_status(self, status, keepalive=False):
+        with self._status_lock:
+            # A keep-alive racing the final write must not outlive the job
+            if keepalive and status['status'] not in ('queued', 'running'):
+                return
+            status['updated_at'] = time.time()
+            path = self._path(status['id'], 'json')
+            temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp, 'w') as f:
+                json.dump(status, f)
+            os.replace(temp, path)
+
+    def _is_live(self, status):
+        if status['status'] == 'done':
+            return os.path.exists(self.artifact_path(status))
+        if status['status'] in ('queued', 'running'):
+            return time.time() - status['updated_at'] < self.stale_after
+        return False
+
+    def submit(self, export):
+        """
+        Start an export, or return the job already covering it.
+
+        Args:
+            export: ExportRequest
+
+        Returns:
+            dict: Job status
+        """
+        self.sweep()
+        job_id = export_job_id(export)
+        with self._lock:
+            status = self.status(job_id)
+            if status is not None and self._is_live(status):
+                return status
+
+            # Another worker may be (re)starting the same job right now
+            now = datetime.now(timezone.utc).isoformat()
+            if not self.leases.acquire(self._lease(job_id), self.holder, self.stale_after):
+                claimed = self.status(job_id)
+                if claimed is not None and self._is_live(claimed):
+                    return claimed
+                # Its status is not written yet: report the job as queued
+                return self._new_status(job_id, export, now)
+
+            status = self._new_status(job_id, export, now)
+            self._write_status(status)
+            running = dict(status)
+            self._active[job_id] = running
+            self._executor.submit(self._run, export, running)
+        return status
+
+    def _new_status(self, job_id, export, now):
+        return {
+            'id': job_id,
+            'status': 'queued',
+            'format': export.format_type,
+            'server_id': export.server_id,
+            'start_date': export.start_date.isoformat(),
+            'end_date': export.end_date.isoformat(),
+            'metrics': export.metric_types,
+            'rows': 0,
+            'total_rows': None,
+            'progress': 0.0,
+            'size': None,
+            'error': None,
+            'created_at': now,
+            'finished_at': None,
+            'updated_at': time.time()
+        }
+
+    def _run(self, export, status):
+        path = self.artifact_path(status)
+        # Unique per run: a restarted job never shares a file with a lost one
+        partial = f"{path}.{uuid.uuid4().hex}.part"
+        last_write = [time.monotonic()]
+
+        def progress(rows):
+            status['rows'] += rows
+            if status['total_rows']:
+                status['progress'] = round(min(1.0, status['rows'] / status['total_rows']), 4)
+            if time.monotonic() - last_write[0] >= self.heartbeat:
+                self._write_status(status)
+                last_write[0] = time.monotonic()
+
+        with self.app.app_context():
+            from app.models import db
+            try:
+                status['status'] = 'running'
+                status['total_rows'] = count_metric_rows(export.metric_types, export.server_id,
+                                                         export.start_date, export.end_date)
+                self._write_status(status)
+
+                with open(partial, 'wb') as f:
+                    for chunk in self._chunks(export, progress):
+                        f.write(chunk.encode() if isinstance(chunk, str) else chunk)
+                os.replace(partial, path)
+
+                status.update(status='done', progress=1.0, size=os.path.getsize(path),
+                              finished_at=datetime.now(timezone.utc).isoformat())
+                self._write_status(status)
+                logger.info(f"Export {status['id']} finished: {status['rows']} rows, {status['size']} bytes")
+            except Exception as e:
+                logger.error(f"Export {status['id']} failed: {e}")
+                status.update(status='failed', error=str(e),
+                              finished_at=datetime.now(timezone.utc).isoformat())
+                self._write_status(status)
+                if os.path.exists(partial):
+                    os.remove(partial)
+            finally:
+                if self._active.get(status['id']) is status:
+                    del self._active[status['id']]
+                    try:
+                        self.leases.release(self._lease(status['id']), self.holder)
+                    except Exception as e:
+                        logger.warning(f"Could not release export {status['id']}: {e}")
+                db.session.remove()
+
+    def _chunks(self, export, progress):
+        args = (export.server_id, export.start_date, export.end_date)
+        if export.format_type == 'csv':
+            return export_metrics_to_csv(*args, export.metric_types, self.batch_size, progress)
+        if export.format_type == 'json':
+            return export_metrics_to_json(*args, export.metric_types, self.batch_size, progress)
+        return export_metrics_to_arrow(export.format_type, *args, export.metric_types[0],
+                                       batch_size=self.row_group_size,
+                                       compression=self.compression, progress=progress)
+
+    def sweep(self):
+        """Delete finished jobs older than ``ttl`` and leftovers of lost ones."""
+        now = time.time()
+        try:
+            names = os.listdir(self.spool_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.spool_dir, name)
+            try:
+                if name.endswith(('.part', '.tmp')):
+                    expired = now - os.path.getmtime(path) > self.stale_after
+                elif name.endswith('.json'):
+                    status = self.status(name[:-5])
+                    if status is None:
+                        continue
+                    live = status['status'] in ('queued', 'running')
+                    expired = now - status['updated_at'] > (self.stale_after if live else self.ttl)
+                    if expired and not live and os.path.exists(self.artifact_path(status)):
+                        os.remove(self.artifact_path(status))
+                else:
+                    continue
+                if expired:
+                    os.remove(path)
+            except OSError:
+                continue
+
+
+# Global export job manager
+export_jobs = ExportJobManager()
+
+
+def init_export_jobs(app):
+    """Start the export worker pool; with 0 workers background exports are disabled."""
+    workers = app.config.get('EXPORT_JOB_WORKERS', 2)
+    if workers <= 0:
+        export_jobs.shutdown()
+        return
+    export_jobs.configure(
+        spool_dir=app.config.get('EXPORT_SPOOL_DIR'),
+        workers=workers,
+        ttl=app.config.get('EXPORT_JOB_TTL', 3600),
+        batch_size=app.config.get('EXPORT_BATCH_SIZE', 1000),
+        row_group_size=app.config.get('EXPORT_ROW_GROUP_SIZE', 65536),
+        compression=app.config.get('EXPORT_COMPRESSION', 'zstd')
+    )
+    if not export_jobs.running:
+        atexit.register(export_jobs.shutdown)
+    export_jobs.start(app)
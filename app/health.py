@@ -0,0 +1,169 @@
+"""Concurrent service health checks, each at its own interval."""
+import heapq
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import update
+
+from app.models import db, ServiceHealth
+from app.utils.healthchecks import check_http_service
+
+
+ServiceCheck = namedtuple('ServiceCheck', ['id', 'name', 'url', 'interval', 'timeout'])
+
+
+class HealthCheckScheduler:
+    """
+    Heap of services ordered by their next due time.
+
+    Each tick pops the services that are due, hands their probes to a thread
+    pool (whose size is the global concurrency cap) and pushes them back at
+    ``due + check_interval``. A service whose previous probe is still running
+    skips its slot instead of piling up. Finished probes are collected and
+    written together by ``write_results``.
+    """
+
+    def __init__(self, max_workers=10, sync_interval=30, probe=None):
+        self.max_workers = max_workers
+        self.sync_interval = sync_interval
+        self.probe = probe
+        self._services = {}
+        self._heap = []  # (due, service id), monotonic time
+        self._scheduled = set()
+        self._in_flight = set()
+        self._futures = set()
+        self._results = []
+        self._last_sync = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers=None, sync_interval=None):
+        if max_workers is not None and max_workers != self.max_workers:
+            self.max_workers = max_workers
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        if sync_interval is not None:
+            self.sync_interval = sync_interval
+
+    def needs_sync(self, now=None):
+        now = time.monotonic() if now is None else now
+        return self._last_sync is None or now - self._last_sync >= self.sync_interval
+
+    def sync(self, services, now=None):
+        """Replace the service list; new services are due immediately."""
+        now = time.monotonic() if now is None else now
+        checks = {
+            service.id: ServiceCheck(service.id, service.name, service.url,
+                                     max(1, service.check_interval or 60), service.timeout or 5)
+            for service in services
+        }
+        with self._lock:
+            for service_id in checks:
+                if service_id not in self._scheduled:
+                    heapq.heappush(self._heap, (now, service_id))
+                    self._scheduled.add(service_id)
+            # Entries of removed services are discarded when they come up
+            self._services = checks
+            self._last_sync = now
+
+    def dispatch(self, app, now=None):
+        """
+        Start probes for every due service.
+
+        Returns:
+            int: Number of probes started
+        """
+        now = time.monotonic() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due_at, service_id = heapq.heappop(self._heap)
+                check = self._services.get(service_id)
+                if check is None:
+                    self._scheduled.discard(service_id)
+                    continue
+                heapq.heappush(self._heap, (max(due_at + check.interval, now), service_id))
+                if service_id in self._in_flight:
+                    continue
+                self._in_flight.add(service_id)
+                due.append(check)
+
+        if due:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='health-check')
+            for check in due:
+                future = self._executor.submit(self._check, app, check)
+                self._futures.add(future)
+                future.add_done_callback(self._futures.discard)
+        return len(due)
+
+    def wait(self, timeout=None):
+        """Wait for running probes to finish."""
+        wait(list(self._futures), timeout)
+
+    def _check(self, app, check):
+        probe = self.probe or check_http_service
+        try:
+            with app.app_context():
+                is_up, status_code, response_time, error_message = probe(check.url, check.name, check.timeout)
+        except Exception as e:
+            is_up, status_code, response_time, error_message = False, None, None, f"Unexpected error: {e}"
+
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            self._results.append({
+                'id': check.id,
+                'last_check_time': now,
+                'is_up': is_up,
+                'status_code': status_code,
+                'response_time': response_time,
+                'error_message': error_message,
+                'updated_at': now
+            })
+            self._in_flight.discard(check.id)
+
+    def drain_results(self):
+        with self._lock:
+            results, self._results = self._results, []
+            return results
+
+    def write_results(self):
+        """Write every finished probe with one bulk UPDATE and commit."""
+        results = self.drain_results()
+        if not results:
+            return 0
+
+        # Services deleted while their probe was running have no row left to update
+        existing = {
+            row.id for row in db.session.query(ServiceHealth.id).filter(
+                ServiceHealth.id.in_({result['id'] for result in results})
+            )
+        }
+        results = [result for result in results if result['id'] in existing]
+        if results:
+            db.session.execute(update(ServiceHealth), results)
+        db.session.commit()
+
+        for result in results:
+            check = self._services.get(result['id'])
+            current_app.logger.info(
+                f"Health check for {check.name if check else result['id']}: "
+                f"{'UP' if result['is_up'] else 'DOWN'} "
+                f"(status: {result['status_code']}, response: {result['response_time']}ms)"
+            )
+        return len(results)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Global health check scheduler (driven by the health_checks job on the lease holder)
+health_scheduler = HealthCheckScheduler()
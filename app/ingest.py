@@ -0,0 +1,376 @@
+"""Buffered metric ingestion with bulk inserts."""
+import math
+import threading
+import zlib
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, update
+
+from app.models import db, dialect_insert, Server, SystemMetric, NetworkMetric, ServerLatestMetric
+from app.rollups import SAMPLES_KEY, update_rollups
+
+
+def _value_columns(model):
+    return [c.name for c in model.__table__.columns if c.name not in ('id', 'server_id', 'timestamp')]
+
+
+# Columns mirrored into server_latest_metrics for each source model
+LATEST_COLUMNS = {
+    SystemMetric: _value_columns(SystemMetric),
+    NetworkMetric: _value_columns(NetworkMetric),
+}
+
+# Sections of a POST /api/ingest sample and the model each one feeds
+INGEST_SECTIONS = {
+    'system': SystemMetric,
+    'network': NetworkMetric,
+}
+
+# Python type of every accepted column, and the columns a sample must carry
+INGEST_COLUMNS = {
+    model: {column: model.__table__.c[column].type.python_type for column in columns}
+    for model, columns in LATEST_COLUMNS.items()
+}
+REQUIRED_COLUMNS = {
+    model: [column for column in columns if not model.__table__.c[column].nullable]
+    for model, columns in LATEST_COLUMNS.items()
+}
+
+
+class MetricBuffer:
+    """
+    Bounded in-memory buffer of metric rows awaiting a bulk insert.
+
+    Rows are grouped per model so a flush becomes one multi-row INSERT per
+    table. When the buffer is full (e.g. the database is slow or down) the
+    oldest rows are either dropped or the older half of the largest queue is
+    downsampled 2x by merging consecutive samples of the same server, so the
+    oldest data degrades to a coarser resolution instead of growing without
+    bound. Only rows standing for the same number of samples are merged, so
+    every row covers a known span (``SAMPLES_KEY`` samples from its timestamp).
+    """
+
+    POLICIES = ('drop', 'aggregate')
+
+    def __init__(self, max_rows=10000, flush_rows=500, flush_interval=60, policy='aggregate'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown buffer policy: {policy}")
+        self.max_rows = max_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self._rows = {}  # model -> deque of row dicts
+        self._size = 0
+        self._lock = threading.Lock()
+        self._last_flush = datetime.now(timezone.utc)
+        self.dropped = 0
+        self.aggregated = 0
+
+    def configure(self, max_rows=None, flush_rows=None, flush_interval=None, policy=None):
+        with self._lock:
+            if max_rows is not None:
+                self.max_rows = max_rows
+            if flush_rows is not None:
+                self.flush_rows = flush_rows
+            if flush_interval is not None:
+                self.flush_interval = flush_interval
+            if policy is not None:
+                if policy not in self.POLICIES:
+                    raise ValueError(f"Unknown buffer policy: {policy}")
+                self.policy = policy
+
+    def __len__(self):
+        return self._size
+
+    def add(self, model, row):
+        """Buffer one row (a dict of column values) for ``model``."""
+        with self._lock:
+            self._rows.setdefault(model, deque()).append(row)
+            self._size += 1
+            while self._size > self.max_rows:
+                self._shed()
+
+    def should_flush(self):
+        """True once enough rows or time have accumulated."""
+        if not self._size:
+            return False
+        age = (datetime.now(timezone.utc) - self._last_flush).total_seconds()
+        return self._size >= self.flush_rows or age >= self.flush_interval
+
+    def drain(self):
+        """Remove and return all buffered rows as ``{model: [rows]}``."""
+        with self._lock:
+            batches = {model: list(rows) for model, rows in self._rows.items() if rows}
+            self._rows = {}
+            self._size = 0
+            self._last_flush = datetime.now(timezone.utc)
+            return batches
+
+    def requeue(self, batches):
+        """Put rows from a failed flush back in front of newer rows."""
+        with self._lock:
+            for model, rows in batches.items():
+                queue = self._rows.setdefault(model, deque())
+                queue.extendleft(reversed(rows))
+                self._size += len(rows)
+            while self._size > self.max_rows:
+                self._shed()
+
+    def stats(self):
+        return {
+            'rows': self._size,
+            'max_rows': self.max_rows,
+            'dropped': self.dropped,
+            'aggregated': self.aggregated,
+            'policy': self.policy
+        }
+
+    def _shed(self):
+        """Free at least one slot from the largest queue (caller holds the lock)."""
+        queue = max(self._rows.values(), key=len)
+        if self.policy == 'aggregate':
+            # Older half first; the whole queue if its rows were already all merged
+            freed = downsample_rows(queue, len(queue) // 2) or downsample_rows(queue, len(queue))
+            if freed:
+                self._size -= freed
+                self.aggregated += freed
+                return
+        queue.popleft()
+        self._size -= 1
+        self.dropped += 1
+
+
+def row_samples(row):
+    """Number of raw samples ``row`` stands for."""
+    return row.get(SAMPLES_KEY, 1)
+
+
+def merge_rows(older, newer):
+    """
+    Merge two consecutive rows of the same server into one.
+
+    Float gauges (percentages, temperatures) get the mean weighted by how
+    many samples each row stands for; counters and absolute values keep the
+    newer reading. The merged row keeps the older timestamp so it still marks
+    the start of the period it covers, and records the combined sample count.
+    """
+    older_samples, newer_samples = row_samples(older), row_samples(newer)
+    samples = older_samples + newer_samples
+    merged = dict(newer)
+    for key, value in older.items():
+        other = newer.get(key)
+        if isinstance(value, float) and isinstance(other, float):
+            merged[key] = (value * older_samples + other * newer_samples) / samples
+    merged['timestamp'] = older.get('timestamp', newer.get('timestamp'))
+    merged[SAMPLES_KEY] = samples
+    return merged
+
+
+def downsample_rows(queue, count):
+    """
+    Halve the resolution of the ``count`` oldest rows of ``queue`` in place.
+
+    Consecutive rows of the same server that stand for the same number of
+    samples are merged pairwise, so repeated passes build up 2, 4, 8...
+    sample rows rather than folding everything into one row.
+
+    Returns:
+        int: Number of rows freed
+    """
+    segment = [queue.popleft() for _ in range(min(count, len(queue)))]
+    kept = []
+    unpaired = {}  # server_id -> index in kept of its latest row waiting for a partner
+    for row in segment:
+        server_id = row.get('server_id')
+        index = unpaired.pop(server_id, None)
+        if index is not None and row_samples(kept[index]) == row_samples(row):
+            kept[index] = merge_rows(kept[index], row)
+        else:
+            unpaired[server_id] = len(kept)
+            kept.append(row)
+    queue.extendleft(reversed(kept))
+    return len(segment) - len(kept)
+
+
+def write_metric_rows(batches, pushed=False):
+    """
+    Write buffered rows in a single transaction.
+
+    Each model gets one multi-row INSERT, the rollup and latest-value
+    tables are updated from the same rows and every server that reported gets
+    its ``last_seen`` bumped once (one executemany for all servers), instead of
+    a commit per sample. ``last_seen`` is the time the rows were received, not
+    their sample timestamps: those come from the agent's clock and go back in
+    time while an agent replays its spool.
+
+    Args:
+        batches: ``{model: [row dicts]}`` as returned by ``MetricBuffer.drain``
+        pushed: The rows were pushed by the servers' agents (sets ``last_push_at`` too)
+
+    Returns:
+        int: Number of rows written
+    """
+    written = 0
+    reported = set()
+
+    for model, rows in batches.items():
+        if not rows:
+            continue
+        db.session.execute(insert(model), [
+            {key: value for key, value in row.items() if key != SAMPLES_KEY} if SAMPLES_KEY in row else row
+            for row in rows
+        ])
+        written += len(rows)
+        reported.update(row['server_id'] for row in rows)
+
+    update_rollups(batches)
+    update_latest_metrics(batches)
+
+    if reported:
+        # One executemany UPDATE by primary key for every server in the batch
+        received_at = datetime.now(timezone.utc)
+        values = {'last_seen': received_at, 'last_push_at': received_at} if pushed else {'last_seen': received_at}
+        db.session.execute(update(Server), [{'id': server_id, **values} for server_id in reported])
+
+    db.session.commit()
+    return written
+
+
+def update_latest_metrics(batches):
+    """Upsert the newest value of every column per server (caller commits)."""
+    latest = {}
+    for model, rows in batches.items():
+        columns = LATEST_COLUMNS.get(model)
+        if not columns:
+            continue
+        for row in rows:
+            timestamp = row.get('timestamp')
+            if timestamp is None:
+                continue
+            for column in columns:
+                if column not in row:
+                    continue
+                key = (row['server_id'], column)
+                if key not in latest or timestamp >= latest[key][0]:
+                    latest[key] = (timestamp, row[column])
+
+    if not latest:
+        return
+
+    rows = [{
+        'server_id': server_id,
+        'metric': metric,
+        'value': value,
+        'timestamp': timestamp
+    } for (server_id, metric), (timestamp, value) in latest.items()]
+
+    table = ServerLatestMetric.__table__
+    stmt = dialect_insert(table)
+    if stmt is None:
+        for row in rows:
+            db.session.merge(ServerLatestMetric(**row))
+        return
+
+    # Late batches (e.g. agent backfill) must not overwrite newer values
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['server_id', 'metric'],
+        set_={'value': stmt.excluded.value, 'timestamp': stmt.excluded.timestamp},
+        where=stmt.excluded.timestamp >= table.c.timestamp
+    )
+    db.session.execute(stmt, rows)
+
+
+class PayloadTooLarge(ValueError):
+    """Request body exceeds the size limit (after decompression)."""
+
+
+def decompress_body(body, max_size):
+    """
+    Inflate a gzip request body, refusing to produce more than ``max_size`` bytes.
+
+    Raises:
+        PayloadTooLarge: if the decompressed body is larger than ``max_size``
+        ValueError: if ``body`` is not valid gzip data
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, max_size + 1)
+    except zlib.error as e:
+        raise ValueError(f"Invalid gzip body: {e}") from e
+    if len(data) > max_size or decompressor.unconsumed_tail:
+        raise PayloadTooLarge(f"Body exceeds {max_size} bytes once decompressed")
+    if not decompressor.eof:
+        raise ValueError("Truncated gzip body")
+    return data
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 string or epoch seconds into an aware UTC datetime (None means now)."""
+    if value is None:
+        return datetime.now(timezone.utc)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            return datetime.fromtimestamp(value, tz=timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f"Timestamp out of range: {value!r}")
+    if isinstance(value, str):
+        try:
+            timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f"Invalid timestamp: {value}")
+        if timestamp.tzinfo is None:
+            return timestamp.replace(tzinfo=timezone.utc)
+        return timestamp.astimezone(timezone.utc)
+    raise ValueError(f"Invalid timestamp: {value!r}")
+
+
+def parse_ingest_payload(server_id, samples):
+    """
+    Convert samples pushed by an agent into rows for ``write_metric_rows``.
+
+    Each sample is ``{"timestamp": ..., "system": {...}, "network": {...}}``
+    where the sections hold column values; unknown columns are ignored.
+
+    Args:
+        server_id: Server the API key belongs to
+        samples: List of sample dicts
+
+    Returns:
+        dict: ``{model: [row dicts]}``
+
+    Raises:
+        ValueError: If a sample is malformed
+    """
+    batches = {}
+    for sample in samples:
+        if not isinstance(sample, dict):
+            raise ValueError("Each sample must be an object")
+        timestamp = parse_timestamp(sample.get('timestamp'))
+
+        for section, model in INGEST_SECTIONS.items():
+            values = sample.get(section)
+            if values is None:
+                continue
+            if not isinstance(values, dict):
+                raise ValueError(f"'{section}' must be an object")
+
+            row = {'server_id': server_id, 'timestamp': timestamp}
+            for column, python_type in INGEST_COLUMNS[model].items():
+                value = values.get(column)
+                if value is None:
+                    continue
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                    raise ValueError(f"'{section}.{column}' must be a finite number")
+                row[column] = python_type(value)
+
+            missing = [column for column in REQUIRED_COLUMNS[model] if column not in row]
+            if missing:
+                raise ValueError(f"'{section}' sample is missing {', '.join(missing)}")
+            batches.setdefault(model, []).append(row)
+
+    return batches
+
+
+# Global buffer for locally collected samples (one per process)
+metric_buffer = MetricBuffer()
@@ -0,0 +1,199 @@
+"""Lease-based leader election for scheduled background jobs.
+
+Every gunicorn worker and every replica runs its own scheduler, so each job
+is guarded by a named lease. Only the lease holder runs the job; the holder
+renews its leases on a heartbeat and another instance takes over once a lease
+expires (e.g. the leader process died).
+"""
+import atexit
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app.models import db, SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+
+def default_holder_id():
+    """Return an identifier unique to this process."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class DatabaseLeaseBackend:
+    """Leases stored as rows in ``scheduler_leases``.
+
+    Acquisition is a single conditional UPDATE, so the row lock taken by the
+    database decides the winner when several instances race for a lease.
+    """
+
+    def acquire(self, name, holder, ttl):
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=ttl)
+        table = SchedulerLease.__table__
+
+        with db.engine.begin() as conn:
+            result = conn.execute(
+                update(table)
+                .where(table.c.name == name)
+                .where(or_(table.c.holder == holder, table.c.expires_at < now))
+                .values(holder=holder, expires_at=expires_at, renewed_at=now)
+            )
+            if result.rowcount:
+                return True
+
+        # No row yet: the first instance to insert it wins
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(table).values(
+                    name=name, holder=holder, expires_at=expires_at, renewed_at=now
+                ))
+            return True
+        except IntegrityError:
+            return False
+
+    def renew(self, name, holder, ttl):
+        now = datetime.now(timezone.utc)
+        table = SchedulerLease.__table__
+
+        with db.engine.begin() as conn:
+            result = conn.execute(
+                update(table)
+                .where(table.c.name == name, table.c.holder == holder)
+                .values(expires_at=now + timedelta(seconds=ttl), renewed_at=now)
+            )
+            return bool(result.rowcount)
+
+    def release(self, name, holder):
+        table = SchedulerLease.__table__
+        with db.engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.name == name, table.c.holder == holder))
+
+
+class RedisLeaseBackend:
+    """Leases stored as Redis keys with a TTL (``SET NX PX``)."""
+
+    # Extend or delete the key only while we still own it
+    RENEW_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url, prefix='system-monitor:lease:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._renew = self.client.register_script(self.RENEW_SCRIPT)
+        self._release = self.client.register_script(self.RELEASE_SCRIPT)
+
+    def acquire(self, name, holder, ttl):
+        if self.renew(name, holder, ttl):
+            return True
+        return bool(self.client.set(self.prefix + name, holder, nx=True, px=int(ttl * 1000)))
+
+    def renew(self, name, holder, ttl):
+        return bool(self._renew(keys=[self.prefix + name], args=[holder, int(ttl * 1000)]))
+
+    def release(self, name, holder):
+        self._release(keys=[self.prefix + name], args=[holder])
+
+
+class LeaderElector:
+    """Track which job leases this process holds."""
+
+    def __init__(self, backend=None, ttl=30, holder=None):
+        # backend=None disables election: every instance runs every job
+        self.backend = backend
+        self.ttl = ttl
+        self.holder = holder or default_holder_id()
+        self.held = set()
+
+    def configure(self, backend, ttl=None):
+        self.backend = backend
+        if ttl is not None:
+            self.ttl = ttl
+        self.held = set()
+
+    def acquire(self, name):
+        """Acquire or extend the named lease. Returns True if this process owns it."""
+        if self.backend is None:
+            return True
+        try:
+            owned = self.backend.acquire(name, self.holder, self.ttl)
+        except Exception as e:
+            # Fail closed: better to skip one run than to run a job twice
+            logger.error(f"Error acquiring lease {name}: {e}")
+            owned = False
+
+        if owned:
+            if name not in self.held:
+                logger.info(f"Acquired lease {name} as {self.holder}")
+            self.held.add(name)
+        else:
+            self.held.discard(name)
+        return owned
+
+    def renew_all(self):
+        """Extend every lease this process holds; drop the ones that were lost."""
+        if self.backend is None:
+            return
+        for name in list(self.held):
+            try:
+                if not self.backend.renew(name, self.holder, self.ttl):
+                    logger.warning(f"Lost lease {name}")
+                    self.held.discard(name)
+            except Exception as e:
+                logger.error(f"Error renewing lease {name}: {e}")
+
+    def release_all(self):
+        """Give up all leases so another instance can take over immediately."""
+        if self.backend is None:
+            return
+        for name in list(self.held):
+            try:
+                self.backend.release(name, self.holder)
+            except Exception as e:
+                logger.error(f"Error releasing lease {name}: {e}")
+        self.held.clear()
+
+
+# Global elector instance (one per process)
+elector = LeaderElector()
+
+
+def create_lease_backend(app):
+    """Build the lease backend selected by ``LEADER_ELECTION_BACKEND``."""
+    backend_name = app.config.get('LEADER_ELECTION_BACKEND', 'database')
+
+    if backend_name == 'database':
+        return DatabaseLeaseBackend()
+    elif backend_name == 'redis':
+        return RedisLeaseBackend(app.config.get('REDIS_URL'))
+    elif backend_name == 'none':
+        return None
+
+    raise ValueError(f"Unknown LEADER_ELECTION_BACKEND: {backend_name}")
+
+
+def init_leader_election(app):
+    """Configure the global elector and release leases on shutdown."""
+    elector.configure(create_lease_backend(app), app.config.get('LEADER_LEASE_TTL', 30))
+
+    def release():
+        with app.app_context():
+            elector.release_all()
+
+    atexit.register(release)
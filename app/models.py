@@ -1,6 +1,7 @@
 """Database models for system monitoring application."""
 from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import declared_attr
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -8,6 +9,23 @@ from werkzeug.security import generate_password_hash, check_password_hash
 db = SQLAlchemy()
 
 
+def dialect_insert(table):
+    """
+    Return an INSERT construct supporting ON CONFLICT for the bound database.
+    
+    Returns:
+        Insert for PostgreSQL/SQLite, or None if the dialect has no upsert
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+
 class User(UserMixin, db.Model):
     """User model for authentication and authorization."""
     __tablename__ = 'users'
@@ -43,10 +61,11 @@ class Server(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     hostname = db.Column(db.String(255), nullable=False)
-    api_key = db.Column(db.String(255), nullable=False)
+    api_key = db.Column(db.String(255), nullable=False, index=True)  # looked up on every agent push
     is_active = db.Column(db.Boolean, default=True)
     is_local = db.Column(db.Boolean, default=False)  # True for the local server
     last_seen = db.Column(db.DateTime)
+    last_push_at = db.Column(db.DateTime)  # last POST /api/ingest; the poller skips servers that push
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
     # Relationships
@@ -70,6 +89,8 @@ class SystemMetric(db.Model):
     cpu_percent = db.Column(db.Float, nullable=False)
     cpu_freq = db.Column(db.Float)  # MHz
     cpu_temp_c = db.Column(db.Float)  # Celsius
+    cpu_iowait = db.Column(db.Float)  # percent of CPU time waiting on I/O
+    cpu_steal = db.Column(db.Float)  # percent of CPU time stolen by the hypervisor
     
     # Memory metrics
     memory_total = db.Column(db.BigInteger, nullable=False)  # bytes
@@ -114,6 +135,54 @@ class NetworkMetric(db.Model):
         return f'<NetworkMetric server={self.server_id} time={self.timestamp}>'
 
 
+class MetricRollupMixin:
+    """Columns shared by the downsampled rollup tables.
+    
+    Each row aggregates one metric of one server over one bucket. Rows are
+    upserted incrementally by the collector, so sum/count are stored instead
+    of the average to keep merges exact.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    server_id = db.Column(db.Integer, db.ForeignKey('servers.id', ondelete='CASCADE'), nullable=False)
+    metric = db.Column(db.String(50), nullable=False)  # source column, e.g. cpu_percent
+    bucket = db.Column(db.DateTime, nullable=False)  # bucket start (UTC)
+    
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    value_sum = db.Column(db.Float, nullable=False, default=0)
+    value_min = db.Column(db.Float)
+    value_max = db.Column(db.Float)
+    value_last = db.Column(db.Float)
+    last_at = db.Column(db.DateTime)  # timestamp of value_last
+    
+    @declared_attr
+    def __table_args__(cls):
+        return (
+            db.UniqueConstraint('server_id', 'metric', 'bucket', name=f'uq_{cls.__tablename__}_key'),
+        )
+    
+    @property
+    def value_avg(self):
+        return self.value_sum / self.sample_count if self.sample_count else None
+    
+    def __repr__(self):
+        return f'<{type(self).__name__} server={self.server_id} {self.metric} bucket={self.bucket}>'
+
+
+class MetricRollup1m(MetricRollupMixin, db.Model):
+    """1-minute rollups of system and network metrics."""
+    __tablename__ = 'metric_rollups_1m'
+
+
+class MetricRollup5m(MetricRollupMixin, db.Model):
+    """5-minute rollups of system and network metrics."""
+    __tablename__ = 'metric_rollups_5m'
+
+
+class MetricRollup1h(MetricRollupMixin, db.Model):
+    """1-hour rollups of system and network metrics."""
+    __tablename__ = 'metric_rollups_1h'
+
+
 class ProcessSnapshot(db.Model):
     """Process snapshot model for process monitoring."""
     __tablename__ = 'process_snapshots'
@@ -301,3 +370,56 @@ class DashboardLayout(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+
+
+class SchedulerLease(db.Model):
+    """Lease row electing a single owner for each scheduled background job."""
+    __tablename__ = 'scheduler_leases'
+    
+    name = db.Column(db.String(100), primary_key=True)  # job id
+    holder = db.Column(db.String(255), nullable=False)  # host:pid:nonce of the owner
+    expires_at = db.Column(db.DateTime, nullable=False)
+    renewed_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<SchedulerLease {self.name} holder={self.holder}>'
+
+
+class ServerLatestMetric(db.Model):
+    """Most recent value of every metric per server, upserted at ingest.
+    
+    Lets alerting and fleet views read current state with a primary-key
+    lookup instead of ``ORDER BY timestamp DESC`` on the time-series tables.
+    """
+    __tablename__ = 'server_latest_metrics'
+    
+    server_id = db.Column(db.Integer, db.ForeignKey('servers.id', ondelete='CASCADE'), primary_key=True)
+    metric = db.Column(db.String(50), primary_key=True)  # source column, e.g. cpu_percent
+    value = db.Column(db.Float)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<ServerLatestMetric server={self.server_id} {self.metric}={self.value}>'
+    
+    @classmethod
+    def for_servers(cls, server_ids=None, metrics=None):
+        """
+        Load latest values in a single query.
+        
+        Args:
+            server_ids: Servers to include (None = all)
+            metrics: Metric names to include (None = all)
+        
+        Returns:
+            dict: ``{server_id: {metric: value}}``
+        """
+        query = db.session.query(cls.server_id, cls.metric, cls.value)
+        if server_ids is not None:
+            query = query.filter(cls.server_id.in_(server_ids))
+        if metrics is not None:
+            query = query.filter(cls.metric.in_(metrics))
+        
+        latest = {}
+        for server_id, metric, value in query:
+            latest.setdefault(server_id, {})[metric] = value
+        return latest
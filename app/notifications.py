@@ -0,0 +1,252 @@
+"""Asynchronous notification delivery with a bounded queue and worker pool."""
+import atexit
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+
+logger = logging.getLogger(__name__)
+
+
+Notification = namedtuple('Notification', ['channel', 'deliver', 'description', 'attempt'])
+
+
+def parse_channel_limits(value):
+    """Parse ``"email:2,sms:1"`` into ``{'email': 2, 'sms': 1}``."""
+    limits = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        channel, _, limit = item.partition(':')
+        limits[channel.strip()] = int(limit)
+    return limits
+
+
+class NotificationDispatcher:
+    """
+    Deliver notifications off the alert-check path.
+
+    ``submit`` puts a delivery on a bounded queue and returns immediately. A
+    pool of worker threads drains it inside the app context; each channel
+    has its own concurrency limit so a hanging SMTP server can only tie up
+    its own slots; deliveries finding their channel full wait, parked, until
+    a slot is released. A delivery that returns False (or raises) is retried
+    with exponential backoff until ``max_attempts`` is reached.
+    """
+
+    def __init__(self, workers=4, max_queue=1000, channel_limits=None,
+                 max_attempts=4, backoff_base=2.0, backoff_max=60.0):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.app = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._semaphores = {}
+        self._retries = []  # heap of (due, seq, notification)
+        self._parked = {}  # channel -> deque of notifications waiting for a slot
+        self._seq = itertools.count()
+        self._retry_lock = threading.Lock()
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self.delivered = 0
+        self.failed = 0
+        self.rejected = 0
+        self.set_channel_limits(channel_limits or {})
+
+    def configure(self, workers=None, max_queue=None, channel_limits=None,
+                  max_attempts=None, backoff_base=None):
+        """Apply settings; queue size and worker count only take effect before ``start``."""
+        if workers is not None:
+            self.workers = workers
+        if max_queue is not None and not self.running:
+            self._queue = queue.Queue(maxsize=max_queue)
+        if channel_limits is not None:
+            self.set_channel_limits(channel_limits)
+        if max_attempts is not None:
+            self.max_attempts = max_attempts
+        if backoff_base is not None:
+            self.backoff_base = backoff_base
+
+    def set_channel_limits(self, limits):
+        with self._retry_lock:
+            self._semaphores = {channel: threading.BoundedSemaphore(limit) for channel, limit in limits.items()}
+            # Parked deliveries compete for the new slots
+            for parked in self._parked.values():
+                for notification in parked:
+                    heapq.heappush(self._retries, (time.monotonic(), next(self._seq), notification))
+            self._parked = {}
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self, app):
+        """Start the worker pool, delivering inside ``app``'s context."""
+        self.app = app
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f'notifications-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        """Wait up to ``timeout`` seconds for queued deliveries, then stop the workers."""
+        self.drain(timeout)
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, channel, deliver, description=''):
+        """
+        Queue a delivery.
+
+        Args:
+            channel: Channel name used for the concurrency limit
+            deliver: Callable run in the app context, returning True on success
+            description: Used in log messages
+
+        Returns:
+            bool: False if the queue is full and the notification was dropped
+        """
+        with self._idle:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(Notification(channel, deliver, description, 0))
+        except queue.Full:
+            self.rejected += 1
+            self._finish()
+            logger.error(f"Notification queue full, dropping {description or channel}")
+            return False
+        return True
+
+    def drain(self, timeout=None):
+        """Block until every submitted delivery succeeded or gave up; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'retrying': len(self._retries),
+            'waiting': sum(len(parked) for parked in self._parked.values()),
+            'pending': self._pending,
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'rejected': self.rejected
+        }
+
+    def _finish(self):
+        with self._idle:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.notify_all()
+
+    def _schedule(self, notification, delay):
+        with self._retry_lock:
+            heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq), notification))
+
+    def _claim_slot(self, notification):
+        """
+        Take a slot of the notification's channel, or park it until one frees up.
+
+        Returns:
+            threading.BoundedSemaphore: The semaphore to release (None if the
+            channel is unlimited), or False if the notification was parked
+        """
+        with self._retry_lock:
+            limit = self._semaphores.get(notification.channel)
+            if limit is None or limit.acquire(blocking=False):
+                return limit
+            self._parked.setdefault(notification.channel, deque()).append(notification)
+            return False
+
+    def _release_slot(self, channel, limit):
+        """Give a channel slot back and hand it to the oldest parked delivery."""
+        with self._retry_lock:
+            limit.release()
+            parked = self._parked.get(channel)
+            if parked:
+                heapq.heappush(self._retries, (time.monotonic(), next(self._seq), parked.popleft()))
+
+    def _next(self):
+        """Return the next due retry or queued notification, or None after a short wait."""
+        with self._retry_lock:
+            if self._retries and self._retries[0][0] <= time.monotonic():
+                return heapq.heappop(self._retries)[2]
+            wait = self._retries[0][0] - time.monotonic() if self._retries else 0.5
+        try:
+            return self._queue.get(timeout=max(0.01, min(wait, 0.5)))
+        except queue.Empty:
+            return None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            notification = self._next()
+            if notification is None:
+                continue
+
+            limit = self._claim_slot(notification)
+            if limit is False:
+                # Channel saturated: parked without spending an attempt
+                continue
+            try:
+                ok = self._deliver(notification)
+            finally:
+                if limit is not None:
+                    self._release_slot(notification.channel, limit)
+
+            if ok:
+                self.delivered += 1
+            elif notification.attempt + 1 < self.max_attempts:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** notification.attempt)
+                self._schedule(notification._replace(attempt=notification.attempt + 1), delay)
+                continue
+            else:
+                self.failed += 1
+                logger.error(
+                    f"Giving up on {notification.description or notification.channel} "
+                    f"after {self.max_attempts} attempts"
+                )
+            self._finish()
+
+    def _deliver(self, notification):
+        try:
+            with self.app.app_context():
+                return bool(notification.deliver())
+        except Exception as e:
+            logger.error(f"Error delivering {notification.description or notification.channel}: {e}")
+            return False
+
+
+# Global dispatcher (started per process by init_notifications)
+notification_dispatcher = NotificationDispatcher()
+
+
+def init_notifications(app):
+    """Start the notification worker pool; with 0 workers alerts are sent inline."""
+    workers = app.config.get('NOTIFICATION_WORKERS', 4)
+    if workers <= 0:
+        if notification_dispatcher.running:
+            notification_dispatcher.stop(0)
+        return
+    notification_dispatcher.configure(
+        workers=workers,
+        max_queue=app.config.get('NOTIFICATION_QUEUE_SIZE', 1000),
+        channel_limits=parse_channel_limits(app.config.get('NOTIFICATION_CHANNEL_LIMITS', '')),
+        max_attempts=app.config.get('NOTIFICATION_MAX_ATTEMPTS', 4),
+        backoff_base=app.config.get('NOTIFICATION_RETRY_BACKOFF', 2.0)
+    )
+    if not notification_dispatcher.running:
+        atexit.register(notification_dispatcher.stop, 10)
+    notification_dispatcher.start(app)
@@ -0,0 +1,190 @@
+"""Concurrent pull-mode polling of remote agents."""
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from types import MappingProxyType
+
+from app.sampler import Snapshot
+from app.utils.http import http_sessions
+
+
+RemoteTarget = namedtuple('RemoteTarget', ['id', 'name', 'hostname', 'api_key'])
+
+
+def agent_session():
+    """Keep-alive session for agent traffic: a small pool for each of many hosts."""
+    return http_sessions.session('agents', pool_connections=1000, pool_maxsize=4)
+
+
+class RemotePoller:
+    """
+    Fetch one sample from many agents at once.
+
+    Requests run on a bounded thread pool sharing the agents' keep-alive session, each
+    with its own connect/read timeout. ``poll`` stops waiting at its deadline,
+    so a batch of dead hosts can never push the round past the poll interval.
+    """
+
+    def __init__(self, max_workers=32, timeout=5):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers=None, timeout=None):
+        with self._lock:
+            if max_workers is not None and max_workers != self.max_workers:
+                self.max_workers = max_workers
+                self._close()
+            if timeout is not None:
+                self.timeout = timeout
+
+    def _close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='remote-poll')
+            return self._executor
+
+    def fetch(self, target):
+        """Fetch one ingest-format sample from ``target``'s agent."""
+        response = agent_session().get(
+            f"http://{target.hostname}/api/sample",
+            headers={'X-API-Key': target.api_key},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def poll(self, targets, deadline):
+        """
+        Poll every target concurrently.
+
+        Args:
+            targets: RemoteTarget list
+            deadline: Seconds to wait for the whole round
+
+        Returns:
+            tuple: (``{server_id: sample}``, ``{server_id: error message}``)
+        """
+        executor = self._ensure_started()
+        futures = {executor.submit(self.fetch, target): target for target in targets}
+        done, not_done = wait(futures, timeout=deadline)
+
+        samples = {}
+        errors = {}
+        for future in done:
+            target = futures[future]
+            try:
+                samples[target.id] = future.result()
+            except Exception as e:
+                errors[target.id] = str(e)
+        for future in not_done:
+            future.cancel()
+            errors[futures[future].id] = f"No response within {deadline}s"
+        return samples, errors
+
+    def shutdown(self):
+        with self._lock:
+            self._close()
+
+
+# Global poller (driven by the poll_remote job on the lease holder)
+remote_poller = RemotePoller()
+
+
+class _Flight:
+    """One upstream fetch that concurrent callers wait on."""
+
+    __slots__ = ('done', 'snapshot', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.snapshot = None
+        self.error = None
+
+
+class RemoteMetricsCache:
+    """
+    Short-lived snapshots of remote agents' real-time metrics.
+
+    A snapshot younger than ``ttl`` is served as is. Otherwise the first caller
+    fetches a new one while concurrent callers for the same key wait for its
+    result (single-flight), so any number of dashboards on one server cost at
+    most one upstream request per TTL. Failures are passed to every waiter and
+    are not cached.
+    """
+
+    def __init__(self):
+        self._snapshots = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, fetch, ttl=2.0, timeout=10.0):
+        """
+        Return a snapshot for ``key``, calling ``fetch()`` when it is stale.
+
+        Args:
+            key: Cache key (e.g. the server id)
+            fetch: Callable returning the metrics dict
+            ttl: Seconds a snapshot may be served
+            timeout: Seconds to wait for another caller's fetch
+
+        Returns:
+            tuple: (Snapshot, True if this call fetched it)
+
+        Raises:
+            TimeoutError: if another caller's fetch did not finish in time;
+            otherwise whatever ``fetch`` raised
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and time.monotonic() - snapshot.monotonic < ttl:
+                return snapshot, False
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                raise TimeoutError(f"No response within {timeout}s")
+            if flight.error is not None:
+                raise flight.error
+            return flight.snapshot, False
+
+        try:
+            data = MappingProxyType(fetch())
+            flight.snapshot = Snapshot(datetime.now(timezone.utc), time.monotonic(), data)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.snapshot is not None:
+                    self._snapshots[key] = flight.snapshot
+            flight.done.set()
+        return flight.snapshot, True
+
+    def age(self, snapshot):
+        return time.monotonic() - snapshot.monotonic
+
+    def discard(self, key):
+        with self._lock:
+            self._snapshots.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+
+
+# Global cache behind the /api/metrics proxy for remote servers
+remote_metrics_cache = RemoteMetricsCache()
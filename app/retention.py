@@ -0,0 +1,210 @@
+"""Data retention: drop expired partitions and delete old rows in bounded chunks.
+
+On PostgreSQL the raw metric tables are range-partitioned by day (see the
+``partition_metric_tables`` migration), so expiring a day of samples is a
+``DROP TABLE`` of its partition. Rows that partitions can't cover (the
+default partition, rollups, alert history, SQLite) are deleted in chunks of
+``chunk_size`` rows, each in its own short transaction, so a large backlog
+never holds one long lock or produces one huge WAL burst. A run stops after
+``max_runtime`` seconds and the next run picks up where it left off.
+"""
+import logging
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select, text
+
+from app.models import db, SystemMetric, NetworkMetric, ProcessSnapshot, AlertHistory
+from app.rollups import RESOLUTIONS
+
+logger = logging.getLogger(__name__)
+
+# Raw tables partitioned by day on PostgreSQL
+PARTITIONED_MODELS = [SystemMetric, NetworkMetric, ProcessSnapshot]
+
+# Alert history is kept for 90 days regardless of metric retention
+ALERT_HISTORY_RETENTION_DAYS = 90
+
+RetentionTarget = namedtuple('RetentionTarget', ['model', 'column', 'cutoff'])
+
+
+def partition_name(table_name, day):
+    return f"{table_name}_p{day:%Y%m%d}"
+
+
+def _utc_naive(value):
+    # Timestamps are stored as naive UTC
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def is_partitioned(table_name):
+    """True if ``table_name`` is a partitioned table (PostgreSQL only)."""
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    return db.session.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table"
+    ), {'table': table_name}).first() is not None
+
+
+def list_partitions(table_name):
+    """Names of the daily partitions of ``table_name`` mapped to their day."""
+    names = db.session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {'table': table_name}).scalars()
+    partitions = {}
+    prefix = f"{table_name}_p"
+    for name in names:
+        try:
+            partitions[name] = datetime.strptime(name[len(prefix):], '%Y%m%d').date()
+        except ValueError:
+            continue  # e.g. the default partition
+    return partitions
+
+
+def create_partitions(table_name, first_day, days):
+    """
+    Make sure daily partitions exist for ``days`` days from ``first_day``.
+
+    A day whose rows already landed in the default partition is skipped (its
+    rows stay there and expire through chunked deletes).
+
+    Returns:
+        int: Number of partitions created
+    """
+    existing = set(list_partitions(table_name).values())
+    created = 0
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        if day in existing:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.execute(text(
+                    f'CREATE TABLE IF NOT EXISTS "{partition_name(table_name, day)}" '
+                    f'PARTITION OF "{table_name}" '
+                    f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+                ))
+            created += 1
+        except Exception as e:
+            logger.warning(f"Could not create partition of {table_name} for {day}: {e}")
+    db.session.commit()
+    return created
+
+
+def drop_expired_partitions(table_name, cutoff):
+    """
+    Drop the daily partitions of ``table_name`` that end before ``cutoff``.
+
+    Returns:
+        int: Number of partitions dropped
+    """
+    cutoff_day = _utc_naive(cutoff).date()
+    dropped = 0
+    for name, day in sorted(list_partitions(table_name).items(), key=lambda item: item[1]):
+        if day + timedelta(days=1) > cutoff_day:
+            continue
+        db.session.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+        db.session.commit()
+        dropped += 1
+        logger.info(f"Retention: dropped partition {name}")
+    return dropped
+
+
+def delete_in_chunks(model, column, cutoff, chunk_size=5000, deadline=None, pause=0.0):
+    """
+    Delete rows of ``model`` with ``column < cutoff``, ``chunk_size`` at a time.
+
+    Every chunk is committed separately and followed by ``pause`` seconds so
+    other writers get the lock in between.
+
+    Args:
+        model: Model to delete from (needs an ``id`` primary key)
+        column: Timestamp column compared with ``cutoff``
+        cutoff: Rows older than this are deleted
+        chunk_size: Rows deleted per transaction
+        deadline: ``time.monotonic()`` value after which to stop
+        pause: Seconds to sleep between chunks
+
+    Returns:
+        tuple: (rows deleted, True if nothing older than ``cutoff`` is left)
+    """
+    cutoff = _utc_naive(cutoff)
+    table_name = model.__tablename__
+    deleted = 0
+    started = time.monotonic()
+    last_report = started
+    while True:
+        ids = select(model.id).where(column < cutoff).limit(chunk_size).scalar_subquery()
+        # The time predicate on the outer DELETE too lets a partitioned table
+        # prune to the expired partitions instead of probing every one
+        result = db.session.execute(
+            delete(model).where(column < cutoff, model.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        deleted += result.rowcount
+        if result.rowcount < chunk_size:
+            return deleted, True
+
+        now = time.monotonic()
+        if now - last_report >= 10:
+            rate = deleted / (now - started)
+            logger.info(f"Retention: {table_name} deleted {deleted} rows so far ({rate:.0f} rows/s)")
+            last_report = now
+        if deadline is not None and now >= deadline:
+            return deleted, False
+        if pause:
+            time.sleep(pause)
+
+
+def retention_targets(config, now=None):
+    """Every table with a retention policy, with its cutoff."""
+    now = now or datetime.now(timezone.utc)
+    raw_cutoff = now - timedelta(days=config.get('DATA_RETENTION_DAYS', 30))
+    targets = [RetentionTarget(model, model.timestamp, raw_cutoff) for model in PARTITIONED_MODELS]
+    # Rollups outlive raw samples, each resolution has its own retention
+    for res in RESOLUTIONS:
+        rollup_days = config.get(res.retention_key, res.default_retention_days)
+        targets.append(RetentionTarget(res.model, res.model.bucket, now - timedelta(days=rollup_days)))
+    targets.append(RetentionTarget(AlertHistory, AlertHistory.triggered_at,
+                                   now - timedelta(days=ALERT_HISTORY_RETENTION_DAYS)))
+    return targets
+
+
+def run_retention(config, now=None):
+    """
+    Apply every retention policy once.
+
+    Args:
+        config: App config (DATA_RETENTION_DAYS, ROLLUP_*_RETENTION_DAYS, RETENTION_*)
+        now: Reference time (defaults to now)
+
+    Returns:
+        dict: ``{table: {'partitions_dropped', 'rows_deleted', 'complete'}}``
+    """
+    now = now or datetime.now(timezone.utc)
+    chunk_size = config.get('RETENTION_CHUNK_SIZE', 5000)
+    pause = config.get('RETENTION_CHUNK_PAUSE', 0.05)
+    deadline = time.monotonic() + config.get('RETENTION_MAX_RUNTIME', 300)
+    partitions_ahead = config.get('RETENTION_PARTITIONS_AHEAD', 3)
+
+    report = {}
+    for target in retention_targets(config, now):
+        table_name = target.model.__tablename__
+        dropped = 0
+        if is_partitioned(table_name):
+            dropped = drop_expired_partitions(table_name, target.cutoff)
+            create_partitions(table_name, _utc_naive(now).date(), partitions_ahead + 1)
+
+        deleted, complete = 0, False
+        if time.monotonic() < deadline:
+            deleted, complete = delete_in_chunks(target.model, target.column, target.cutoff,
+                                                 chunk_size, deadline, pause)
+        report[table_name] = {'partitions_dropped': dropped, 'rows_deleted': deleted, 'complete': complete}
+        if dropped or deleted:
+            logger.info(f"Retention: {table_name} dropped {dropped} partitions, deleted {deleted} rows"
+                        + ('' if complete else ' (time budget used up, continuing next run)'))
+    return report
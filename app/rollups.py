@@ -0,0 +1,282 @@
+"""Downsampled metric rollups and resolution selection for history queries."""
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import case
+
+from app.models import db, dialect_insert, SystemMetric, NetworkMetric, MetricRollup1m, MetricRollup5m, MetricRollup1h
+
+
+Resolution = namedtuple('Resolution', ['label', 'seconds', 'model', 'retention_key', 'default_retention_days'])
+
+# Finest to coarsest
+RESOLUTIONS = [
+    Resolution('1m', 60, MetricRollup1m, 'ROLLUP_1M_RETENTION_DAYS', 30),
+    Resolution('5m', 300, MetricRollup5m, 'ROLLUP_5M_RETENTION_DAYS', 180),
+    Resolution('1h', 3600, MetricRollup1h, 'ROLLUP_1H_RETENTION_DAYS', 730),
+]
+RESOLUTIONS_BY_LABEL = {res.label: res for res in RESOLUTIONS}
+
+# Raw columns rolled up for each source model
+ROLLUP_COLUMNS = {
+    SystemMetric: ['cpu_percent', 'cpu_iowait', 'cpu_steal', 'memory_percent', 'disk_percent', 'cpu_temp_c'],
+    NetworkMetric: ['bytes_sent', 'bytes_recv', 'connections_established',
+                    'connections_listen', 'connections_time_wait'],
+}
+
+# Rows merged by the ingest buffer record how many raw samples they stand for
+SAMPLES_KEY = '_samples'
+
+# Cumulative counters are reported by their last value instead of the average
+COUNTER_COLUMNS = {'bytes_sent', 'bytes_recv'}
+
+# Source model and columns served by /api/metrics/history for each metric type
+HISTORY_COLUMNS = {
+    'system': (SystemMetric, ['cpu_percent', 'memory_percent', 'disk_percent', 'cpu_temp_c']),
+    'network': (NetworkMetric, ['bytes_sent', 'bytes_recv', 'connections_established']),
+}
+
+
+def as_utc(timestamp):
+    """Treat naive datetimes (as returned by SQLite) as UTC."""
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = EPOCH.replace(tzinfo=timezone.utc)
+
+
+def epoch_seconds(timestamps):
+    """
+    Convert datetimes to a float64 array of epoch seconds.
+
+    Naive datetimes are treated as UTC, like ``as_utc``.
+    """
+    return np.fromiter(
+        ((timestamp - (EPOCH_UTC if timestamp.tzinfo else EPOCH)).total_seconds() for timestamp in timestamps),
+        dtype=np.float64, count=len(timestamps)
+    )
+
+
+def bucket_start(timestamp, seconds):
+    """Floor a timestamp to the start of its ``seconds``-wide bucket."""
+    epoch = as_utc(timestamp).timestamp()
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=timezone.utc)
+
+
+def build_rollup_rows(batches):
+    """
+    Aggregate raw rows into partial rollup rows for every resolution.
+
+    Args:
+        batches: ``{model: [row dicts]}`` of raw samples
+
+    Returns:
+        dict: ``{resolution label: [rollup row dicts]}``
+    """
+    partials = {res.label: {} for res in RESOLUTIONS}
+
+    for model, rows in batches.items():
+        columns = ROLLUP_COLUMNS.get(model)
+        if not columns:
+            continue
+
+        for row in rows:
+            timestamp = row.get('timestamp')
+            if timestamp is None:
+                continue
+            timestamp = as_utc(timestamp)
+            weight = row.get(SAMPLES_KEY, 1)
+
+            for res in RESOLUTIONS:
+                bucket = bucket_start(timestamp, res.seconds)
+                aggregates = partials[res.label]
+
+                for column in columns:
+                    value = row.get(column)
+                    if value is None:
+                        continue
+                    value = float(value)
+                    key = (row['server_id'], column, bucket)
+                    agg = aggregates.get(key)
+
+                    if agg is None:
+                        aggregates[key] = {
+                            'server_id': row['server_id'],
+                            'metric': column,
+                            'bucket': bucket,
+                            'sample_count': weight,
+                            'value_sum': value * weight,
+                            'value_min': value,
+                            'value_max': value,
+                            'value_last': value,
+                            'last_at': timestamp
+                        }
+                    else:
+                        agg['sample_count'] += weight
+                        agg['value_sum'] += value * weight
+                        agg['value_min'] = min(agg['value_min'], value)
+                        agg['value_max'] = max(agg['value_max'], value)
+                        if timestamp >= agg['last_at']:
+                            agg['value_last'] = value
+                            agg['last_at'] = timestamp
+
+    return {label: list(aggregates.values()) for label, aggregates in partials.items()}
+
+
+def upsert_rollup_rows(model, rows):
+    """
+    Merge partial rollup rows into ``model``'s table.
+
+    On PostgreSQL and SQLite this is a single INSERT ... ON CONFLICT DO UPDATE
+    whose SET clause combines the stored and incoming aggregates, so
+    concurrent writers never lose each other's samples.
+    """
+    table = model.__table__
+    stmt = dialect_insert(table)
+    if stmt is None:
+        return _merge_rollup_rows(model, rows)
+
+    new = stmt.excluded
+    newer = new.last_at >= table.c.last_at
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['server_id', 'metric', 'bucket'],
+        set_={
+            'sample_count': table.c.sample_count + new.sample_count,
+            'value_sum': table.c.value_sum + new.value_sum,
+            'value_min': case((new.value_min < table.c.value_min, new.value_min), else_=table.c.value_min),
+            'value_max': case((new.value_max > table.c.value_max, new.value_max), else_=table.c.value_max),
+            'value_last': case((newer, new.value_last), else_=table.c.value_last),
+            'last_at': case((newer, new.last_at), else_=table.c.last_at),
+        }
+    )
+    db.session.execute(stmt, rows)
+
+
+def _merge_rollup_rows(model, rows):
+    """Read-modify-write fallback for databases without ON CONFLICT."""
+    for row in rows:
+        existing = model.query.filter_by(
+            server_id=row['server_id'], metric=row['metric'], bucket=row['bucket']
+        ).first()
+        if existing is None:
+            db.session.add(model(**row))
+            continue
+        existing.sample_count += row['sample_count']
+        existing.value_sum += row['value_sum']
+        existing.value_min = min(existing.value_min, row['value_min'])
+        existing.value_max = max(existing.value_max, row['value_max'])
+        if existing.last_at is None or row['last_at'] >= as_utc(existing.last_at):
+            existing.value_last = row['value_last']
+            existing.last_at = row['last_at']
+
+
+def update_rollups(batches):
+    """Fold a batch of raw rows into every rollup table (caller commits)."""
+    partials = build_rollup_rows(batches)
+    for res in RESOLUTIONS:
+        rows = partials[res.label]
+        if rows:
+            upsert_rollup_rows(res.model, rows)
+
+
+def select_resolution(span_seconds, points):
+    """
+    Pick the coarsest resolution that still yields ``points`` buckets.
+
+    Returns:
+        Resolution, or None when only raw samples are fine enough
+    """
+    for res in reversed(RESOLUTIONS):
+        if span_seconds / res.seconds >= points:
+            return res
+    return None
+
+
+def query_rollup_history(res, metric_type, server_id, start_time):
+    """
+    Load history points for ``metric_type`` from a rollup table.
+
+    Gauges are reported as the bucket average with ``<column>_min`` and
+    ``<column>_max`` alongside; counters report their last value.
+    """
+    _, columns = HISTORY_COLUMNS[metric_type]
+    model = res.model
+
+    rows = db.session.query(
+        model.bucket, model.metric, model.sample_count, model.value_sum,
+        model.value_min, model.value_max, model.value_last
+    ).filter(
+        model.server_id == server_id,
+        model.bucket >= bucket_start(start_time, res.seconds),
+        model.metric.in_(columns)
+    ).order_by(model.bucket).all()
+
+    points = {}
+    for bucket, metric, count, total, value_min, value_max, value_last in rows:
+        point = points.get(bucket)
+        if point is None:
+            point = points[bucket] = {'timestamp': bucket.isoformat()}
+            point.update((column, None) for column in columns)
+
+        if metric in COUNTER_COLUMNS:
+            point[metric] = value_last
+        else:
+            point[metric] = total / count if count else None
+        point[f'{metric}_min'] = value_min
+        point[f'{metric}_max'] = value_max
+
+    return list(points.values())
+
+
+def query_rollup_columns(res, metric_type, server_id, start_time):
+    """
+    Columnar counterpart of ``query_rollup_history``.
+
+    Returns:
+        tuple: (bucket start epoch seconds, ``{name: values}``) as float64
+        arrays with NaN for missing values; names are the same as the keys
+        of ``query_rollup_history`` points
+    """
+    _, columns = HISTORY_COLUMNS[metric_type]
+    model = res.model
+
+    rows = db.session.query(
+        model.bucket, model.metric, model.sample_count, model.value_sum,
+        model.value_min, model.value_max, model.value_last
+    ).filter(
+        model.server_id == server_id,
+        model.bucket >= bucket_start(start_time, res.seconds),
+        model.metric.in_(columns)
+    ).order_by(model.bucket).all()
+
+    names = [name for column in columns for name in (column, f'{column}_min', f'{column}_max')]
+    if not rows:
+        return np.empty(0), {name: np.empty(0) for name in names}
+
+    buckets, metrics, counts, sums, mins, maxes, lasts = zip(*rows)
+    timestamps, position = np.unique(epoch_seconds(buckets), return_inverse=True)
+    metrics = np.array(metrics)
+    counts = np.array(counts, dtype=np.float64)
+    averages = np.divide(np.array(sums, dtype=np.float64), counts,
+                         out=np.full(len(counts), np.nan), where=counts > 0)
+    sources = {
+        'avg': averages,
+        'last': np.array(lasts, dtype=np.float64),
+        'min': np.array(mins, dtype=np.float64),
+        'max': np.array(maxes, dtype=np.float64),
+    }
+
+    values = {}
+    for column in columns:
+        mask = metrics == column
+        at = position[mask]
+        main = 'last' if column in COUNTER_COLUMNS else 'avg'
+        for name, source in ((column, main), (f'{column}_min', 'min'), (f'{column}_max', 'max')):
+            series = np.full(len(timestamps), np.nan)
+            series[at] = sources[source][mask]
+            values[name] = series
+    return timestamps, values
@@ -1,27 +1,32 @@
 """Routes and view logic using Flask Blueprints."""
+import json
+import os
+import numpy as np
 import psutil
-import requests
-from flask import Blueprint, jsonify, render_template, request, current_app
+from flask import Blueprint, Response, jsonify, render_template, request, current_app, stream_with_context, send_file, url_for
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta, timezone
 from app.models import (db, Server, SystemMetric, NetworkMetric, ProcessSnapshot,
-                         AlertRule, AlertHistory, UserPreference)
-from app.export import export_metrics_to_csv, export_metrics_to_json, create_export_response
-from app.alerts import test_alert_notification
-from sqlalchemy import func
+                         AlertRule, AlertHistory, UserPreference, ServerLatestMetric)
+from app.export import export_metrics_to_csv, export_metrics_to_json, export_metrics_to_arrow, create_export_response, EXPORT_MIMETYPES
+from app.export_jobs import export_jobs, parse_export_request
+from app.alerts import test_alert_notification, alert_tracker
+from app.ingest import PayloadTooLarge, decompress_body, parse_ingest_payload, write_metric_rows
+from app.poller import agent_session, remote_metrics_cache
+from app.utils.http import http_sessions
+from app.utils.cursors import encode_cursor, make_etag, parse_since
+from app.rollups import (HISTORY_COLUMNS, RESOLUTIONS_BY_LABEL, as_utc, bucket_start, epoch_seconds,
+                         select_resolution, query_rollup_history, query_rollup_columns)
+from app.series import SERIES_FORMATS, MSGPACK_MIMETYPE, encode_columns, encode_msgpack
+from app.downsample import DOWNSAMPLE_METHODS, downsample_points, select_indices
+from app.sampler import sampler, collectors
+from app.stream import broadcaster
+from agent.formatting import get_size
+from sqlalchemy import Integer, and_, cast, func, or_
 
 main = Blueprint('main', __name__)
 
 
-def get_size(bytes, suffix="B"):
-    """Scale bytes to its proper format (e.g., 1253656 => '1.20MB')."""
-    factor = 1024
-    for unit in ["", "K", "M", "G", "T", "P"]:
-        if bytes < factor:
-            return f"{bytes:.2f}{unit}{suffix}"
-        bytes /= factor
-
-
 # ============================================================================
 # DASHBOARD ROUTES
 # ============================================================================
@@ -73,12 +78,24 @@ def settings():
 @main.route('/api/metrics')
 @login_required
 def metrics():
-    """API endpoint to get real-time system metrics."""
+    """
+    API endpoint to get real-time system metrics.
+    
+    ``fields`` (e.g. ``cpu,memory,network``) limits the response to those
+    top-level keys. The sampler only runs the collectors requested within
+    METRICS_DEMAND_WINDOW seconds, so a field nobody asks for costs nothing.
+    """
     server_id = request.args.get('server_id', type=int)
+    fields = None
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = set(fields) - set(collectors.names)
+        if unknown:
+            return jsonify({'error': f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
     
     # Get server (default to local if not specified)
     if server_id:
-        server = Server.query.get(server_id)
+        server = db.session.get(Server, server_id)
     else:
         server = Server.query.filter_by(is_local=True).first()
     
@@ -87,130 +104,157 @@ def metrics():
     
     # If remote server, fetch from agent
     if not server.is_local:
-        return fetch_remote_metrics(server)
-    
-    # Collect local metrics
-    cpu_percent = psutil.cpu_percent(interval=None)
-    cpu_freq = psutil.cpu_freq()
-    cpu_freq_current = cpu_freq.current if cpu_freq else 0
+        return fetch_remote_metrics(server, fields)
     
-    # CPU temperature
-    cpu_temp_c = None
-    cpu_temp_f = None
-    try:
-        temps = psutil.sensors_temperatures()
-        if 'coretemp' in temps:
-            cpu_temp_c = temps['coretemp'][0].current
-        elif 'cpu_thermal' in temps:
-            cpu_temp_c = temps['cpu_thermal'][0].current
-        elif 'k10temp' in temps:
-            cpu_temp_c = temps['k10temp'][0].current
-        
-        if cpu_temp_c is not None:
-            cpu_temp_f = (cpu_temp_c * 9/5) + 32
-    except Exception:
-        pass
-
-    # Memory usage
-    svmem = psutil.virtual_memory()
-    swap = psutil.swap_memory()
-    memory_usage = {
-        'total': get_size(svmem.total),
-        'available': get_size(svmem.available),
-        'used': get_size(svmem.used),
-        'percent': svmem.percent,
-        'swap_total': get_size(swap.total),
-        'swap_used': get_size(swap.used),
-        'swap_free': get_size(swap.free),
-        'swap_percent': swap.percent
+    # Serve the shared sampler snapshot instead of scanning the host per request
+    snapshot = sampler.get_snapshot(fields=fields)
+    data = {key: value for key, value in snapshot.data.items() if fields is None or key in fields}
+    data['snapshot'] = {
+        'timestamp': snapshot.timestamp.isoformat(),
+        'age': round(sampler.age(snapshot), 3)
     }
+    return jsonify(data)
 
-    # Disk usage
-    partitions = psutil.disk_partitions()
-    disk_usage_info = []
-    for partition in partitions:
-        try:
-            partition_usage = psutil.disk_usage(partition.mountpoint)
-            disk_usage_info.append({
-                'device': partition.device,
-                'mountpoint': partition.mountpoint,
-                'total': get_size(partition_usage.total),
-                'used': get_size(partition_usage.used),
-                'free': get_size(partition_usage.free),
-                'percent': partition_usage.percent
-            })
-        except PermissionError:
-            continue
-
-    # Disk I/O
-    disk_io = psutil.disk_io_counters()
-    disk_io_info = {
-        'read_bytes': get_size(disk_io.read_bytes),
-        'write_bytes': get_size(disk_io.write_bytes),
-        'read_bytes_raw': disk_io.read_bytes,
-        'write_bytes_raw': disk_io.write_bytes,
-        'read_count': disk_io.read_count,
-        'write_count': disk_io.write_count
-    }
-    
-    # Network I/O
-    net_io = psutil.net_io_counters()
-    network_info = {
-        'bytes_sent': get_size(net_io.bytes_sent),
-        'bytes_recv': get_size(net_io.bytes_recv),
-        'bytes_sent_raw': net_io.bytes_sent,
-        'bytes_recv_raw': net_io.bytes_recv,
-        'packets_sent': net_io.packets_sent,
-        'packets_recv': net_io.packets_recv
-    }
+
+@main.route('/api/metrics/collectors')
+@login_required
+def metrics_collector_stats():
+    """Per-collector cost of this worker process's real-time metrics."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin privileges required'}), 403
     
-    # Network connections
-    try:
-        connections = psutil.net_connections(kind='inet')
-        conn_stats = {
-            'established': sum(1 for c in connections if c.status == 'ESTABLISHED'),
-            'listen': sum(1 for c in connections if c.status == 'LISTEN'),
-            'time_wait': sum(1 for c in connections if c.status == 'TIME_WAIT'),
-            'total': len(connections)
-        }
-    except Exception:
-        conn_stats = {'established': 0, 'listen': 0, 'time_wait': 0, 'total': 0}
+    return jsonify({'pid': os.getpid(), 'collectors': collectors.stats()})
 
-    return jsonify({
-        'cpu': {
-            'percent': cpu_percent,
-            'freq': f"{cpu_freq_current:.2f}Mhz",
-            'temp_c': cpu_temp_c,
-            'temp_f': cpu_temp_f
-        },
-        'memory': memory_usage,
-        'disk': disk_usage_info,
-        'io': disk_io_info,
-        'network': network_info,
-        'connections': conn_stats
+
+@main.route('/api/stream/metrics')
+@login_required
+def stream_metrics():
+    """Server-Sent Events stream of the local real-time metrics snapshots."""
+    server_id = request.args.get('server_id', type=int)
+    if server_id:
+        server = db.session.get(Server, server_id)
+        if not server:
+            return jsonify({'error': 'Server not found'}), 404
+        if not server.is_local:
+            return jsonify({'error': 'Live stream is only available for the local server; poll /api/metrics'}), 400
+    
+    if not sampler.running:
+        return jsonify({'error': 'Metrics sampler is disabled; poll /api/metrics'}), 503
+    
+    # Streams render every field: keep all collectors sampled while it may last
+    max_duration = current_app.config.get('STREAM_MAX_DURATION', 300)
+    sampler.want(None, max_duration)
+    snapshot = sampler.get_snapshot()
+    subscription = broadcaster.subscribe(broadcaster.encode(snapshot, sampler.age(snapshot)))
+    if subscription is None:
+        return jsonify({'error': 'Too many live streams; poll /api/metrics'}), 503
+    
+    body = broadcaster.stream(
+        subscription,
+        heartbeat=current_app.config.get('STREAM_HEARTBEAT', 15),
+        max_duration=max_duration
+    )
+    return Response(body, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
 
-def fetch_remote_metrics(server):
-    """Fetch metrics from a remote server agent."""
-    try:
-        response = requests.get(
-            f"http://{server.hostname}/api/metrics",
-            headers={'X-API-Key': server.api_key},
+def fetch_remote_metrics(server, fields=None):
+    """
+    Fetch metrics from a remote server agent.
+    
+    Concurrent requests for the same server share one upstream call and its
+    result is reused for REMOTE_METRICS_TTL seconds; the response reports the
+    snapshot's age like the local sampler does. ``fields`` trims the response
+    (the agent itself always collects everything).
+    """
+    hostname, api_key = server.hostname, server.api_key
+    
+    def fetch():
+        response = agent_session().get(
+            f"http://{hostname}/api/metrics",
+            headers={'X-API-Key': api_key},
             timeout=5
         )
         response.raise_for_status()
+        return response.json()
+    
+    try:
+        # last_seen is left to ingest and the poller: it tells the poller the
+        # server pushes on its own, which a dashboard view says nothing about
+        snapshot, _ = remote_metrics_cache.get(
+            (server.id, hostname, api_key), fetch,
+            ttl=current_app.config.get('REMOTE_METRICS_TTL', 2),
+            timeout=10
+        )
         
-        # Update last_seen
-        server.last_seen = datetime.now(timezone.utc)
-        db.session.commit()
-        
-        return jsonify(response.json())
+        data = {key: value for key, value in snapshot.data.items() if fields is None or key in fields}
+        data['snapshot'] = {
+            'timestamp': snapshot.timestamp.isoformat(),
+            'age': round(remote_metrics_cache.age(snapshot), 3)
+        }
+        return jsonify(data)
     except Exception as e:
         current_app.logger.error(f"Error fetching metrics from {server.name}: {e}")
         return jsonify({'error': 'Failed to fetch metrics from remote server'}), 500
 
 
+# ============================================================================
+# AGENT INGEST API
+# ============================================================================
+
+@main.route('/api/ingest', methods=['POST'])
+def ingest_metrics():
+    """Accept a batch of samples pushed by a remote agent (authenticated by X-API-Key)."""
+    api_key = request.headers.get('X-API-Key')
+    server = Server.query.filter_by(api_key=api_key).first() if api_key else None
+    if not server:
+        return jsonify({'error': 'Invalid API key'}), 401
+    if not server.is_active:
+        return jsonify({'error': 'Server is disabled'}), 403
+    
+    max_body = current_app.config.get('INGEST_MAX_BODY_BYTES', 16 * 1024 * 1024)
+    if request.content_length is not None and request.content_length > max_body:
+        return jsonify({'error': f'Request body exceeds {max_body} bytes'}), 413
+    
+    try:
+        body = request.get_data()
+        if request.headers.get('Content-Encoding') == 'gzip':
+            body = decompress_body(body, max_body)
+        payload = json.loads(body)
+    except PayloadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except (OSError, ValueError):
+        return jsonify({'error': 'Invalid request body'}), 400
+    
+    samples = payload.get('samples') if isinstance(payload, dict) else None
+    if not isinstance(samples, list):
+        return jsonify({'error': "Expected a 'samples' list"}), 400
+    
+    max_samples = current_app.config.get('INGEST_MAX_SAMPLES', 1000)
+    if len(samples) > max_samples:
+        return jsonify({'error': f'At most {max_samples} samples per request'}), 413
+    
+    try:
+        batches = parse_ingest_payload(server.id, samples)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        # One bulk insert per table and one last_seen update for the whole batch
+        written = write_metric_rows(batches, pushed=True)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error ingesting metrics from {server.name}: {e}")
+        return jsonify({'error': 'Failed to store metrics'}), 503
+    
+    # Let the alert state machine see every sample straight away
+    alert_tracker.observe_batches(batches)
+    
+    return jsonify({'accepted': len(samples), 'rows': written})
+
+
 @main.route('/api/network/connections')
 @login_required
 def network_connections():
@@ -416,10 +460,45 @@ def disk_analyze():
 @main.route('/api/metrics/history')
 @login_required
 def metrics_history():
-    """Get historical metrics data."""
+    """
+    Get historical metrics data at the coarsest resolution that satisfies ``points``,
+    then thinned to ``max_points`` (default: the user's chart_data_points) by
+    LTTB or min/max decimation.
+    
+    With ``since`` (a ``next_cursor`` from a previous response, an ISO 8601
+    timestamp or epoch seconds) only newer points are returned. Responses carry
+    an ETag so an unchanged result costs a single aggregate query and a 304.
+    
+    ``format`` selects the layout: ``rows`` (default), ``columns`` or
+    ``msgpack`` (see app.series).
+    """
     server_id = request.args.get('server_id', type=int)
     hours = request.args.get('hours', default=24, type=int)
     metric_type = request.args.get('type', default='system')
+    points = request.args.get('points', default=current_app.config.get('HISTORY_DEFAULT_POINTS', 500), type=int)
+    resolution = request.args.get('resolution', default='auto')
+    max_points = request.args.get('max_points', type=int)
+    method = request.args.get('downsample', default='lttb')
+    output = request.args.get('format', default='rows')
+    
+    since = None
+    if request.args.get('since'):
+        try:
+            since = parse_since(request.args['since'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        # A cursor pins the resolution it was issued for
+        if resolution == 'auto' and since.get('r'):
+            resolution = since['r']
+    
+    if max_points is None and current_user.preferences and current_user.preferences.chart_data_points:
+        max_points = current_user.preferences.chart_data_points
+    if max_points is not None and max_points < 3:
+        return jsonify({'error': 'max_points must be at least 3'}), 400
+    if method not in DOWNSAMPLE_METHODS:
+        return jsonify({'error': 'Invalid downsample method'}), 400
+    if output not in SERIES_FORMATS:
+        return jsonify({'error': 'Invalid format'}), 400
     
     if not server_id:
         server = Server.query.filter_by(is_local=True).first()
@@ -428,38 +507,130 @@ def metrics_history():
     if not server_id:
         return jsonify({'error': 'Server not found'}), 404
     
+    if metric_type not in HISTORY_COLUMNS:
+        return jsonify({'error': 'Invalid metric type'}), 400
+    
+    # Pick raw samples or a rollup table
+    if resolution == 'auto':
+        res = select_resolution(hours * 3600, max(points, 1))
+    elif resolution == 'raw':
+        res = None
+    elif resolution in RESOLUTIONS_BY_LABEL:
+        res = RESOLUTIONS_BY_LABEL[resolution]
+    else:
+        return jsonify({'error': 'Invalid resolution'}), 400
+    
     start_time = datetime.now(timezone.utc) - timedelta(hours=hours)
     
-    if metric_type == 'system':
-        metrics = SystemMetric.query.filter(
-            SystemMetric.server_id == server_id,
-            SystemMetric.timestamp >= start_time
-        ).order_by(SystemMetric.timestamp).all()
-        
-        data = [{
-            'timestamp': m.timestamp.isoformat(),
-            'cpu_percent': m.cpu_percent,
-            'memory_percent': m.memory_percent,
-            'disk_percent': m.disk_percent,
-            'cpu_temp_c': m.cpu_temp_c
-        } for m in metrics]
-        
-    elif metric_type == 'network':
-        metrics = NetworkMetric.query.filter(
-            NetworkMetric.server_id == server_id,
-            NetworkMetric.timestamp >= start_time
-        ).order_by(NetworkMetric.timestamp).all()
-        
-        data = [{
-            'timestamp': m.timestamp.isoformat(),
-            'bytes_sent': m.bytes_sent,
-            'bytes_recv': m.bytes_recv,
-            'connections_established': m.connections_established
-        } for m in metrics]
+    since_time = since.get('t') if since else None
+    label = res.label if res else 'raw'
+    
+    model, columns = HISTORY_COLUMNS[metric_type]
+    if res is not None:
+        # The newest bucket is still filling up, so a cursor points at its
+        # start and the next response sends it again with updated values
+        if since_time and since_time > start_time:
+            start_time = since_time
+        rollup = res.model
+        # The window slides and the open bucket is upserted in place: count and
+        # sample totals alone can repeat while the data differs
+        fingerprint = db.session.query(
+            func.count(rollup.id), func.sum(rollup.sample_count), func.sum(rollup.value_sum),
+            func.min(rollup.bucket), func.max(rollup.bucket), func.max(rollup.last_at)
+        ).filter(
+            rollup.server_id == server_id,
+            rollup.bucket >= bucket_start(start_time, res.seconds),
+            rollup.metric.in_(columns)
+        ).one()
     else:
-        return jsonify({'error': 'Invalid metric type'}), 400
+        filters = [model.server_id == server_id, model.timestamp >= start_time]
+        if since_time:
+            newer = model.timestamp > since_time
+            if since.get('id') is not None:
+                newer = or_(newer, and_(model.timestamp == since_time, model.id > since['id']))
+            filters.append(newer)
+        fingerprint = db.session.query(func.count(model.id), func.max(model.id)).filter(*filters).one()
+    
+    etag = make_etag('history', server_id, metric_type, label, request.args.get('since'),
+                     max_points, method, output, *fingerprint)
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
     
-    return jsonify({'data': data})
+    if res is not None and output == 'rows':
+        data = query_rollup_history(res, metric_type, server_id, start_time)
+        total = len(data)
+        if data:
+            next_cursor = encode_cursor(t=datetime.fromisoformat(data[-1]['timestamp']), r=label)
+        else:
+            next_cursor = encode_cursor(t=since_time or start_time, r=label)
+        if max_points:
+            data = downsample_points(data, columns, max_points, method)
+        shown = len(data)
+        
+    else:
+        if res is not None:
+            timestamps, values = query_rollup_columns(res, metric_type, server_id, start_time)
+            total = len(timestamps)
+            last_time = datetime.fromtimestamp(timestamps[-1], tz=timezone.utc) if total else since_time or start_time
+            next_cursor = encode_cursor(t=last_time, r=label)
+        else:
+            rows = db.session.query(model.id, model.timestamp, *[getattr(model, c) for c in columns]).filter(
+                *filters
+            ).order_by(model.timestamp, model.id).all()
+            total = len(rows)
+            if rows:
+                next_cursor = encode_cursor(t=as_utc(rows[-1][1]), id=rows[-1][0], r=label)
+            else:
+                next_cursor = encode_cursor(t=since_time or start_time, id=since.get('id') if since else None, r=label)
+        
+        # Work on column arrays; rows format only builds dicts for the points kept
+        keep = np.arange(total)
+        if res is None and (output != 'rows' or (max_points and total > max_points)):
+            fields = list(zip(*rows)) or [()] * (len(columns) + 2)
+            timestamps = epoch_seconds(fields[1])
+            values = {column: np.array(field, dtype=np.float64) for column, field in zip(columns, fields[2:])}
+        if max_points and total > max_points:
+            keep = select_indices(timestamps, [values[c] for c in columns], max_points, method)
+        shown = len(keep)
+        
+        if output == 'rows':
+            data = []
+            for i in keep:
+                row = rows[i]
+                point = {'timestamp': row[1].isoformat()}
+                point.update(zip(columns, row[2:]))
+                data.append(point)
+        elif shown < total:
+            timestamps = timestamps[keep]
+            values = {name: series[keep] for name, series in values.items()}
+    
+    meta = {
+        'resolution': label,
+        'total_points': total,
+        'downsample': method if shown < total else None,
+        'next_cursor': next_cursor
+    }
+    if output == 'msgpack':
+        try:
+            payload = encode_msgpack(timestamps, values, meta)
+        except ImportError:
+            return jsonify({'error': 'MessagePack output requires msgpack'}), 501
+        return _with_etag(current_app.response_class(payload, mimetype=MSGPACK_MIMETYPE), etag)
+    if output == 'columns':
+        data = encode_columns(timestamps, values)
+    return _with_etag(jsonify({'data': data, **meta}), etag)
+
+
+def _not_modified(etag):
+    """Empty 304 response for a client that already holds ``etag``."""
+    return _with_etag(current_app.response_class(status=304), etag)
+
+
+def _with_etag(response, etag):
+    """Tag ``response`` and make browsers revalidate it on every request."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 # ============================================================================
@@ -616,18 +787,55 @@ def alert_rule_detail(rule_id):
 @main.route('/api/alerts/history')
 @login_required
 def alert_history():
-    """Get alert history."""
+    """
+    Get alert history, newest first.
+    
+    With ``since`` (a ``next_cursor`` from a previous response, an ISO 8601
+    timestamp or epoch seconds) only alerts recorded after it are returned,
+    oldest first, so ``next_cursor`` pages forward without skipping any when
+    more than ``limit`` are new.
+    """
     limit = request.args.get('limit', default=50, type=int)
     
-    history = AlertHistory.query.join(AlertRule).filter(
-        AlertRule.user_id == current_user.id
-    ).order_by(AlertHistory.triggered_at.desc()).limit(limit).all()
+    query = AlertHistory.query.join(AlertRule).filter(AlertRule.user_id == current_user.id)
+    since = None
+    if request.args.get('since'):
+        try:
+            since = parse_since(request.args['since'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if since.get('id') is not None:
+            query = query.filter(AlertHistory.id > since['id'])
+        elif since.get('t'):
+            query = query.filter(AlertHistory.triggered_at > since['t'])
+    
+    # Delivery and acknowledgement flags are set after the row is created
+    fingerprint = query.with_entities(
+        func.count(AlertHistory.id), func.max(AlertHistory.id),
+        *[func.sum(cast(column, Integer)) for column in (AlertHistory.email_sent, AlertHistory.sms_sent,
+                                                         AlertHistory.slack_sent, AlertHistory.acknowledged)]
+    ).one()
+    etag = make_etag('alerts', current_user.id, limit, request.args.get('since'), *fingerprint)
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
     
-    return jsonify({
+    if since:
+        history = query.order_by(AlertHistory.id).limit(limit).all()
+    else:
+        history = query.order_by(AlertHistory.triggered_at.desc()).limit(limit).all()
+    if history:
+        next_cursor = encode_cursor(id=history[-1].id if since else max(h.id for h in history))
+    elif since:
+        next_cursor = encode_cursor(id=since.get('id'), t=since.get('t'))
+    else:
+        next_cursor = encode_cursor(id=0)
+    
+    return _with_etag(jsonify({
+        'next_cursor': next_cursor,
         'history': [{
             'id': h.id,
             'rule_name': h.rule.name,
-            'server_name': Server.query.get(h.server_id).name,
+            'server_name': db.session.get(Server, h.server_id).name,
             'metric_value': h.metric_value,
             'message': h.message,
             'triggered_at': h.triggered_at.isoformat(),
@@ -635,7 +843,7 @@ def alert_history():
             'sms_sent': h.sms_sent,
             'acknowledged': h.acknowledged
         } for h in history]
-    })
+    }), etag)
 
 
 @main.route('/api/alerts/test/<int:rule_id>', methods=['POST'])
@@ -658,6 +866,8 @@ def servers_api():
     """Get all servers or add a new one."""
     if request.method == 'GET':
         servers = Server.query.all()
+        # Current state for the whole fleet in one primary-key range scan
+        latest = ServerLatestMetric.for_servers(metrics=['cpu_percent', 'memory_percent', 'disk_percent'])
         return jsonify({
             'servers': [{
                 'id': s.id,
@@ -665,7 +875,8 @@ def servers_api():
                 'hostname': s.hostname,
                 'is_active': s.is_active,
                 'is_local': s.is_local,
-                'last_seen': s.last_seen.isoformat() if s.last_seen else None
+                'last_seen': s.last_seen.isoformat() if s.last_seen else None,
+                'latest': latest.get(s.id, {})
             } for s in servers]
         })
     
@@ -716,6 +927,16 @@ def server_detail(server_id):
         return jsonify({'success': True})
 
 
+@main.route('/api/http/pools')
+@login_required
+def http_pool_stats():
+    """Connection reuse of this worker process's outbound HTTP pools."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    return jsonify({'pid': os.getpid(), 'sessions': http_sessions.stats()})
+
+
 # ============================================================================
 # USER SETTINGS API
 # ============================================================================
@@ -770,8 +991,9 @@ def export_csv():
     end_date = datetime.now(timezone.utc)
     start_date = end_date - timedelta(days=days)
     
-    csv_data = export_metrics_to_csv(server_id, start_date, end_date, metric_types)
-    return create_export_response(csv_data, 'csv')
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    csv_data = export_metrics_to_csv(server_id, start_date, end_date, metric_types, batch_size)
+    return create_export_response(stream_with_context(csv_data), 'csv')
 
 
 @main.route('/api/export/json')
@@ -785,8 +1007,93 @@ def export_json():
     end_date = datetime.now(timezone.utc)
     start_date = end_date - timedelta(days=days)
     
-    json_data = export_metrics_to_json(server_id, start_date, end_date, metric_types)
-    return create_export_response(json_data, 'json')
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    json_data = export_metrics_to_json(server_id, start_date, end_date, metric_types, batch_size)
+    return create_export_response(stream_with_context(json_data), 'json')
+
+
+@main.route('/api/export/parquet')
+@main.route('/api/export/arrow')
+@login_required
+def export_columnar():
+    """Export one metric table as a Parquet or Arrow IPC file."""
+    format_type = request.path.rsplit('/', 1)[1]
+    server_id = request.args.get('server_id', type=int)
+    days = request.args.get('days', default=7, type=int)
+    metric_type = request.args.get('type', 'system')
+    
+    end_date = datetime.now(timezone.utc)
+    start_date = end_date - timedelta(days=days)
+    
+    try:
+        data = export_metrics_to_arrow(
+            format_type, server_id, start_date, end_date, metric_type,
+            batch_size=current_app.config.get('EXPORT_ROW_GROUP_SIZE', 65536),
+            compression=current_app.config.get('EXPORT_COMPRESSION', 'zstd')
+        )
+    except ImportError:
+        return jsonify({'error': 'Columnar export requires pyarrow'}), 501
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return create_export_response(stream_with_context(data), format_type,
+                                  filename_prefix=f'system_monitor_{metric_type}')
+
+
+def export_job_response(status):
+    """Job status plus its download link once the file is ready."""
+    job = dict(status)
+    if job['status'] == 'done':
+        job['download_url'] = url_for('main.download_export_job', job_id=job['id'])
+    return job
+
+
+@main.route('/api/export/jobs', methods=['POST'])
+@login_required
+def create_export_job():
+    """Queue an export in the background (or reuse an identical one)."""
+    if not export_jobs.running:
+        return jsonify({'error': 'Background exports are disabled'}), 503
+    
+    try:
+        export = parse_export_request(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    status = export_jobs.submit(export)
+    return jsonify(export_job_response(status)), 200 if status['status'] == 'done' else 202
+
+
+@main.route('/api/export/jobs/<job_id>')
+@login_required
+def get_export_job(job_id):
+    """Progress and status of an export job."""
+    status = export_jobs.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Export job not found'}), 404
+    return jsonify(export_job_response(status))
+
+
+@main.route('/api/export/jobs/<job_id>/download')
+@login_required
+def download_export_job(job_id):
+    """Download a finished export; supports Range requests to resume."""
+    status = export_jobs.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Export job not found'}), 404
+    if status['status'] != 'done':
+        return jsonify({'error': f"Export is {status['status']}"}), 409
+    
+    try:
+        return send_file(
+            export_jobs.artifact_path(status),
+            mimetype=EXPORT_MIMETYPES[status['format']],
+            as_attachment=True,
+            download_name=f"system_monitor_export_{job_id}.{status['format']}",
+            conditional=True
+        )
+    except FileNotFoundError:
+        return jsonify({'error': 'Export job not found'}), 404
 
 
 # ============================================================================
@@ -0,0 +1,188 @@
+"""Shared background sampler for real-time local metrics.
+
+A single sampler thread per process scans the host at a fixed cadence and
+publishes an immutable snapshot. ``/api/metrics`` serves the latest snapshot
+instead of re-running every psutil collector on each request.
+
+Collectors run on demand: each tick only runs the fields that a request or
+stream asked for within the last ``demand_window`` seconds. A field nobody
+renders (e.g. the socket table behind ``connections``) stops being scanned
+until it is asked for again, when the asking request samples it once on its
+own thread.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from types import MappingProxyType
+
+from agent.collectors import collectors
+
+
+# Immutable view of one host scan. ``monotonic`` is used for age calculations,
+# ``timestamp`` is the wall-clock sampling moment reported to clients.
+# ``fields`` lists the collected keys (None: every collector ran).
+Snapshot = namedtuple('Snapshot', ['timestamp', 'monotonic', 'data', 'fields'], defaults=(None,))
+
+logger = logging.getLogger(__name__)
+
+
+def collect_local_metrics(fields=None):
+    """Collect real-time metrics for the local host (only ``fields`` if given)."""
+    return collectors.collect(fields)
+
+
+class MetricsSampler:
+    """Background thread that keeps the latest local metrics snapshot."""
+
+    def __init__(self, collect=collect_local_metrics, interval=1.0, demand_window=60.0):
+        self.collect = collect
+        self.interval = interval
+        self.demand_window = demand_window
+        self._snapshot = None
+        # Requested field (None: all of them) -> monotonic time the demand ends
+        self._demand = {}
+        self._demand_lock = threading.Lock()
+        # Called with every new snapshot (e.g. to push it to stream subscribers)
+        self.listeners = []
+        self._thread = None
+        self._stop_event = threading.Event()
+        # Serialises on-demand sampling so concurrent callers share one scan
+        self._sample_lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        """Start the sampler thread if it is not already running."""
+        if interval is not None:
+            self.interval = interval
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='metrics-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the sampler thread."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def latest(self):
+        """Return the most recent snapshot (or None if nothing was sampled yet)."""
+        return self._snapshot
+
+    def age(self, snapshot=None):
+        """Return the age in seconds of the given (or latest) snapshot."""
+        snapshot = snapshot or self._snapshot
+        if snapshot is None:
+            return None
+        return time.monotonic() - snapshot.monotonic
+
+    def want(self, fields=None, duration=None):
+        """
+        Keep ``fields`` (None: all) in the sampled set for ``duration`` seconds.
+
+        Args:
+            fields: Field names, or None for every collector
+            duration: Seconds (defaults to ``demand_window``)
+        """
+        until = time.monotonic() + (self.demand_window if duration is None else duration)
+        with self._demand_lock:
+            for field in ([None] if fields is None else fields):
+                self._demand[field] = max(self._demand.get(field, 0), until)
+
+    def wanted(self):
+        """Fields requested recently: None for all of them, else a (possibly empty) set."""
+        now = time.monotonic()
+        with self._demand_lock:
+            self._demand = {field: until for field, until in self._demand.items() if until > now}
+            if None in self._demand:
+                return None
+            return set(self._demand)
+
+    def sample(self, fields=None):
+        """Take a snapshot of ``fields`` (None: all) now and publish it."""
+        data = MappingProxyType(self.collect(None if fields is None else sorted(fields)))
+        snapshot = Snapshot(datetime.now(timezone.utc), time.monotonic(), data,
+                            None if fields is None else frozenset(fields))
+        # Rebinding a single attribute is atomic, readers never see a partial snapshot
+        self._snapshot = snapshot
+        for listener in self.listeners:
+            try:
+                listener(snapshot)
+            except Exception:
+                logger.exception("Error in snapshot listener")
+        return snapshot
+
+    def _usable(self, snapshot, max_age, fields):
+        if snapshot is None or self.age(snapshot) > max_age:
+            return False
+        if snapshot.fields is None:
+            return True
+        return fields is not None and snapshot.fields.issuperset(fields)
+
+    def get_snapshot(self, max_age=None, fields=None):
+        """
+        Return a snapshot no older than ``max_age`` seconds holding ``fields``.
+
+        The fields are added to the demand, so the background thread keeps
+        sampling them. Falls back to sampling on the caller's thread when the
+        thread is not running, has fallen behind or did not collect a field
+        yet. Concurrent callers wait for a single scan instead of each running
+        their own.
+
+        Args:
+            max_age: Maximum acceptable age in seconds (defaults to twice the interval)
+            fields: Fields the caller needs (None: all)
+
+        Returns:
+            Snapshot
+        """
+        if max_age is None:
+            max_age = self.interval * 2
+        self.want(fields)
+
+        snapshot = self._snapshot
+        if self._usable(snapshot, max_age, fields):
+            return snapshot
+
+        with self._sample_lock:
+            # Another caller may have refreshed it while we were waiting
+            snapshot = self._snapshot
+            if self._usable(snapshot, max_age, fields):
+                return snapshot
+            return self.sample(self.wanted())
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                fields = self.wanted()
+                if fields is None or fields:
+                    with self._sample_lock:
+                        self.sample(fields)
+            except Exception:
+                # Keep the last good snapshot; the next tick retries
+                logger.exception("Error sampling local metrics")
+            elapsed = time.monotonic() - started
+            self._stop_event.wait(max(0.0, self.interval - elapsed))
+
+
+# Global sampler instance (one per process)
+sampler = MetricsSampler()
+
+
+def init_sampler(app):
+    """Start the shared metrics sampler for this process."""
+    collectors.configure(
+        connections=app.config.get('METRICS_CONNECTIONS_MAX_AGE', 5.0),
+        disk=app.config.get('METRICS_DISK_MAX_AGE', 30.0)
+    )
+    sampler.demand_window = app.config.get('METRICS_DEMAND_WINDOW', 60.0)
+    if app.config.get('METRICS_SAMPLER_ENABLED', True):
+        sampler.start(app.config.get('METRICS_SAMPLE_INTERVAL', 1.0))
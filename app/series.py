@@ -0,0 +1,90 @@
+"""Compact encodings of metric history.
+
+``/api/metrics/history`` serves three layouts of the same points:
+
+- ``rows``: one object per point with an ISO timestamp (the default)
+- ``columns``: ``{"t": [epoch seconds...], "<column>": [values...]}``, key
+  names appear once instead of once per point
+- ``msgpack``: the column layout as MessagePack, each array packed as a raw
+  little-endian buffer (``t`` float64, values float32, NaN for missing)
+
+The columnar layouts are built straight from numpy arrays, never from
+per-point dicts.
+"""
+import numpy as np
+
+SERIES_FORMATS = ('rows', 'columns', 'msgpack')
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+# Timestamps need float64: float32 has a resolution of minutes at today's epoch
+TIME_DTYPE = '<f8'
+VALUE_DTYPE = '<f4'
+
+
+def _json_values(values):
+    """List of ``values`` with NaN turned into None (JSON has no NaN)."""
+    missing = np.isnan(values)
+    if not missing.any():
+        return values.tolist()
+    return np.where(missing, None, values).tolist()
+
+
+def encode_columns(timestamps, values):
+    """
+    Column layout for JSON.
+
+    Args:
+        timestamps: Epoch seconds (float64 array)
+        values: ``{name: float64 array}`` aligned with ``timestamps``
+
+    Returns:
+        dict: ``{'t': [...], name: [...]}``
+    """
+    data = {'t': np.round(timestamps, 3).tolist()}
+    for name, series in values.items():
+        data[name] = _json_values(series)
+    return data
+
+
+def encode_msgpack(timestamps, values, meta):
+    """
+    MessagePack document with typed array buffers.
+
+    Args:
+        timestamps: Epoch seconds (float64 array)
+        values: ``{name: float64 array}`` aligned with ``timestamps``
+        meta: Extra top-level fields (resolution, cursor, ...)
+
+    Returns:
+        bytes
+
+    Raises:
+        ImportError: if msgpack is not installed
+    """
+    import msgpack
+
+    document = dict(meta)
+    document['dtypes'] = {'t': TIME_DTYPE, **{name: VALUE_DTYPE for name in values}}
+    document['data'] = {
+        't': np.ascontiguousarray(timestamps, dtype=TIME_DTYPE).tobytes(),
+        **{name: np.ascontiguousarray(series, dtype=VALUE_DTYPE).tobytes() for name, series in values.items()}
+    }
+    return msgpack.packb(document, use_bin_type=True)
+
+
+def decode_msgpack(payload):
+    """
+    Inverse of ``encode_msgpack`` (for Python clients and tests).
+
+    Returns:
+        dict: The document with ``data`` arrays as numpy arrays
+    """
+    import msgpack
+
+    document = msgpack.unpackb(payload, raw=False)
+    document['data'] = {
+        name: np.frombuffer(buffer, dtype=document['dtypes'][name])
+        for name, buffer in document['data'].items()
+    }
+    return document
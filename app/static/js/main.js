@@ -240,8 +240,21 @@ function updateChart(chart, newValue) {
     chart.update();
 }
 
-// Start polling
-// Set an interval to fetch metrics every 1000ms (1 second)
-setInterval(fetchMetrics, 1000);
+// Start live updates
+// Subscribe to the server-sent metrics stream (one snapshot per second)
+if (window.EventSource) {
+    const metricsStream = new EventSource('/api/stream/metrics');
+    // Update the dashboard with every snapshot pushed by the server
+    metricsStream.addEventListener('metrics', (event) => updateDashboard(JSON.parse(event.data)));
+    // Fall back to polling if the server refused the stream
+    metricsStream.onerror = () => {
+        if (metricsStream.readyState === EventSource.CLOSED) {
+            setInterval(fetchMetrics, 1000);
+        }
+    };
+} else {
+    // Set an interval to fetch metrics every 1000ms (1 second)
+    setInterval(fetchMetrics, 1000);
+}
 // Perform the initial fetch immediately
 fetchMetrics(); // Initial call
@@ -0,0 +1,151 @@
+"""Server-Sent Events fan-out of the real-time metrics snapshots.
+
+Each snapshot published by the sampler is serialised once into an SSE frame
+and handed to every subscriber. A subscriber only ever holds the newest frame
+it has not sent yet: if its client reads slower than snapshots arrive, older
+frames are skipped rather than queued, so a slow client costs one frame of
+memory no matter how far behind it falls.
+"""
+import json
+import threading
+import time
+
+HEARTBEAT = b': keepalive\n\n'
+
+
+class Subscription:
+    """Mailbox of one stream client holding at most one undelivered frame."""
+
+    def __init__(self):
+        self.skipped = 0
+        self.closed = False
+        self._frame = None
+        self._ready = threading.Condition()
+
+    def offer(self, frame):
+        with self._ready:
+            if self._frame is not None:
+                self.skipped += 1
+            self._frame = frame
+            self._ready.notify()
+
+    def next(self, timeout):
+        """Return the pending frame, waiting up to ``timeout`` seconds (None if there was none)."""
+        with self._ready:
+            self._ready.wait_for(lambda: self._frame is not None or self.closed, timeout)
+            frame, self._frame = self._frame, None
+            return frame
+
+    def close(self):
+        with self._ready:
+            self.closed = True
+            self._ready.notify()
+
+
+class MetricsBroadcaster:
+    """Encode each metrics snapshot once and fan it out to every subscriber."""
+
+    def __init__(self, max_subscribers=24):
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def encode(snapshot, age=0.0):
+        """Serialise a sampler Snapshot into one ``metrics`` SSE frame."""
+        data = dict(snapshot.data)
+        data['snapshot'] = {
+            'timestamp': snapshot.timestamp.isoformat(),
+            'age': round(age, 3)
+        }
+        payload = json.dumps(data, separators=(',', ':'))
+        return f"id: {snapshot.timestamp.timestamp():.3f}\nevent: metrics\ndata: {payload}\n\n".encode()
+
+    def publish(self, snapshot):
+        """Sampler listener: deliver ``snapshot`` to every subscriber."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        frame = self.encode(snapshot, time.monotonic() - snapshot.monotonic)
+        for subscription in subscribers:
+            subscription.offer(frame)
+        self.published += 1
+
+    def subscribe(self, initial=None):
+        """
+        Register a new client.
+
+        Args:
+            initial: Frame to send first (e.g. the current snapshot)
+
+        Returns:
+            Subscription, or None when ``max_subscribers`` is reached
+        """
+        subscription = Subscription()
+        if initial is not None:
+            subscription.offer(initial)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stream(self, subscription, heartbeat=15.0, max_duration=300.0, retry=3000):
+        """
+        Generate the SSE response body for ``subscription``.
+
+        A comment line is sent whenever no frame arrived for ``heartbeat``
+        seconds so proxies keep the connection open and dead clients are
+        noticed. After ``max_duration`` seconds the stream ends and the
+        browser reconnects after ``retry`` milliseconds, which spreads
+        long-lived connections over the worker threads.
+        """
+        deadline = time.monotonic() + max_duration
+        try:
+            yield f"retry: {retry}\n\n".encode()
+            while not subscription.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                frame = subscription.next(min(heartbeat, remaining))
+                if frame is not None:
+                    yield frame
+                elif not subscription.closed and remaining > heartbeat:
+                    yield HEARTBEAT
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        return {
+            'subscribers': len(subscribers),
+            'published': self.published,
+            'skipped': sum(subscription.skipped for subscription in subscribers)
+        }
+
+    def close(self):
+        """Disconnect every subscriber."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            self.unsubscribe(subscription)
+
+
+# Global broadcaster (one per process, fed by the sampler)
+broadcaster = MetricsBroadcaster()
+
+
+def init_stream(app):
+    """Feed the sampler's snapshots to the SSE broadcaster."""
+    from app.sampler import sampler
+    broadcaster.max_subscribers = app.config.get('STREAM_MAX_SUBSCRIBERS', 24)
+    if broadcaster.publish not in sampler.listeners:
+        sampler.listeners.append(broadcaster.publish)
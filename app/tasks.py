@@ -1,14 +1,52 @@
 """Background tasks for metric collection and alert checking."""
 from apscheduler.schedulers.background import BackgroundScheduler
+from agent.collectors import collect_system, collect_network
+from agent.cpu import CpuSampler
 from datetime import datetime, timedelta, timezone
-import psutil
-from app.models import db, Server, SystemMetric, NetworkMetric, ProcessSnapshot, AlertRule, AlertHistory
+import atexit
+import functools
+from app.models import db, Server, SystemMetric, NetworkMetric, AlertRule
+from app.alerts import alert_tracker
+from app.health import health_scheduler
+from app.ingest import metric_buffer, write_metric_rows, parse_ingest_payload
+from app.leader import elector, init_leader_election
+from app.poller import remote_poller, RemoteTarget
+from app.retention import run_retention
 from flask import current_app
 
 
 # Global scheduler instance
 scheduler = BackgroundScheduler()
 
+# CPU utilisation averaged over each collection interval
+cpu_sampler = CpuSampler()
+
+
+def leader_job(job_id, lease=None, on_lease_change=None):
+    """
+    Run the decorated job inside the app context, on the lease holder only.
+    
+    Every worker process schedules every job; the lease named ``lease``
+    (default: ``job_id``) decides which one of them actually runs it.
+    ``on_lease_change`` is called whenever this process does not hold the
+    lease or has just (re)acquired it, to drop state kept for the lease.
+    """
+    lease = lease or job_id
+    
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper():
+            with scheduler.app.app_context():
+                leading = elector.backend is None or lease in elector.held
+                owned = elector.acquire(lease)
+                if on_lease_change is not None and not (owned and leading):
+                    on_lease_change()
+                if not owned:
+                    return
+                return func()
+        return wrapper
+    return decorator
+
 
 def init_scheduler(app):
     """Initialize the background scheduler with the Flask app context."""
@@ -16,16 +54,61 @@ def init_scheduler(app):
         # Store app context for tasks
         scheduler.app = app
         
-        # Schedule metric collection every 60 seconds
+        # Elect a single owner per job across workers and replicas
+        init_leader_election(app)
+        lease_ttl = app.config.get('LEADER_LEASE_TTL', 30)
+        
+        # Renew held leases well before they expire
+        scheduler.add_job(
+            func=renew_leases_job,
+            trigger='interval',
+            seconds=max(1, lease_ttl // 3),
+            id='renew_leases',
+            replace_existing=True
+        )
+        
+        # Sample metrics into the in-memory buffer at high frequency
         scheduler.add_job(
             func=collect_metrics_job,
             trigger='interval',
-            seconds=app.config.get('METRIC_COLLECTION_INTERVAL', 60),
+            seconds=app.config.get('METRIC_COLLECTION_INTERVAL', 5),
             id='collect_metrics',
             replace_existing=True
         )
         
+        # Scrape pull-mode agents concurrently
+        remote_poller.configure(
+            max_workers=app.config.get('REMOTE_POLL_WORKERS', 32),
+            timeout=app.config.get('REMOTE_POLL_TIMEOUT', 5)
+        )
+        scheduler.add_job(
+            func=poll_remote_servers_job,
+            trigger='interval',
+            seconds=app.config.get('REMOTE_POLL_INTERVAL', 60),
+            id='poll_remote',
+            replace_existing=True
+        )
+        
+        # Flush the buffer to the database in bulk
+        metric_buffer.configure(
+            max_rows=app.config.get('METRIC_BUFFER_MAX_ROWS', 10000),
+            flush_rows=app.config.get('METRIC_FLUSH_ROWS', 500),
+            flush_interval=app.config.get('METRIC_FLUSH_INTERVAL', 60),
+            policy=app.config.get('METRIC_BUFFER_POLICY', 'aggregate')
+        )
+        scheduler.add_job(
+            func=flush_metrics_job,
+            trigger='interval',
+            seconds=app.config.get('METRIC_FLUSH_INTERVAL', 60),
+            id='flush_metrics',
+            replace_existing=True
+        )
+        
+        # Don't lose buffered samples on a clean shutdown
+        atexit.register(flush_metrics_job)
+        
         # Schedule alert checking every 60 seconds
+        alert_tracker.max_gap = app.config.get('ALERT_MAX_SAMPLE_GAP', 180)
         scheduler.add_job(
             func=check_alerts_job,
             trigger='interval',
@@ -34,21 +117,24 @@ def init_scheduler(app):
             replace_existing=True
         )
         
-        # Schedule cleanup every day at 2 AM
+        # Expire old data often and in small pieces (each run is time-boxed)
         scheduler.add_job(
             func=cleanup_old_data_job,
-            trigger='cron',
-            hour=2,
-            minute=0,
+            trigger='interval',
+            seconds=app.config.get('RETENTION_INTERVAL', 3600),
             id='cleanup_old_data',
             replace_existing=True
         )
         
-        # Schedule health checks every 60 seconds
+        # Tick the health check scheduler; each service runs at its own check_interval
+        health_scheduler.configure(
+            max_workers=app.config.get('HEALTH_CHECK_MAX_CONCURRENCY', 10),
+            sync_interval=app.config.get('HEALTH_CHECK_SYNC_INTERVAL', 30)
+        )
         scheduler.add_job(
             func=run_health_checks_job,
             trigger='interval',
-            seconds=60,
+            seconds=app.config.get('HEALTH_CHECK_TICK', 5),
             id='health_checks',
             replace_existing=True
         )
@@ -56,119 +142,158 @@ def init_scheduler(app):
         scheduler.start()
 
 
+def renew_leases_job():
+    """Heartbeat that keeps this process's job leases alive."""
+    with scheduler.app.app_context():
+        elector.renew_all()
+
+
+@leader_job('collect_metrics', on_lease_change=alert_tracker.reset)
 def collect_metrics_job():
     """Job wrapper for metric collection with app context."""
-    with scheduler.app.app_context():
-        collect_system_metrics()
-        collect_network_metrics()
+    local_server = Server.query.filter_by(is_local=True).first()
+    if not local_server:
+        return
+    
+    # Both rows of a sample share its timestamp so the tracker sees one observation
+    timestamp = datetime.now(timezone.utc)
+    rows = [row for row in (collect_system_metrics(local_server.id, timestamp),
+                            collect_network_metrics(local_server.id, timestamp)) if row]
+    alert_tracker.observe_batches({'local': rows}, active={local_server.id: local_server.is_active})
+    
+    # Flush early once enough rows are waiting rather than at the next interval
+    if len(metric_buffer) >= metric_buffer.flush_rows:
+        scheduler.modify_job('flush_metrics', next_run_time=datetime.now(timezone.utc))
+    
+    # Notify as soon as a rule starts (or stops) firing
+    if alert_tracker.has_transitions():
+        scheduler.modify_job('check_alerts', next_run_time=datetime.now(timezone.utc))
+
+
+@leader_job('poll_remote')
+def poll_remote_servers_job():
+    """Job wrapper for remote server polling with app context."""
+    poll_remote_servers()
 
 
-def collect_system_metrics():
-    """Collect and store system metrics for the local server."""
+def poll_remote_servers():
+    """
+    Scrape every active remote server that did not push recently and store the samples.
+    
+    Returns:
+        int: Number of servers whose sample was stored
+    """
+    interval = current_app.config.get('REMOTE_POLL_INTERVAL', 60)
+    # Servers whose agent pushed within half an interval report on their own
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=interval / 2)
+    
     try:
-        # Get local server
-        local_server = Server.query.filter_by(is_local=True).first()
-        if not local_server:
-            return
-        
-        # Collect CPU metrics
-        cpu_percent = psutil.cpu_percent(interval=1)
-        cpu_freq = psutil.cpu_freq()
-        cpu_freq_current = cpu_freq.current if cpu_freq else None
-        
-        # Collect CPU temperature
-        cpu_temp_c = None
-        try:
-            temps = psutil.sensors_temperatures()
-            if 'coretemp' in temps:
-                cpu_temp_c = temps['coretemp'][0].current
-            elif 'cpu_thermal' in temps:
-                cpu_temp_c = temps['cpu_thermal'][0].current
-            elif 'k10temp' in temps:
-                cpu_temp_c = temps['k10temp'][0].current
-        except Exception:
-            pass
+        servers = Server.query.filter(
+            Server.is_active.is_(True),
+            Server.is_local.is_(False),
+            db.or_(Server.last_push_at.is_(None), Server.last_push_at < cutoff)
+        ).all()
+        if not servers:
+            return 0
+        targets = [RemoteTarget(s.id, s.name, s.hostname, s.api_key) for s in servers]
+        db.session.commit()  # don't hold a transaction open while waiting on the network
         
-        # Collect memory metrics
-        svmem = psutil.virtual_memory()
+        # Leave headroom so a round always finishes before the next one is due
+        samples, errors = remote_poller.poll(targets, deadline=interval * 0.8)
         
-        # Collect disk metrics (primary partition)
-        disk_usage = psutil.disk_usage('/')
+        batches = {}
+        stored = 0
+        for server_id, sample in samples.items():
+            try:
+                parsed = parse_ingest_payload(server_id, [sample])
+            except ValueError as e:
+                errors[server_id] = f"Invalid sample: {e}"
+                continue
+            stored += 1
+            for model, rows in parsed.items():
+                batches.setdefault(model, []).extend(rows)
         
-        # Collect I/O metrics
-        disk_io = psutil.disk_io_counters()
+        if batches:
+            write_metric_rows(batches)
+            alert_tracker.observe_batches(batches)
         
-        # Create metric record
-        metric = SystemMetric(
-            server_id=local_server.id,
-            cpu_percent=cpu_percent,
-            cpu_freq=cpu_freq_current,
-            cpu_temp_c=cpu_temp_c,
-            memory_total=svmem.total,
-            memory_used=svmem.used,
-            memory_percent=svmem.percent,
-            disk_total=disk_usage.total,
-            disk_used=disk_usage.used,
-            disk_percent=disk_usage.percent,
-            io_read_bytes=disk_io.read_bytes,
-            io_write_bytes=disk_io.write_bytes,
-            io_read_count=disk_io.read_count,
-            io_write_count=disk_io.write_count
-        )
-        
-        db.session.add(metric)
-        db.session.commit()
-        
-        # Update server last_seen
-        local_server.last_seen = datetime.now(timezone.utc)
-        db.session.commit()
+        if errors:
+            names = {target.id: target.name for target in targets}
+            current_app.logger.warning(
+                f"Polled {len(targets)} remote servers, {len(errors)} failed: "
+                + ", ".join(f"{names[sid]} ({error})" for sid, error in list(errors.items())[:10])
+            )
+        return stored
         
     except Exception as e:
-        current_app.logger.error(f"Error collecting system metrics: {e}")
+        current_app.logger.error(f"Error polling remote servers: {e}")
         db.session.rollback()
+        return 0
 
 
-def collect_network_metrics():
-    """Collect and store network metrics for the local server."""
+def flush_metrics_job():
+    """Job wrapper for flushing buffered metrics with app context."""
+    # Not lease-guarded: a process that lost leadership still flushes what it sampled
+    with scheduler.app.app_context():
+        flush_metric_buffer()
+
+
+def flush_metric_buffer():
+    """Write all buffered samples with one bulk insert per table."""
+    batches = metric_buffer.drain()
+    if not batches:
+        return 0
+    
     try:
-        # Get local server
-        local_server = Server.query.filter_by(is_local=True).first()
-        if not local_server:
-            return
-        
-        # Collect network I/O
-        net_io = psutil.net_io_counters()
-        
-        # Collect connection statistics
-        connections = psutil.net_connections(kind='inet')
-        conn_established = sum(1 for c in connections if c.status == 'ESTABLISHED')
-        conn_listen = sum(1 for c in connections if c.status == 'LISTEN')
-        conn_time_wait = sum(1 for c in connections if c.status == 'TIME_WAIT')
-        
-        # Create metric record
-        metric = NetworkMetric(
-            server_id=local_server.id,
-            bytes_sent=net_io.bytes_sent,
-            bytes_recv=net_io.bytes_recv,
-            packets_sent=net_io.packets_sent,
-            packets_recv=net_io.packets_recv,
-            connections_established=conn_established,
-            connections_listen=conn_listen,
-            connections_time_wait=conn_time_wait
+        written = write_metric_rows(batches)
+    except Exception as e:
+        current_app.logger.error(f"Error flushing metric buffer: {e}")
+        db.session.rollback()
+        # Keep the rows; the buffer sheds the oldest ones if the database stays down
+        metric_buffer.requeue(batches)
+        return 0
+    
+    stats = metric_buffer.stats()
+    if stats['dropped'] or stats['aggregated']:
+        current_app.logger.warning(
+            f"Metric buffer under pressure: {stats['dropped']} rows dropped, "
+            f"{stats['aggregated']} rows aggregated"
         )
+    return written
+
+
+def collect_system_metrics(server_id, timestamp=None):
+    """Sample system metrics for the local server into the write buffer and return the row."""
+    try:
+        # CPU utilisation is the delta since the previous collection, never blocks
+        row = {'server_id': server_id, 'timestamp': timestamp or datetime.now(timezone.utc)}
+        row.update(collect_system(cpu_sampler))
+        metric_buffer.add(SystemMetric, row)
+        return row
         
-        db.session.add(metric)
-        db.session.commit()
+    except Exception as e:
+        current_app.logger.error(f"Error collecting system metrics: {e}")
+
+
+def collect_network_metrics(server_id, timestamp=None):
+    """Sample network metrics for the local server into the write buffer and return the row."""
+    try:
+        row = {'server_id': server_id, 'timestamp': timestamp or datetime.now(timezone.utc)}
+        # The socket table scan is shared with /api/metrics and reused for a while
+        row.update(collect_network(current_app.config.get('COLLECTION_CONNECTIONS_MAX_AGE', 30.0)))
+        metric_buffer.add(NetworkMetric, row)
+        return row
         
     except Exception as e:
         current_app.logger.error(f"Error collecting network metrics: {e}")
-        db.session.rollback()
 
 
+# Runs under the collect_metrics lease: alert state lives in the process that
+# samples the local host, and a transition there can trigger it immediately
+@leader_job('check_alerts', lease='collect_metrics', on_lease_change=alert_tracker.reset)
 def check_alerts_job():
     """Job wrapper for alert checking with app context."""
-    with scheduler.app.app_context():
-        check_alert_thresholds()
+    check_alert_thresholds()
 
 
 def check_alert_thresholds():
@@ -180,77 +305,45 @@ def check_alert_thresholds():
         current_app.logger.error(f"Error checking alerts: {e}")
 
 
+@leader_job('cleanup_old_data')
 def cleanup_old_data_job():
     """Job wrapper for data cleanup with app context."""
-    with scheduler.app.app_context():
-        cleanup_old_metrics()
+    cleanup_old_metrics()
 
 
 def cleanup_old_metrics():
     """Delete old metrics based on data retention policy."""
     try:
-        retention_days = current_app.config.get('DATA_RETENTION_DAYS', 30)
-        cutoff_date = datetime.now(timezone.utc) - timedelta(days=retention_days)
-        
-        # Delete old system metrics
-        SystemMetric.query.filter(SystemMetric.timestamp < cutoff_date).delete()
-        
-        # Delete old network metrics
-        NetworkMetric.query.filter(NetworkMetric.timestamp < cutoff_date).delete()
-        
-        # Delete old process snapshots
-        ProcessSnapshot.query.filter(ProcessSnapshot.timestamp < cutoff_date).delete()
-        
-        # Delete old alert history (keep for 90 days)
-        alert_cutoff = datetime.now(timezone.utc) - timedelta(days=90)
-        AlertHistory.query.filter(AlertHistory.triggered_at < alert_cutoff).delete()
-        
-        db.session.commit()
-        current_app.logger.info(f"Cleaned up metrics older than {retention_days} days")
+        report = run_retention(current_app.config)
+        deleted = sum(table['rows_deleted'] for table in report.values())
+        dropped = sum(table['partitions_dropped'] for table in report.values())
+        current_app.logger.info(
+            f"Retention run: dropped {dropped} partitions, deleted {deleted} rows"
+            + ('' if all(table['complete'] for table in report.values()) else ', more left for the next run')
+        )
+        return report
         
     except Exception as e:
         current_app.logger.error(f"Error cleaning up old data: {e}")
         db.session.rollback()
 
 
+@leader_job('health_checks')
 def run_health_checks_job():
     """Job wrapper for health checks with app context."""
-    with scheduler.app.app_context():
-        run_health_checks()
+    run_health_checks()
 
 
 def run_health_checks():
-    """Periodically check all registered services."""
+    """Start due service checks and write the results that finished since the last tick."""
     from app.models import ServiceHealth
-    from app.utils.healthchecks import check_http_service
     
     try:
-        # Get all active services
-        services = ServiceHealth.query.filter_by(is_active=True).all()
+        if health_scheduler.needs_sync():
+            health_scheduler.sync(ServiceHealth.query.filter_by(is_active=True).all())
         
-        for service in services:
-            # Perform health check
-            is_up, status_code, response_time, error_message = check_http_service(
-                service.url,
-                service.name,
-                service.timeout
-            )
-            
-            # Update service status
-            service.last_check_time = datetime.now(timezone.utc)
-            service.is_up = is_up
-            service.status_code = status_code
-            service.response_time = response_time
-            service.error_message = error_message
-            service.updated_at = datetime.now(timezone.utc)
-            
-            db.session.commit()
-            
-            current_app.logger.info(
-                f"Health check for {service.name}: "
-                f"{'UP' if is_up else 'DOWN'} "
-                f"(status: {status_code}, response: {response_time}ms)"
-            )
+        health_scheduler.dispatch(current_app._get_current_object())
+        health_scheduler.write_results()
             
     except Exception as e:
         current_app.logger.error(f"Error running health checks: {e}")
@@ -0,0 +1,78 @@
+"""Opaque ``since`` cursors and ETags for incremental API responses.
+
+A cursor is URL-safe base64 of a small JSON object describing the last row a
+client has seen, so endpoints can return only newer rows. Clients treat it as
+opaque and send back the ``next_cursor`` of the previous response.
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime, timezone
+
+
+def encode_cursor(**fields):
+    """Pack ``fields`` (JSON-serialisable, datetimes allowed) into a cursor string."""
+    data = {key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in fields.items() if value is not None}
+    raw = json.dumps(data, separators=(',', ':'), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(value):
+    """
+    Unpack a cursor made by ``encode_cursor``.
+
+    Raises:
+        ValueError: If ``value`` is not a valid cursor
+    """
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        data = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {value!r}") from e
+    if not isinstance(data, dict):
+        raise ValueError(f"Invalid cursor: {value!r}")
+    return data
+
+
+def _parse_timestamp(value):
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+def parse_since(value):
+    """
+    Parse a ``since`` query parameter.
+
+    Accepts a cursor, an ISO 8601 timestamp or epoch seconds.
+
+    Returns:
+        dict: Cursor fields; ``t`` (when present) is an aware UTC datetime
+
+    Raises:
+        ValueError: If ``value`` is none of the above
+    """
+    try:
+        return {'t': _parse_timestamp(float(value))}
+    except (ValueError, OverflowError, OSError):
+        pass
+    try:
+        return {'t': _parse_timestamp(value)}
+    except ValueError:
+        pass
+    fields = decode_cursor(value)
+    if 't' in fields:
+        try:
+            fields['t'] = _parse_timestamp(fields['t'])
+        except (TypeError, ValueError, OverflowError, OSError) as e:
+            raise ValueError(f"Invalid cursor: {value!r}") from e
+    return fields
+
+
+def make_etag(*parts):
+    """Strong ETag value derived from ``parts`` (anything with a stable repr)."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
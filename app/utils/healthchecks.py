@@ -2,6 +2,7 @@
 import requests
 from datetime import datetime, timezone
 from flask import current_app
+from app.utils.http import http_sessions
 
 
 def check_http_service(url, name, timeout=5):
@@ -18,7 +19,7 @@ def check_http_service(url, name, timeout=5):
     """
     try:
         start_time = datetime.now(timezone.utc)
-        response = requests.get(url, timeout=timeout, allow_redirects=True)
+        response = http_sessions.session('health').get(url, timeout=timeout, allow_redirects=True)
         end_time = datetime.now(timezone.utc)
         
         response_time = (end_time - start_time).total_seconds() * 1000  # Convert to milliseconds
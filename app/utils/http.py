@@ -0,0 +1,116 @@
+"""Shared keep-alive HTTP sessions for all outbound requests."""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionRegistry:
+    """
+    Per-process registry of named ``requests.Session`` objects.
+
+    Each session mounts an ``HTTPAdapter`` whose pool manager keeps one
+    connection pool per (scheme, host, port): ``pool_connections`` is how many
+    host pools are kept alive, ``pool_maxsize`` how many connections each pool
+    holds. Sessions are rebuilt after a fork so worker processes never share
+    sockets with their parent.
+    """
+
+    def __init__(self, pool_connections=100, pool_maxsize=10):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._sessions = {}
+        self._adapters = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def configure(self, pool_connections=None, pool_maxsize=None):
+        """Set default pool sizes for sessions created from now on."""
+        if pool_connections is not None:
+            self.pool_connections = pool_connections
+        if pool_maxsize is not None:
+            self.pool_maxsize = pool_maxsize
+
+    def session(self, name='default', pool_connections=None, pool_maxsize=None):
+        """
+        Return the session called ``name``, creating it on first use.
+
+        Args:
+            name: Purpose of the session (e.g. ``'agents'``, ``'health'``)
+            pool_connections: Host pools to keep (default from ``configure``)
+            pool_maxsize: Connections per host (default from ``configure``)
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the inherited sockets belong to the parent
+                self._sessions = {}
+                self._adapters = {}
+                self._pid = os.getpid()
+
+            session = self._sessions.get(name)
+            if session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=pool_connections or self.pool_connections,
+                    pool_maxsize=pool_maxsize or self.pool_maxsize
+                )
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[name] = session
+                self._adapters[name] = adapter
+            return session
+
+    def stats(self):
+        """
+        Connection reuse per session and host.
+
+        A request that reused a pooled connection is a hit; one that had to
+        open a new connection is a miss. Counters of host pools evicted from
+        the pool manager are lost.
+        """
+        stats = {}
+        with self._lock:
+            adapters = list(self._adapters.items())
+        for name, adapter in adapters:
+            hosts = {}
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_made = pool.num_requests
+                connections = pool.num_connections
+                hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                    'requests': requests_made,
+                    'hits': max(0, requests_made - connections),
+                    'misses': connections,
+                    'idle': pool.pool.qsize() if pool.pool is not None else 0
+                }
+            stats[name] = {
+                'pool_connections': adapter._pool_connections,
+                'pool_maxsize': adapter._pool_maxsize,
+                'requests': sum(h['requests'] for h in hosts.values()),
+                'hits': sum(h['hits'] for h in hosts.values()),
+                'misses': sum(h['misses'] for h in hosts.values()),
+                'hosts': hosts
+            }
+        return stats
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+            self._adapters = {}
+
+
+# Global registry used by every outbound request in this process
+http_sessions = SessionRegistry()
+
+
+def init_http_sessions(app):
+    http_sessions.configure(
+        pool_connections=app.config.get('HTTP_POOL_CONNECTIONS', 100),
+        pool_maxsize=app.config.get('HTTP_POOL_MAXSIZE', 10)
+    )
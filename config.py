@@ -1,6 +1,7 @@
 """Configuration settings for different environments."""
 # Import os module to access environment variables
 import os
+import tempfile
 # Import load_dotenv to read variables from .env file
 from dotenv import load_dotenv
 
@@ -46,10 +47,95 @@ class Config:
     SLACK_CHANNEL = os.environ.get('SLACK_CHANNEL', '#monitoring')
     SLACK_USERNAME = os.environ.get('SLACK_USERNAME', 'System Monitor Bot')
     
+    # Notification delivery: a worker pool sends alerts off the alert-check path (0 = send inline)
+    NOTIFICATION_WORKERS = int(os.environ.get('NOTIFICATION_WORKERS', 4))
+    NOTIFICATION_QUEUE_SIZE = int(os.environ.get('NOTIFICATION_QUEUE_SIZE', 1000))
+    NOTIFICATION_CHANNEL_LIMITS = os.environ.get('NOTIFICATION_CHANNEL_LIMITS', 'email:2,sms:2,slack:4')  # concurrent sends per channel
+    NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', 4))
+    NOTIFICATION_RETRY_BACKOFF = float(os.environ.get('NOTIFICATION_RETRY_BACKOFF', 2))  # seconds, doubled per retry
+    
     # Monitoring settings
-    METRIC_COLLECTION_INTERVAL = int(os.environ.get('METRIC_COLLECTION_INTERVAL', 60))  # seconds
+    METRIC_COLLECTION_INTERVAL = int(os.environ.get('METRIC_COLLECTION_INTERVAL', 5))  # seconds
+    # Stored samples reuse a socket table scan this recent instead of walking every socket each time
+    COLLECTION_CONNECTIONS_MAX_AGE = float(os.environ.get('COLLECTION_CONNECTIONS_MAX_AGE', 30))  # seconds
     DATA_RETENTION_DAYS = int(os.environ.get('DATA_RETENTION_DAYS', 30))  # days
+    # Retention runs every N seconds, deleting in chunks of M rows for at most RETENTION_MAX_RUNTIME seconds
+    RETENTION_INTERVAL = int(os.environ.get('RETENTION_INTERVAL', 3600))  # seconds
+    RETENTION_CHUNK_SIZE = int(os.environ.get('RETENTION_CHUNK_SIZE', 5000))
+    RETENTION_CHUNK_PAUSE = float(os.environ.get('RETENTION_CHUNK_PAUSE', 0.05))  # seconds between chunks
+    RETENTION_MAX_RUNTIME = int(os.environ.get('RETENTION_MAX_RUNTIME', 300))  # seconds
+    # PostgreSQL: daily partitions of the raw metric tables are created this many days ahead
+    RETENTION_PARTITIONS_AHEAD = int(os.environ.get('RETENTION_PARTITIONS_AHEAD', 3))
     ALERT_CHECK_INTERVAL = int(os.environ.get('ALERT_CHECK_INTERVAL', 60))  # seconds
+    # A pending alert window restarts if no sample arrives for this long
+    ALERT_MAX_SAMPLE_GAP = int(os.environ.get('ALERT_MAX_SAMPLE_GAP', 180))  # seconds
+    
+    # Pull mode: remote agents that don't push are scraped concurrently every N seconds
+    REMOTE_POLL_INTERVAL = int(os.environ.get('REMOTE_POLL_INTERVAL', 60))  # seconds
+    REMOTE_POLL_WORKERS = int(os.environ.get('REMOTE_POLL_WORKERS', 32))
+    REMOTE_POLL_TIMEOUT = float(os.environ.get('REMOTE_POLL_TIMEOUT', 5))  # seconds per host
+    
+    # Live /api/metrics for a remote server: one upstream request per server, reused for N seconds
+    REMOTE_METRICS_TTL = float(os.environ.get('REMOTE_METRICS_TTL', 2))  # seconds
+    
+    # Outbound HTTP keep-alive pools (per session: host pools kept, connections per host)
+    HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 100))
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 10))
+    
+    # Largest batch accepted by POST /api/ingest
+    INGEST_MAX_SAMPLES = int(os.environ.get('INGEST_MAX_SAMPLES', 1000))
+    # Largest POST /api/ingest body, also enforced after gzip decompression
+    INGEST_MAX_BODY_BYTES = int(os.environ.get('INGEST_MAX_BODY_BYTES', 16 * 1024 * 1024))
+    
+    # Health checks: the scheduler ticks every N seconds and runs due services concurrently
+    HEALTH_CHECK_TICK = int(os.environ.get('HEALTH_CHECK_TICK', 5))  # seconds
+    HEALTH_CHECK_MAX_CONCURRENCY = int(os.environ.get('HEALTH_CHECK_MAX_CONCURRENCY', 10))
+    HEALTH_CHECK_SYNC_INTERVAL = int(os.environ.get('HEALTH_CHECK_SYNC_INTERVAL', 30))  # seconds
+    
+    # Write buffer: samples are flushed as one bulk insert every N seconds or M rows
+    METRIC_FLUSH_INTERVAL = int(os.environ.get('METRIC_FLUSH_INTERVAL', 60))  # seconds
+    METRIC_FLUSH_ROWS = int(os.environ.get('METRIC_FLUSH_ROWS', 500))
+    METRIC_BUFFER_MAX_ROWS = int(os.environ.get('METRIC_BUFFER_MAX_ROWS', 10000))
+    # What to do when the buffer is full: 'aggregate' merges the oldest samples, 'drop' discards them
+    METRIC_BUFFER_POLICY = os.environ.get('METRIC_BUFFER_POLICY', 'aggregate')
+    
+    # Rollups (1m/5m/1h min/max/avg/last) are kept much longer than raw samples
+    ROLLUP_1M_RETENTION_DAYS = int(os.environ.get('ROLLUP_1M_RETENTION_DAYS', 30))
+    ROLLUP_5M_RETENTION_DAYS = int(os.environ.get('ROLLUP_5M_RETENTION_DAYS', 180))
+    ROLLUP_1H_RETENTION_DAYS = int(os.environ.get('ROLLUP_1H_RETENTION_DAYS', 730))
+    # Target point count for /api/metrics/history when the caller doesn't pass one
+    HISTORY_DEFAULT_POINTS = int(os.environ.get('HISTORY_DEFAULT_POINTS', 500))
+    
+    # Real-time sampler settings
+    # One sampler thread per process refreshes the snapshot served by /api/metrics
+    METRICS_SAMPLE_INTERVAL = float(os.environ.get('METRICS_SAMPLE_INTERVAL', 1))  # seconds
+    METRICS_SAMPLER_ENABLED = os.environ.get('METRICS_SAMPLER_ENABLED', 'true').lower() in ['true', 'on', '1']
+    # Expensive collectors reuse their last result for this long instead of running every tick
+    METRICS_CONNECTIONS_MAX_AGE = float(os.environ.get('METRICS_CONNECTIONS_MAX_AGE', 5))  # seconds
+    METRICS_DISK_MAX_AGE = float(os.environ.get('METRICS_DISK_MAX_AGE', 30))  # seconds
+    # The sampler only runs collectors requested (?fields=, streams) within this window
+    METRICS_DEMAND_WINDOW = float(os.environ.get('METRICS_DEMAND_WINDOW', 60))  # seconds
+    
+    # Live metrics stream (/api/stream/metrics): each subscriber holds a worker thread,
+    # so keep STREAM_MAX_SUBSCRIBERS below the gunicorn --threads count
+    STREAM_MAX_SUBSCRIBERS = int(os.environ.get('STREAM_MAX_SUBSCRIBERS', 24))  # per process
+    STREAM_HEARTBEAT = float(os.environ.get('STREAM_HEARTBEAT', 15))  # seconds
+    STREAM_MAX_DURATION = float(os.environ.get('STREAM_MAX_DURATION', 300))  # seconds, then the browser reconnects
+    
+    # Leader election for background jobs
+    # 'database' (lease rows), 'redis' (SET NX keys on REDIS_URL) or 'none' (every process runs every job)
+    LEADER_ELECTION_BACKEND = os.environ.get('LEADER_ELECTION_BACKEND', 'database')
+    LEADER_LEASE_TTL = int(os.environ.get('LEADER_LEASE_TTL', 30))  # seconds
+    
+    # Exports stream rows from the database in batches of N
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+    # Parquet/Arrow exports: rows per row group and column compression codec
+    EXPORT_ROW_GROUP_SIZE = int(os.environ.get('EXPORT_ROW_GROUP_SIZE', 65536))
+    EXPORT_COMPRESSION = os.environ.get('EXPORT_COMPRESSION', 'zstd')
+    # Background export jobs: worker threads, where files are written (shared by all workers) and how long they are kept
+    EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS', 2))
+    EXPORT_SPOOL_DIR = os.environ.get('EXPORT_SPOOL_DIR') or os.path.join(tempfile.gettempdir(), 'system-monitor-exports')
+    EXPORT_JOB_TTL = int(os.environ.get('EXPORT_JOB_TTL', 3600))  # seconds
     
     # Pagination
     ITEMS_PER_PAGE = 50
@@ -0,0 +1,31 @@
+"""Add server_latest_metrics table
+
+Revision ID: 5d0e8c3b71f4
+Revises: c41f9b7d2a63
+Create Date: 2026-10-18 12:40:05.671293
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d0e8c3b71f4'
+down_revision = 'c41f9b7d2a63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('server_latest_metrics',
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('metric', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.Float(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['server_id'], ['servers.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('server_id', 'metric')
+    )
+
+
+def downgrade():
+    op.drop_table('server_latest_metrics')
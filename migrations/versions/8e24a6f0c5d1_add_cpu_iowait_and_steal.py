@@ -0,0 +1,28 @@
+"""Add cpu_iowait and cpu_steal to system_metrics
+
+Revision ID: 8e24a6f0c5d1
+Revises: 3b7c1d2e9a40
+Create Date: 2026-10-18 10:03:17.284960
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e24a6f0c5d1'
+down_revision = '3b7c1d2e9a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('system_metrics', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cpu_iowait', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('cpu_steal', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('system_metrics', schema=None) as batch_op:
+        batch_op.drop_column('cpu_steal')
+        batch_op.drop_column('cpu_iowait')
@@ -0,0 +1,26 @@
+"""Index servers.api_key for agent authentication
+
+Revision ID: a97e3f52c018
+Revises: 5d0e8c3b71f4
+Create Date: 2026-10-18 14:05:37.418206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a97e3f52c018'
+down_revision = '5d0e8c3b71f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('servers', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_servers_api_key'), ['api_key'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('servers', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_servers_api_key'))
@@ -0,0 +1,43 @@
+"""Add 1m/5m/1h metric rollup tables
+
+Revision ID: c41f9b7d2a63
+Revises: 8e24a6f0c5d1
+Create Date: 2026-10-18 11:26:52.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f9b7d2a63'
+down_revision = '8e24a6f0c5d1'
+branch_labels = None
+depends_on = None
+
+
+ROLLUP_TABLES = ['metric_rollups_1m', 'metric_rollups_5m', 'metric_rollups_1h']
+
+
+def upgrade():
+    for table_name in ROLLUP_TABLES:
+        op.create_table(table_name,
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('server_id', sa.Integer(), nullable=False),
+            sa.Column('metric', sa.String(length=50), nullable=False),
+            sa.Column('bucket', sa.DateTime(), nullable=False),
+            sa.Column('sample_count', sa.Integer(), nullable=False),
+            sa.Column('value_sum', sa.Float(), nullable=False),
+            sa.Column('value_min', sa.Float(), nullable=True),
+            sa.Column('value_max', sa.Float(), nullable=True),
+            sa.Column('value_last', sa.Float(), nullable=True),
+            sa.Column('last_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['server_id'], ['servers.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('server_id', 'metric', 'bucket', name=f'uq_{table_name}_key')
+        )
+
+
+def downgrade():
+    for table_name in reversed(ROLLUP_TABLES):
+        op.drop_table(table_name)
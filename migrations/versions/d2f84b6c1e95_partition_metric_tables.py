@@ -0,0 +1,87 @@
+"""Partition raw metric tables by day on PostgreSQL
+
+Revision ID: d2f84b6c1e95
+Revises: a97e3f52c018
+Create Date: 2026-10-18 19:12:08.503117
+
+"""
+from datetime import date, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f84b6c1e95'
+down_revision = 'a97e3f52c018'
+branch_labels = None
+depends_on = None
+
+
+PARTITIONED_TABLES = ['system_metrics', 'network_metrics', 'process_snapshots']
+
+# Days of history and of future that get their own partition up front; older
+# rows go to the default partition and expire through chunked deletes
+MAX_DAYS_BACK = 366
+DAYS_AHEAD = 7
+
+
+def _swap_out(table, suffix):
+    """Rename ``table`` out of the way, keeping its id sequence alive."""
+    op.execute(f'ALTER TABLE {table} RENAME TO {table}_{suffix}')
+    op.execute(f'ALTER TABLE {table}_{suffix} RENAME CONSTRAINT {table}_pkey TO {table}_{suffix}_pkey')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY NONE')
+    op.execute(f'DROP INDEX IF EXISTS ix_{table}_server_id')
+    op.execute(f'DROP INDEX IF EXISTS ix_{table}_timestamp')
+
+
+def _swap_in(table, suffix):
+    """Copy the old rows over, drop the old table and restore indexes."""
+    op.execute(f'INSERT INTO {table} SELECT * FROM {table}_{suffix}')
+    op.execute(f'DROP TABLE {table}_{suffix}')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    op.execute(f'ALTER TABLE {table} ADD FOREIGN KEY (server_id) REFERENCES servers (id)')
+    op.execute(f'CREATE INDEX ix_{table}_server_id ON {table} (server_id)')
+    op.execute(f'CREATE INDEX ix_{table}_timestamp ON {table} ("timestamp")')
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # SQLite has no partitioning; retention deletes in chunks instead
+        return
+
+    today = date.today()
+    for table in PARTITIONED_TABLES:
+        _swap_out(table, 'unpartitioned')
+        # The partition key must be part of the primary key and can't be NULL
+        op.execute(f"""UPDATE {table}_unpartitioned SET "timestamp" = '1970-01-01' WHERE "timestamp" IS NULL""")
+        op.execute(f'CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS) '
+                   f'PARTITION BY RANGE ("timestamp")')
+        op.execute(f'ALTER TABLE {table} ALTER COLUMN "timestamp" SET NOT NULL')
+        op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, "timestamp")')
+
+        oldest = bind.execute(sa.text(f'SELECT min("timestamp")::date FROM {table}_unpartitioned')).scalar()
+        first_day = max(oldest or today, today - timedelta(days=MAX_DAYS_BACK))
+        day = first_day
+        while day <= today + timedelta(days=DAYS_AHEAD):
+            op.execute(f"CREATE TABLE {table}_p{day:%Y%m%d} PARTITION OF {table} "
+                       f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')")
+            day += timedelta(days=1)
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+        _swap_in(table, 'unpartitioned')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    for table in PARTITIONED_TABLES:
+        _swap_out(table, 'partitioned')
+        op.execute(f'CREATE TABLE {table} (LIKE {table}_partitioned INCLUDING DEFAULTS)')
+        op.execute(f'ALTER TABLE {table} ALTER COLUMN "timestamp" DROP NOT NULL')
+        op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id)')
+        # Dropping the partitioned parent drops all of its partitions
+        _swap_in(table, 'partitioned')
@@ -0,0 +1,26 @@
+"""Add servers.last_push_at to tell pushing agents from polled ones
+
+Revision ID: e7a35c9b0d42
+Revises: d2f84b6c1e95
+Create Date: 2026-10-18 16:42:11.903518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a35c9b0d42'
+down_revision = 'd2f84b6c1e95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('servers', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_push_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('servers', schema=None) as batch_op:
+        batch_op.drop_column('last_push_at')
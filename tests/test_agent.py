@@ -0,0 +1,194 @@
+import json
+import os
+import subprocess
+import tempfile
+import sys
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from agent.collectors import CollectorRegistry, collect_metrics, collect_network, collect_sample, collectors
+from agent.cpu import CpuSampler
+from agent.runner import Agent
+from agent.server import SnapshotCache, make_server
+from agent.spool import RingLog
+from app.ingest import parse_ingest_payload
+from app.models import SystemMetric, NetworkMetric
+
+HEAVY_MODULES = {'flask', 'flask_sqlalchemy', 'sqlalchemy', 'pandas', 'twilio', 'apscheduler', 'numpy', 'requests', 'app'}
+
+FOOTPRINT_SCRIPT = '''
+import json, resource, sys, time
+import agent.__main__
+from agent.collectors import collect_sample
+from agent.cpu import CpuSampler
+sampler = CpuSampler()
+start = time.process_time()
+for _ in range(20):
+    collect_sample(sampler)
+cpu_ms = (time.process_time() - start) / 20 * 1000
+try:
+    # Peak RSS of this address space; ru_maxrss on Linux carries over the forked parent's peak
+    with open('/proc/self/status') as status:
+        rss_mb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM')) / 1024
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+heavy = sorted(m for m in sys.modules if m.split('.')[0] in %r)
+print(json.dumps({'rss_mb': rss_mb, 'cpu_ms': cpu_ms, 'heavy': heavy}))
+''' % (HEAVY_MODULES,)
+
+class AgentFootprintCase(unittest.TestCase):
+    def test_imports_memory_and_cpu_stay_small(self):
+        output = subprocess.run([sys.executable, '-c', FOOTPRINT_SCRIPT], capture_output=True,
+                                text=True, check=True, timeout=60).stdout
+        footprint = json.loads(output)
+        self.assertEqual(footprint['heavy'], [])
+        self.assertLess(footprint['rss_mb'], 40)
+        self.assertLess(footprint['cpu_ms'], 50)
+
+class CollectorRegistryCase(unittest.TestCase):
+    def setUp(self):
+        self.calls = {'cheap': 0, 'slow': 0}
+
+        def counter(name):
+            def collect():
+                self.calls[name] += 1
+                return self.calls[name]
+            return collect
+
+        self.registry = CollectorRegistry()
+        self.registry.register('cheap', counter('cheap'))
+        self.registry.register('slow', counter('slow'), max_age=60)
+
+    def test_runs_only_requested_collectors(self):
+        self.assertEqual(self.registry.collect(['cheap']), {'cheap': 1})
+        self.assertEqual(self.calls['slow'], 0)
+        with self.assertRaises(KeyError):
+            self.registry.collect(['cheap', 'sockets'])
+
+    def test_max_age_reuses_result_and_counts_cost(self):
+        self.registry.collect()
+        self.assertEqual(self.registry.collect(), {'cheap': 2, 'slow': 1})
+        stats = self.registry.stats()
+        self.assertEqual(stats['cheap']['calls'], 2)
+        self.assertEqual((stats['slow']['calls'], stats['slow']['reused']), (1, 1))
+        self.assertGreaterEqual(stats['slow']['total_seconds'], 0)
+
+        self.registry.configure(slow=0)
+        self.assertEqual(self.registry.collect(['slow']), {'slow': 2})
+        self.assertEqual(self.registry.collect(['slow'], max_age=60), {'slow': 2})
+
+    def test_errors_are_counted(self):
+        self.registry.register('broken', lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            self.registry.collect(['broken'])
+        self.assertEqual(self.registry.stats()['broken']['errors'], 1)
+
+    def test_metrics_fields(self):
+        self.assertEqual(list(collect_metrics(['memory', 'cpu'])), ['cpu', 'memory'])
+
+    def test_network_row_reuses_socket_scan(self):
+        collect_network(connections_max_age=60)
+        scans = collectors.stats()['connections']['calls']
+        row = collect_network(connections_max_age=60)
+        self.assertEqual(collectors.stats()['connections']['calls'], scans)
+        self.assertIn('connections_established', row)
+
+
+class AgentSampleCase(unittest.TestCase):
+    def test_sample_matches_ingest_format(self):
+        batches = parse_ingest_payload(1, [collect_sample(CpuSampler())])
+        self.assertEqual(len(batches[SystemMetric]), 1)
+        self.assertEqual(len(batches[NetworkMetric]), 1)
+
+    def test_failed_push_keeps_samples(self):
+        class Client:
+            fail = True
+            batches = []
+            def send(self, samples):
+                if self.fail:
+                    raise OSError('unreachable')
+                self.batches.append(len(samples))
+        client = Client()
+        agent = Agent(client, max_batch=2, push_interval=1, replay_rate=4)
+        for i in range(5):
+            agent.spool.append(json.dumps({'timestamp': i}).encode())
+        self.assertEqual(agent.push(), 0)
+        self.assertEqual(len(agent.spool), 5)
+        self.assertGreater(agent.next_push_delay(), 0.4)
+        client.fail = False
+        # The replay budget (burst of 4) lets four samples through now, the rest later
+        self.assertEqual(agent.push(), 4)
+        self.assertEqual(client.batches, [2, 2])
+        self.assertEqual(len(agent.spool), 1)
+
+class RingLogCase(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'spool.ring')
+
+    def test_survives_reopen_and_commits(self):
+        log = RingLog(self.path, capacity=1024)
+        for i in range(3):
+            log.append(f'sample-{i}'.encode())
+        log.commit(1)
+        log.close()
+
+        log = RingLog(self.path, capacity=1024)
+        self.assertEqual(log.peek(10), [b'sample-1', b'sample-2'])
+        log.close()
+
+    def test_overwrites_oldest_when_full(self):
+        log = RingLog(self.path, capacity=100)
+        for i in range(20):
+            self.assertTrue(log.append(b'%02d-' % i + b'x' * 10))
+        payloads = log.peek(100)
+        self.assertEqual(payloads[-1][:3], b'19-')
+        self.assertEqual(len(payloads) + log.dropped, 20)
+        # The newest records survive, in order (21-byte records, some space lost to wrapping)
+        self.assertEqual([p[:2] for p in payloads], [b'%02d' % i for i in range(20 - len(payloads), 20)])
+        self.assertGreaterEqual(len(payloads), 3)
+        self.assertFalse(log.append(b'x' * 200))
+        log.close()
+
+    def test_torn_record_is_discarded(self):
+        log = RingLog(self.path, capacity=1024)
+        log.append(b'good')
+        log.append(b'torn')
+        log._map[64 + 12 + 8] ^= 0xFF  # corrupt the second payload
+        self.assertEqual(log.peek(10), [b'good'])
+        self.assertEqual(len(log), 1)
+        log.close()
+
+class AgentServerCase(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+        def collect():
+            self.calls += 1
+            return {'cpu': {'percent': 1.0}}
+        self.server = make_server(('127.0.0.1', 0), 'secret', {'/api/metrics': SnapshotCache(collect, max_age=60)})
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/api/metrics'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get(self, key):
+        request = urllib.request.Request(self.url, headers={'X-API-Key': key})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read())
+
+    def test_serves_cached_snapshot_with_key(self):
+        self.assertEqual(self.get('secret'), {'cpu': {'percent': 1.0}})
+        self.get('secret')
+        self.assertEqual(self.calls, 1)
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            self.get('wrong')
+        self.assertEqual(error.exception.code, 401)
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            self.get('s\xe9cret')
+        self.assertEqual(error.exception.code, 401)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,209 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from types import SimpleNamespace
+from app import create_app
+from app.alerts import CompiledRules, check_and_notify_alerts, alert_tracker, AlertStateTracker
+from app.ingest import write_metric_rows
+from app.leader import LeaderElector
+from app.notifications import notification_dispatcher
+from app.models import db, User, Server, SystemMetric, NetworkMetric, AlertRule, AlertHistory
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    NOTIFICATION_WORKERS = 0
+
+def rule(id, metric_type, comparison, threshold, server_id=None, duration=60):
+    return SimpleNamespace(id=id, metric_type=metric_type, comparison=comparison,
+                           threshold=threshold, server_id=server_id, duration=duration)
+
+class EvaluateRulesCase(unittest.TestCase):
+    def test_rules_by_servers_matrix(self):
+        rules = [
+            rule(1, 'cpu', '>', 80),
+            rule(2, 'memory', '<=', 10, server_id=2),
+            rule(3, 'unknown', '>', 0),
+        ]
+        latest = {
+            1: {'cpu_percent': 95.0, 'memory_percent': 5.0},
+            2: {'cpu_percent': 50.0, 'memory_percent': 5.0},
+            3: {'cpu_percent': 99.0},
+        }
+        breached, _, values = CompiledRules(rules).evaluate([1, 2, 3], [True, True, False], latest)
+        self.assertEqual(breached.tolist(), [
+            [True, False, False],   # server 3 is inactive
+            [False, True, False],   # scoped to server 2
+            [False, False, False],  # unknown metric type never fires
+        ])
+        self.assertEqual(values[0, 0], 95.0)
+
+class AlertStateTrackerCase(unittest.TestCase):
+    def setUp(self):
+        self.tracker = AlertStateTracker(max_gap=30)
+        self.tracker.load_rules([rule(1, 'cpu', '>', 80, duration=60)])
+        self.start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    def feed(self, seconds, cpu):
+        self.tracker.observe(1, {'cpu_percent': cpu}, self.start + timedelta(seconds=seconds))
+        return [(t.kind, t.value) for t in self.tracker.drain_transitions()]
+
+    def test_fires_only_after_whole_window(self):
+        for second in range(0, 60, 10):
+            self.assertEqual(self.feed(second, 95.0), [])
+        self.assertEqual(self.tracker.states[(1, 1)].status, 'pending')
+        self.assertEqual(self.feed(60, 96.0), [('firing', 96.0)])
+        self.assertEqual(self.feed(70, 97.0), [])
+        self.assertEqual(self.feed(80, 10.0), [('resolved', 10.0)])
+        self.assertNotIn((1, 1), self.tracker.states)
+
+    def test_healthy_sample_resets_window(self):
+        self.feed(0, 95.0)
+        self.feed(50, 50.0)
+        for second in range(60, 120, 20):
+            self.assertEqual(self.feed(second, 95.0), [])
+        self.assertEqual(self.feed(120, 95.0), [('firing', 95.0)])
+
+    def test_gap_restarts_pending_window(self):
+        self.feed(0, 95.0)
+        self.assertEqual(self.feed(61, 95.0), [])  # 61s without samples > max_gap
+        self.assertEqual(self.tracker.states[(1, 1)].since, self.start + timedelta(seconds=61))
+
+    def test_other_metrics_and_stale_samples_are_ignored(self):
+        self.feed(0, 95.0)
+        self.tracker.observe(1, {'bytes_sent': 1}, self.start + timedelta(seconds=10))
+        self.feed(5, 10.0)  # older than the last sample seen
+        self.assertEqual(self.tracker.states[(1, 1)].status, 'pending')
+
+    def test_batch_rows_of_one_sample_are_observed_together(self):
+        self.tracker.load_rules([rule(1, 'cpu', '>', 50, duration=0),
+                                 rule(2, 'network_sent', '>', 100, duration=0)])
+        self.tracker.observe_batches({
+            SystemMetric: [{'server_id': 1, 'timestamp': self.start, 'cpu_percent': 90.0}],
+            NetworkMetric: [{'server_id': 1, 'timestamp': self.start, 'bytes_sent': 1000}]
+        })
+        fired = {t.rule_id for t in self.tracker.drain_transitions() if t.kind == 'firing'}
+        self.assertEqual(fired, {1, 2})
+
+    def test_every_row_of_a_batch_is_observed(self):
+        def batch(cpus):
+            # Shuffled order: the tracker must sort by timestamp
+            rows = [{'server_id': 1, 'timestamp': self.start + timedelta(seconds=10 * i), 'cpu_percent': cpu}
+                    for i, cpu in enumerate(cpus)]
+            return {SystemMetric: rows[::-1]}
+
+        self.tracker.load_rules([rule(1, 'cpu', '>', 80, duration=50)])
+        self.tracker.observe_batches(batch([95.0, 95.0, 95.0, 10.0, 95.0, 95.0]))
+        self.assertEqual(self.tracker.drain_transitions(), [])
+        self.assertEqual(self.tracker.states[(1, 1)].since, self.start + timedelta(seconds=40))
+
+        self.tracker.reset()
+        self.tracker.load_rules([rule(1, 'cpu', '>', 80, duration=50)])
+        self.tracker.observe_batches(batch([95.0] * 6))
+        self.assertEqual([t.kind for t in self.tracker.drain_transitions()], ['firing'])
+
+class CheckAlertsCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(config_object=TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        user = User(username='ops', email='ops@example.com')
+        user.set_password('secret')
+        self.server = Server(name='web-1', hostname='web-1', api_key='key', is_active=True)
+        db.session.add_all([user, self.server])
+        db.session.commit()
+        db.session.add(AlertRule(user_id=user.id, name='High CPU', metric_type='cpu',
+                                 threshold=90, comparison='>', duration=0))
+        db.session.commit()
+        alert_tracker.reset()
+        write_metric_rows({SystemMetric: [{
+            'server_id': self.server.id, 'timestamp': datetime.now(timezone.utc),
+            'cpu_percent': 97.5, 'memory_total': 1, 'memory_used': 1, 'memory_percent': 100.0
+        }]})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    @mock.patch('app.alerts.send_email_alert', return_value=True)
+    def test_fires_once_per_incident(self, send_email):
+        check_and_notify_alerts()
+        check_and_notify_alerts()
+        history = AlertHistory.query.filter_by(server_id=self.server.id).all()
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history[0].metric_value, 97.5)
+        self.assertEqual(send_email.call_count, 1)
+
+    @mock.patch('app.alerts.send_email_alert', return_value=True)
+    def test_waits_for_duration(self, send_email):
+        AlertRule.query.update({'duration': 300})
+        db.session.commit()
+        check_and_notify_alerts()
+        self.assertEqual(AlertHistory.query.count(), 0)
+        self.assertFalse(send_email.called)
+
+    @mock.patch('app.alerts.send_email_alert', return_value=True)
+    def test_catches_up_on_every_row_stored_by_other_workers(self, send_email):
+        check_and_notify_alerts()
+        rule_id = AlertRule.query.one().id
+        AlertRule.query.update({'duration': 20})
+        db.session.add(AlertRule(user_id=User.query.one().id, name='Upload', metric_type='network_sent',
+                                 threshold=100, comparison='>', duration=0))
+        db.session.commit()
+        
+        # Written (e.g. by /api/ingest in another worker) without touching this tracker
+        start = datetime.now(timezone.utc) + timedelta(seconds=1)
+        system = [{'server_id': self.server.id, 'timestamp': start + timedelta(seconds=10 * i),
+                   'cpu_percent': cpu, 'memory_total': 1, 'memory_used': 1, 'memory_percent': 100.0}
+                  for i, cpu in enumerate([97.0, 10.0, 97.0, 97.0])]
+        network = [{'server_id': self.server.id, 'timestamp': start, 'bytes_sent': 1000, 'bytes_recv': 0}]
+        write_metric_rows({SystemMetric: system, NetworkMetric: network})
+        
+        check_and_notify_alerts()
+        history = AlertHistory.query.order_by(AlertHistory.id).all()
+        # The dip restarted the CPU window: 10s held since, not 20s
+        self.assertEqual([h.rule_id for h in history], [rule_id, rule_id + 1])
+        self.assertEqual(alert_tracker.states[(rule_id, self.server.id)].status, 'pending')
+
+    @mock.patch('app.alerts.send_email_alert', return_value=True)
+    def test_state_is_kept_by_the_lease_holder_only(self, send_email):
+        from app.tasks import check_alerts_job, scheduler
+        scheduler.app = self.app
+        backend = mock.Mock()
+        with mock.patch('app.tasks.elector', LeaderElector(backend, holder='worker-1')):
+            backend.acquire.return_value = True
+            check_alerts_job()
+            self.assertEqual(AlertHistory.query.count(), 1)
+            self.assertEqual(len(alert_tracker.states), 1)
+            
+            # Another worker took over: samples fed here no longer build state
+            backend.acquire.return_value = False
+            check_alerts_job()
+            alert_tracker.observe(self.server.id, {'cpu_percent': 99.0}, datetime.now(timezone.utc))
+            self.assertEqual(alert_tracker.states, {})
+            self.assertFalse(alert_tracker.has_transitions())
+            
+            # Back in charge: rules are reloaded and state rebuilt from the database
+            backend.acquire.return_value = True
+            check_alerts_job()
+            self.assertEqual(len(alert_tracker.states), 1)
+
+    @mock.patch('app.alerts.send_email_alert', side_effect=[False, True])
+    def test_queued_delivery_sets_flag_after_retry(self, send_email):
+        notification_dispatcher.configure(workers=1, backoff_base=0.01)
+        notification_dispatcher.start(self.app)
+        try:
+            check_and_notify_alerts()
+            self.assertTrue(notification_dispatcher.drain(5))
+        finally:
+            notification_dispatcher.stop(1)
+        self.assertEqual(send_email.call_count, 2)
+        db.session.expire_all()
+        self.assertTrue(AlertHistory.query.one().email_sent)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,32 @@
+import unittest
+from datetime import datetime, timezone
+
+from app.utils.cursors import decode_cursor, encode_cursor, make_etag, parse_since
+
+
+class CursorTestCase(unittest.TestCase):
+    def test_round_trip(self):
+        timestamp = datetime(2026, 1, 1, 12, 0, 0, 250000, tzinfo=timezone.utc)
+        cursor = encode_cursor(t=timestamp, id=42, r='raw', skipped=None)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor), {'t': timestamp.isoformat(), 'id': 42, 'r': 'raw'})
+        self.assertEqual(parse_since(cursor), {'t': timestamp, 'id': 42, 'r': 'raw'})
+
+    def test_parse_timestamps(self):
+        expected = {'t': datetime(2026, 1, 1, tzinfo=timezone.utc)}
+        self.assertEqual(parse_since('2026-01-01T00:00:00Z'), expected)
+        self.assertEqual(parse_since('2026-01-01T00:00:00'), expected)
+        self.assertEqual(parse_since('1767225600'), expected)
+
+    def test_invalid(self):
+        for value in ('not-a-cursor', 'inf', encode_cursor(t='yesterday'), encode_cursor(t=10 ** 30)):
+            with self.assertRaises(ValueError):
+                parse_since(value)
+
+    def test_etag(self):
+        self.assertEqual(make_etag('a', 1, None), make_etag('a', 1, None))
+        self.assertNotEqual(make_etag('a', 1), make_etag('a', 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+from app.downsample import downsample_points, lttb_indices, minmax_indices, select_indices
+
+class DownsampleCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.x = np.arange(43200, dtype=np.float64) * 60
+        self.y = 20 + rng.normal(0, 2, len(self.x))
+        self.y[12345] = 99.0  # a single spike
+        self.y[30000] = 0.5   # and a single dip
+
+    def test_lttb_keeps_shape_and_spikes(self):
+        indices = lttb_indices(self.x, self.y, 1000)
+        self.assertEqual(len(indices), 1000)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], len(self.x) - 1)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertIn(12345, indices)
+        self.assertIn(30000, indices)
+
+    def test_lttb_skips_missing_values(self):
+        y = self.y.copy()
+        y[::3] = np.nan
+        indices = lttb_indices(self.x, y, 500)
+        self.assertFalse(np.isnan(y[indices[1:-1]]).any())
+
+    def test_minmax_keeps_bucket_extremes(self):
+        indices = minmax_indices(self.y, 1000)
+        self.assertLessEqual(len(indices), 1000)
+        self.assertIn(12345, indices)
+        self.assertIn(30000, indices)
+        self.assertEqual(self.y[indices].max(), self.y.max())
+        self.assertEqual(self.y[indices].min(), self.y.min())
+
+    def test_multiple_columns_share_the_budget(self):
+        other = np.full(len(self.x), 50.0)
+        other[40000] = 75.0
+        empty = np.full(len(self.x), np.nan)
+        indices = select_indices(self.x, [self.y, other, empty], 1000)
+        self.assertLessEqual(len(indices), 1000)
+        self.assertIn(12345, indices)
+        self.assertIn(40000, indices)
+
+        self.assertEqual(len(select_indices(self.x[:10], [self.y[:10]], 1000)), 10)
+
+        # Budgets smaller than the per-series minimum still hold
+        for max_points in (1, 2, 3, 7):
+            for method in ('lttb', 'minmax'):
+                indices = select_indices(self.x, [self.y, other, self.y * 2, other + 1], max_points, method)
+                self.assertLessEqual(len(indices), max_points)
+                self.assertEqual(indices[0], 0)
+
+    def test_downsample_points(self):
+        points = [{'timestamp': f'2026-01-01T00:{i // 60:02d}:{i % 60:02d}', 'cpu_percent': float(i % 7), 'cpu_temp_c': None}
+                  for i in range(3600)]
+        thinned = downsample_points(points, ['cpu_percent', 'cpu_temp_c'], 100, 'minmax')
+        self.assertLessEqual(len(thinned), 100)
+        self.assertIs(thinned[0], points[0])
+        self.assertIs(thinned[-1], points[-1])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,275 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta, timezone
+from io import BytesIO, StringIO
+from sqlalchemy import event
+from app import create_app
+from app.export import export_metrics_to_arrow, export_metrics_to_csv, export_metrics_to_json
+from app.export_jobs import ExportJobManager, export_jobs, parse_export_request
+from app.models import db, User, Server, SystemMetric, NetworkMetric
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    EXPORT_BATCH_SIZE = 100
+    EXPORT_SPOOL_DIR = tempfile.mkdtemp()
+
+class ExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(config_object=TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        # Export jobs of other tests must not be served from the cache
+        shutil.rmtree(TestConfig.EXPORT_SPOOL_DIR, ignore_errors=True)
+        os.makedirs(TestConfig.EXPORT_SPOOL_DIR)
+
+        servers = [Server(name=f'web-{i}', hostname=f'web-{i}', api_key=f'key-{i}') for i in range(2)]
+        db.session.add_all(servers)
+        db.session.flush()
+        start = datetime.now(timezone.utc) - timedelta(hours=1)
+        for i in range(250):
+            timestamp = start + timedelta(seconds=10 * i)
+            server = servers[i % 2]
+            db.session.add(SystemMetric(server_id=server.id, timestamp=timestamp, cpu_percent=i % 100,
+                                        memory_total=2 * 1024 ** 3, memory_used=1024 ** 3,
+                                        memory_percent=50.0))
+            db.session.add(NetworkMetric(server_id=server.id, timestamp=timestamp,
+                                         bytes_sent=i, bytes_recv=2 * i))
+        db.session.commit()
+        self.servers = servers
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count_queries(self, export, **kwargs):
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', before_execute)
+        try:
+            chunks = list(export(**kwargs))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_execute)
+        return chunks, statements
+
+    def test_csv_streams_in_batches_without_per_row_queries(self):
+        chunks, statements = self.count_queries(export_metrics_to_csv, batch_size=100)
+        # Server names plus one query per metric table
+        self.assertEqual(len(statements), 3)
+        self.assertEqual(len(chunks), 6)
+
+        system, network = ''.join(chunks).split('\n\n\n')
+        self.assertTrue(system.startswith('# SYSTEM_METRICS\n'))
+        self.assertTrue(network.startswith('# NETWORK_METRICS\n'))
+        rows = list(csv.DictReader(StringIO(system.split('\n', 1)[1])))
+        self.assertEqual(len(rows), 250)
+        self.assertEqual(rows[0]['server'], 'web-0')
+        self.assertEqual(rows[1]['server'], 'web-1')
+        self.assertEqual(float(rows[0]['memory_total_gb']), 2.0)
+        self.assertEqual(rows[0]['cpu_temp_c'], '')
+
+    def test_csv_filters_by_server_and_type(self):
+        body = ''.join(export_metrics_to_csv(server_id=self.servers[1].id, metric_types=['network']))
+        self.assertTrue(body.startswith('# NETWORK_METRICS\n'))
+        rows = list(csv.DictReader(StringIO(body.split('\n', 1)[1])))
+        self.assertEqual(len(rows), 125)
+        self.assertEqual({row['server'] for row in rows}, {'web-1'})
+
+    def test_json_export_is_one_valid_document(self):
+        chunks, statements = self.count_queries(export_metrics_to_json, batch_size=100)
+        self.assertEqual(len(statements), 3)
+        data = json.loads(''.join(chunks))
+        self.assertIn('export_date', data)
+        self.assertEqual(len(data['metrics']['system']), 250)
+        self.assertEqual(len(data['metrics']['network']), 250)
+        self.assertEqual(data['metrics']['system'][1]['server'], 'web-1')
+        self.assertEqual(data['metrics']['network'][3]['bytes_recv'], 6)
+
+        empty = json.loads(''.join(export_metrics_to_json(server_id=999, metric_types=['system'])))
+        self.assertEqual(empty['metrics'], {'system': []})
+
+    def test_parquet_keeps_native_types(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        chunks = list(export_metrics_to_arrow('parquet', batch_size=100))
+        parquet = pq.ParquetFile(BytesIO(b''.join(chunks)))
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        table = parquet.read()
+        self.assertEqual(table.num_rows, 250)
+        self.assertEqual(table.schema.field('timestamp').type, pa.timestamp('us', tz='UTC'))
+        self.assertEqual(table.schema.field('memory_total').type, pa.int64())
+        self.assertEqual(table.column('memory_total')[0].as_py(), 2 * 1024 ** 3)
+        self.assertEqual(table.column('server').to_pylist()[:2], ['web-0', 'web-1'])
+        self.assertIsNone(table.column('cpu_temp_c')[0].as_py())
+
+    def test_arrow_export_filters_by_server(self):
+        import pyarrow as pa
+        data = b''.join(export_metrics_to_arrow('arrow', server_id=self.servers[0].id,
+                                                metric_type='network', batch_size=50))
+        table = pa.ipc.open_file(pa.BufferReader(data)).read_all()
+        self.assertEqual(table.num_rows, 125)
+        self.assertEqual(set(table.column('server_id').to_pylist()), {self.servers[0].id})
+        self.assertEqual(table.column('bytes_recv').to_pylist()[:2], [0, 4])
+
+        with self.assertRaises(ValueError):
+            export_metrics_to_arrow('arrow', metric_type='disk')
+
+    def login(self):
+        user = User(username='admin', email='admin@example.com', is_admin=True)
+        user.set_password('admin')
+        db.session.add(user)
+        db.session.commit()
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'admin', 'password': 'admin'})
+        return client
+
+    def wait_for_job(self, client, job_id):
+        for _ in range(100):
+            job = client.get(f'/api/export/jobs/{job_id}').get_json()
+            if job['status'] in ('done', 'failed'):
+                return job
+            time.sleep(0.05)
+        self.fail('export job did not finish')
+
+    def test_parse_export_request(self):
+        now = datetime(2026, 1, 1, 12, 30, 45, tzinfo=timezone.utc)
+        export = parse_export_request({'format': 'parquet', 'days': 1}, now=now)
+        self.assertEqual(export.end_date, datetime(2026, 1, 1, 12, 30, tzinfo=timezone.utc))
+        self.assertEqual(export.metric_types, ['system'])
+        for body in ({'format': 'xlsx'}, {'format': 'csv', 'metrics': ['disk']},
+                     {'format': 'arrow', 'metrics': ['system', 'network']},
+                     {'format': 'csv', 'start': '2026-01-02T00:00:00Z', 'end': '2026-01-01T00:00:00Z'},
+                     {'format': 'csv', 'days': -1}, {'format': 'csv', 'days': 10 ** 12},
+                     {'format': 'csv', 'days': 1e300}):
+            with self.assertRaises(ValueError):
+                parse_export_request(body)
+
+    def test_export_job_runs_caches_and_resumes(self):
+        client = self.login()
+        body = {'format': 'csv', 'days': 1}
+        response = client.post('/api/export/jobs', json=body)
+        self.assertEqual(response.status_code, 202)
+        job = self.wait_for_job(client, response.get_json()['id'])
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['rows'], 500)
+        self.assertEqual(job['total_rows'], 500)
+        self.assertEqual(job['progress'], 1.0)
+
+        full = client.get(job['download_url'])
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(len(full.data), job['size'])
+        self.assertIn(b'# NETWORK_METRICS', full.data)
+        full.close()
+
+        # Resume from byte 100
+        partial = client.get(job['download_url'], headers={'Range': 'bytes=100-'})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.data, full.data[100:])
+        partial.close()
+
+        # The same export again is served from the finished file
+        again = client.post('/api/export/jobs', json=body)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.get_json()['id'], job['id'])
+        self.assertEqual(again.get_json()['finished_at'], job['finished_at'])
+
+        self.assertEqual(client.get('/api/export/jobs/0123456789abcdef0123').status_code, 404)
+        self.assertEqual(client.get('/api/export/jobs/../../etc').status_code, 404)
+        self.assertEqual(client.post('/api/export/jobs', json={'format': 'xml'}).status_code, 400)
+
+    def test_slow_job_stays_live_without_progress(self):
+        def slow_count(*args):
+            time.sleep(1.0)
+            return 500
+
+        manager = ExportJobManager(spool_dir=TestConfig.EXPORT_SPOOL_DIR, workers=1, stale_after=0.4)
+        manager.start(self.app)
+        try:
+            with mock.patch('app.export_jobs.count_metric_rows', side_effect=slow_count):
+                export = parse_export_request({'format': 'csv', 'days': 1})
+                job = manager.submit(export)
+                time.sleep(0.8)
+                # Still counting, yet touched within stale_after: not restarted
+                again = manager.submit(export)
+                self.assertEqual(again['status'], 'running')
+                self.assertEqual(again['created_at'], job['created_at'])
+                for _ in range(100):
+                    if manager.status(job['id'])['status'] == 'done':
+                        break
+                    time.sleep(0.05)
+        finally:
+            manager.shutdown(wait=True)
+        self.assertEqual(manager.status(job['id'])['status'], 'done')
+        self.assertFalse([name for name in os.listdir(TestConfig.EXPORT_SPOOL_DIR) if name.endswith('.part')])
+
+    def test_job_is_claimed_by_one_worker(self):
+        counts = []
+        def slow_count(*args):
+            counts.append(1)
+            time.sleep(0.5)
+            return 500
+
+        workers = [ExportJobManager(spool_dir=TestConfig.EXPORT_SPOOL_DIR, workers=1) for _ in range(2)]
+        for manager in workers:
+            manager.start(self.app)
+        try:
+            with mock.patch('app.export_jobs.count_metric_rows', side_effect=slow_count):
+                export = parse_export_request({'format': 'csv', 'days': 1})
+                job = workers[0].submit(export)
+                # The status file looks lost, but the first worker still holds the claim
+                os.remove(os.path.join(TestConfig.EXPORT_SPOOL_DIR, f"{job['id']}.json"))
+                other = workers[1].submit(export)
+                self.assertEqual(other['status'], 'queued')
+                for _ in range(100):
+                    status = workers[0].status(job['id'])
+                    if status and status['status'] == 'done':
+                        break
+                    time.sleep(0.05)
+        finally:
+            for manager in workers:
+                manager.shutdown(wait=True)
+        self.assertEqual(len(counts), 1)
+        self.assertEqual(workers[1].status(job['id'])['status'], 'done')
+
+    def test_columnar_export_job(self):
+        import pyarrow.parquet as pq
+        client = self.login()
+        response = client.post('/api/export/jobs', json={'format': 'parquet', 'days': 1, 'metrics': ['network'],
+                                                         'server_id': self.servers[1].id})
+        job = self.wait_for_job(client, response.get_json()['id'])
+        self.assertEqual(job['status'], 'done')
+        table = pq.read_table(export_jobs.artifact_path(job))
+        self.assertEqual(table.num_rows, 125)
+
+    def test_export_routes_stream(self):
+        client = self.login()
+
+        response = client.get('/api/export/json?days=1&metrics=system')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertIn('attachment', response.headers['Content-Disposition'])
+        self.assertEqual(len(json.loads(response.data)['metrics']['system']), 250)
+
+        response = client.get('/api/export/csv?days=1')
+        self.assertTrue(response.is_streamed)
+        self.assertIn(b'# NETWORK_METRICS', response.data)
+
+        response = client.get('/api/export/parquet?days=1&type=network')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/vnd.apache.parquet')
+        self.assertTrue(response.data.startswith(b'PAR1'))
+        self.assertEqual(client.get('/api/export/arrow?type=bogus').status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
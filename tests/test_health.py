@@ -0,0 +1,86 @@
+import threading
+import time
+import unittest
+from app import create_app
+from app.health import HealthCheckScheduler
+from app.models import db, ServiceHealth
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+
+class HealthCheckSchedulerCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(config_object=TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.fast = ServiceHealth(name='fast', url='http://fast', check_interval=10, timeout=1)
+        self.slow = ServiceHealth(name='slow', url='http://slow', check_interval=60, timeout=1)
+        db.session.add_all([self.fast, self.slow])
+        db.session.commit()
+        self.calls = []
+        self.scheduler = HealthCheckScheduler(max_workers=4, probe=self.probe)
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def probe(self, url, name, timeout):
+        self.calls.append(name)
+        return (name == 'fast', 200 if name == 'fast' else None, 12.5, None if name == 'fast' else 'down')
+
+    def tick(self, now):
+        started = self.scheduler.dispatch(self.app, now=now)
+        self.scheduler.wait(5)
+        return started
+
+    def test_each_service_runs_at_its_own_interval(self):
+        self.scheduler.sync(ServiceHealth.query.all(), now=0)
+        self.assertEqual(self.tick(0), 2)
+        for now in range(5, 65, 5):
+            self.tick(now)
+        self.assertEqual(self.calls.count('fast'), 7)  # 0, 10, ..., 60
+        self.assertEqual(self.calls.count('slow'), 2)  # 0, 60
+
+    def test_results_written_in_one_batch(self):
+        self.scheduler.sync(ServiceHealth.query.all(), now=0)
+        self.tick(0)
+        self.assertEqual(self.scheduler.write_results(), 2)
+        db.session.expire_all()
+        self.assertTrue(db.session.get(ServiceHealth, self.fast.id).is_up)
+        slow = db.session.get(ServiceHealth, self.slow.id)
+        self.assertFalse(slow.is_up)
+        self.assertEqual(slow.error_message, 'down')
+        self.assertIsNotNone(slow.last_check_time)
+
+    def test_running_probe_skips_its_slot_and_others_proceed(self):
+        release = threading.Event()
+        def probe(url, name, timeout):
+            if name == 'slow':
+                release.wait(5)
+            self.calls.append(name)
+            return (True, 200, 1.0, None)
+        self.scheduler.probe = probe
+        self.scheduler.sync(ServiceHealth.query.all(), now=0)
+        self.scheduler.dispatch(self.app, now=0)
+        deadline = time.monotonic() + 2
+        while 'fast' not in self.calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.calls, ['fast'])
+        self.assertEqual(self.scheduler.dispatch(self.app, now=60), 1)  # slow is still running
+        release.set()
+        self.scheduler.wait(5)
+
+    def test_removed_service_is_dropped(self):
+        self.scheduler.sync(ServiceHealth.query.all(), now=0)
+        self.scheduler.sync([self.fast], now=0)
+        self.tick(0)
+        self.assertEqual(self.calls, ['fast'])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
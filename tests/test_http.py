@@ -0,0 +1,44 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.utils.http import SessionRegistry
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+class SessionRegistryCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        self.registry = SessionRegistry(pool_connections=4, pool_maxsize=2)
+
+    def tearDown(self):
+        self.registry.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused_and_counted(self):
+        session = self.registry.session('health')
+        self.assertIs(self.registry.session('health'), session)
+        for _ in range(5):
+            self.assertEqual(session.get(self.url, timeout=5).text, 'ok')
+
+        stats = self.registry.stats()['health']
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 4)
+        self.assertEqual(len(stats['hosts']), 1)
+        self.assertEqual(stats['pool_maxsize'], 2)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
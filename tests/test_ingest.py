@@ -0,0 +1,154 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from app import create_app
+from app.ingest import MetricBuffer, write_metric_rows
+from app.models import db, Server, SystemMetric, NetworkMetric, MetricRollup1m, MetricRollup1h, ServerLatestMetric
+from app.rollups import select_resolution
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+
+def system_row(server_id, timestamp, cpu):
+    return {
+        'server_id': server_id,
+        'timestamp': timestamp,
+        'cpu_percent': cpu,
+        'memory_total': 100,
+        'memory_used': 50,
+        'memory_percent': 50.0
+    }
+
+class MetricBufferCase(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime.now(timezone.utc)
+
+    def test_flush_threshold(self):
+        buffer = MetricBuffer(flush_rows=2, flush_interval=3600)
+        buffer.add(SystemMetric, system_row(1, self.now, 10.0))
+        self.assertFalse(buffer.should_flush())
+        buffer.add(SystemMetric, system_row(1, self.now, 20.0))
+        self.assertTrue(buffer.should_flush())
+        batches = buffer.drain()
+        self.assertEqual(len(batches[SystemMetric]), 2)
+        self.assertEqual(len(buffer), 0)
+
+    def test_drop_policy_bounds_memory(self):
+        buffer = MetricBuffer(max_rows=3, policy='drop')
+        for i in range(5):
+            buffer.add(SystemMetric, system_row(1, self.now + timedelta(seconds=i), float(i)))
+        rows = buffer.drain()[SystemMetric]
+        self.assertEqual([r['cpu_percent'] for r in rows], [2.0, 3.0, 4.0])
+        self.assertEqual(buffer.dropped, 2)
+
+    def test_aggregate_policy_merges_oldest(self):
+        buffer = MetricBuffer(max_rows=3, policy='aggregate')
+        for i in range(4):
+            buffer.add(SystemMetric, system_row(1, self.now + timedelta(seconds=i), float(i * 10)))
+        rows = buffer.drain()[SystemMetric]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['cpu_percent'], 5.0)
+        self.assertEqual(rows[0]['timestamp'], self.now)
+        self.assertEqual(buffer.aggregated, 1)
+
+    def test_sustained_overflow_degrades_to_coarser_resolution(self):
+        buffer = MetricBuffer(max_rows=8, policy='aggregate')
+        for i in range(40):
+            buffer.add(SystemMetric, system_row(1, self.now + timedelta(seconds=i), float(i)))
+        rows = buffer.drain()[SystemMetric]
+        self.assertLessEqual(len(rows), 8)
+        self.assertEqual(buffer.dropped, 0)
+
+        # Every row is the plain mean of the consecutive samples it covers,
+        # stamped with the first of them, and together they cover all 40
+        start = 0
+        for row in rows:
+            samples = row.get('_samples', 1)
+            self.assertEqual(samples & (samples - 1), 0)  # 1, 2, 4, ... never an unbounded fold
+            self.assertEqual(row['timestamp'], self.now + timedelta(seconds=start))
+            self.assertAlmostEqual(row['cpu_percent'], start + (samples - 1) / 2)
+            start += samples
+        self.assertEqual(start, 40)
+        self.assertGreater(rows[0].get('_samples', 1), rows[-1].get('_samples', 1))
+
+class WriteMetricRowsCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(config_object=TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.server = Server(name='web-1', hostname='web-1', api_key='key')
+        db.session.add(self.server)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_merged_rows_keep_their_weight_in_rollups(self):
+        now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        merged = dict(system_row(self.server.id, now, 30.0), _samples=4)
+        write_metric_rows({SystemMetric: [merged, system_row(self.server.id, now, 80.0)]})
+        rollup = MetricRollup1m.query.filter_by(server_id=self.server.id, metric='cpu_percent').one()
+        self.assertEqual(rollup.sample_count, 5)
+        self.assertAlmostEqual(rollup.value_sum / rollup.sample_count, 40.0)
+        self.assertEqual(SystemMetric.query.count(), 2)
+
+    def test_bulk_insert_and_last_seen(self):
+        now = datetime.now(timezone.utc)
+        written = write_metric_rows({
+            SystemMetric: [system_row(self.server.id, now - timedelta(seconds=5), 10.0),
+                           system_row(self.server.id, now, 20.0)],
+            NetworkMetric: [{'server_id': self.server.id, 'timestamp': now,
+                             'bytes_sent': 1, 'bytes_recv': 2}]
+        })
+        self.assertEqual(written, 3)
+        self.assertEqual(SystemMetric.query.count(), 2)
+        self.assertEqual(NetworkMetric.query.count(), 1)
+        db.session.refresh(self.server)
+        last_seen = self.server.last_seen.replace(tzinfo=timezone.utc)
+        self.assertGreaterEqual(last_seen, now)
+
+        # Replayed (old) or future-dated samples: last_seen is the receive time
+        write_metric_rows({SystemMetric: [system_row(self.server.id, now - timedelta(hours=1), 10.0),
+                                          system_row(self.server.id, now + timedelta(hours=1), 10.0)]})
+        db.session.refresh(self.server)
+        self.assertGreaterEqual(self.server.last_seen.replace(tzinfo=timezone.utc), last_seen)
+        self.assertLess(self.server.last_seen.replace(tzinfo=timezone.utc), now + timedelta(minutes=1))
+
+    def test_rollups_merge_across_flushes(self):
+        bucket = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+        write_metric_rows({SystemMetric: [system_row(self.server.id, bucket + timedelta(seconds=5), 10.0),
+                                          system_row(self.server.id, bucket + timedelta(seconds=10), 30.0)]})
+        write_metric_rows({SystemMetric: [system_row(self.server.id, bucket + timedelta(seconds=15), 20.0)]})
+
+        rollup = MetricRollup1m.query.filter_by(server_id=self.server.id, metric='cpu_percent').one()
+        self.assertEqual(rollup.sample_count, 3)
+        self.assertEqual(rollup.value_avg, 20.0)
+        self.assertEqual(rollup.value_min, 10.0)
+        self.assertEqual(rollup.value_max, 30.0)
+        self.assertEqual(rollup.value_last, 20.0)
+        self.assertEqual(MetricRollup1h.query.filter_by(metric='cpu_percent').count(), 1)
+
+    def test_latest_values_ignore_late_rows(self):
+        now = datetime.now(timezone.utc)
+        write_metric_rows({SystemMetric: [system_row(self.server.id, now, 42.0)]})
+        # A backfilled batch with older samples must not replace the current value
+        write_metric_rows({SystemMetric: [system_row(self.server.id, now - timedelta(minutes=5), 99.0)]})
+
+        self.assertEqual(db.session.get(ServerLatestMetric, (self.server.id, 'cpu_percent')).value, 42.0)
+        self.assertEqual(db.session.get(ServerLatestMetric, (self.server.id, 'memory_percent')).value, 50.0)
+        self.assertIsNone(db.session.get(ServerLatestMetric, (self.server.id, 'bytes_sent')))
+
+    def test_select_resolution(self):
+        self.assertIsNone(select_resolution(3600, 500))
+        self.assertEqual(select_resolution(24 * 3600, 500).label, '1m')
+        self.assertEqual(select_resolution(7 * 24 * 3600, 500).label, '5m')
+        self.assertEqual(select_resolution(30 * 24 * 3600, 500).label, '1h')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,49 @@
+import unittest
+from app import create_app
+from app.leader import DatabaseLeaseBackend, LeaderElector
+from app.models import db, SchedulerLease
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+
+class LeaderElectionCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(config_object=TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        backend = DatabaseLeaseBackend()
+        self.leader = LeaderElector(backend, ttl=30, holder='worker-1')
+        self.follower = LeaderElector(backend, ttl=30, holder='worker-2')
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_only_one_holder(self):
+        self.assertTrue(self.leader.acquire('collect_metrics'))
+        self.assertFalse(self.follower.acquire('collect_metrics'))
+        # Re-acquiring our own lease extends it
+        self.assertTrue(self.leader.acquire('collect_metrics'))
+        # Leases are per job
+        self.assertTrue(self.follower.acquire('check_alerts'))
+
+    def test_failover_after_expiry(self):
+        self.leader.ttl = -1
+        self.assertTrue(self.leader.acquire('collect_metrics'))
+        self.assertTrue(self.follower.acquire('collect_metrics'))
+        self.leader.renew_all()
+        self.assertNotIn('collect_metrics', self.leader.held)
+        self.assertEqual(db.session.get(SchedulerLease, 'collect_metrics').holder, 'worker-2')
+
+    def test_release_hands_over(self):
+        self.assertTrue(self.leader.acquire('health_checks'))
+        self.leader.release_all()
+        self.assertTrue(self.follower.acquire('health_checks'))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
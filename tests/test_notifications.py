@@ -0,0 +1,53 @@
+import threading
+import time
+import unittest
+from flask import Flask
+from app.notifications import NotificationDispatcher, parse_channel_limits
+
+class NotificationDispatcherCase(unittest.TestCase):
+    def setUp(self):
+        self.dispatcher = NotificationDispatcher(workers=3, max_queue=10, channel_limits={'email': 1},
+                                                 max_attempts=3, backoff_base=0.01)
+        self.dispatcher.start(Flask(__name__))
+
+    def tearDown(self):
+        self.dispatcher.stop(1)
+
+    def test_retries_with_backoff_then_gives_up(self):
+        attempts = []
+        self.dispatcher.submit('slack', lambda: attempts.append(1) or False)
+        self.assertTrue(self.dispatcher.drain(5))
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(self.dispatcher.stats()['failed'], 1)
+
+    def test_hanging_channel_does_not_block_others(self):
+        release = threading.Event()
+        done = []
+        self.dispatcher.submit('email', lambda: release.wait(5))
+        self.dispatcher.submit('email', lambda: done.append('email') or True)
+        self.dispatcher.submit('slack', lambda: done.append('slack') or True)
+        deadline = time.monotonic() + 2
+        while 'slack' not in done and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # The second email waits for the single email slot; slack goes straight through
+        self.assertEqual(done, ['slack'])
+        # ...parked until the slot is released, not re-polled
+        self.assertEqual(self.dispatcher.stats()['waiting'], 1)
+        self.assertEqual(self.dispatcher.stats()['retrying'], 0)
+        release.set()
+        self.assertTrue(self.dispatcher.drain(5))
+        self.assertEqual(done, ['slack', 'email'])
+
+    def test_full_queue_rejects(self):
+        self.dispatcher.stop(0)
+        dispatcher = NotificationDispatcher(max_queue=1)
+        self.assertTrue(dispatcher.submit('email', lambda: True))
+        self.assertFalse(dispatcher.submit('email', lambda: True))
+        self.assertEqual(dispatcher.stats()['rejected'], 1)
+
+    def test_parse_channel_limits(self):
+        self.assertEqual(parse_channel_limits('email:2, slack:4'), {'email': 2, 'slack': 4})
+        self.assertEqual(parse_channel_limits(''), {})
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,152 @@
+import threading
+import time
+import unittest
+from agent.server import SnapshotCache, make_server
+from app import create_app
+from app.models import db, Server, SystemMetric, NetworkMetric, User
+from app.poller import RemoteMetricsCache, RemotePoller, RemoteTarget
+from app.tasks import poll_remote_servers
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    REMOTE_POLL_INTERVAL = 5
+    REMOTE_POLL_TIMEOUT = 1
+
+def sample():
+    return {
+        'timestamp': time.time(),
+        'system': {'cpu_percent': 12.5, 'memory_total': 100, 'memory_used': 40, 'memory_percent': 40.0},
+        'network': {'bytes_sent': 1, 'bytes_recv': 2}
+    }
+
+class RemotePollerCase(unittest.TestCase):
+    def test_polls_concurrently_within_deadline(self):
+        poller = RemotePoller(max_workers=25)
+        def fetch(target):
+            if target.id == 0:
+                time.sleep(2)  # a hung host
+            time.sleep(0.2)
+            return {'id': target.id}
+        poller.fetch = fetch
+        targets = [RemoteTarget(i, f'host-{i}', f'host-{i}', 'key') for i in range(50)]
+        start = time.monotonic()
+        samples, errors = poller.poll(targets, deadline=1)
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertEqual(len(samples), 49)
+        self.assertIn(0, errors)
+        poller.shutdown()
+
+class RemoteMetricsCacheCase(unittest.TestCase):
+    def test_concurrent_callers_share_one_fetch(self):
+        cache = RemoteMetricsCache()
+        calls = []
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'cpu': {'percent': len(calls)}}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get(1, fetch, ttl=5)))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sum(fetched for _, fetched in results), 1)
+        self.assertEqual({snapshot.data['cpu']['percent'] for snapshot, _ in results}, {1})
+
+        # Fresh enough: served from the cache; stale: fetched again
+        snapshot, fetched = cache.get(1, fetch, ttl=5)
+        self.assertFalse(fetched)
+        self.assertGreaterEqual(cache.age(snapshot), 0.0)
+        snapshot, fetched = cache.get(1, fetch, ttl=0)
+        self.assertTrue(fetched)
+        self.assertEqual(snapshot.data['cpu']['percent'], 2)
+
+    def test_failures_are_shared_but_not_cached(self):
+        cache = RemoteMetricsCache()
+        def fail():
+            time.sleep(0.1)
+            raise ConnectionError('agent down')
+
+        errors = []
+        def call():
+            try:
+                cache.get(1, fail)
+            except ConnectionError as e:
+                errors.append(e)
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 5)
+
+        snapshot, fetched = cache.get(1, lambda: {'ok': True})
+        self.assertTrue(fetched)
+
+class PollRemoteServersCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(config_object=TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.agent = make_server(('127.0.0.1', 0), 'agent-key', {
+            '/api/sample': SnapshotCache(sample, max_age=0),
+            '/api/metrics': SnapshotCache(lambda: {'cpu': {'percent': 12.5}}, max_age=0)
+        })
+        threading.Thread(target=self.agent.serve_forever, daemon=True).start()
+        self.up = Server(name='up', hostname=f'127.0.0.1:{self.agent.server_address[1]}',
+                         api_key='agent-key', is_active=True)
+        self.down = Server(name='down', hostname='127.0.0.1:1', api_key='other', is_active=True)
+        db.session.add_all([self.up, self.down])
+        db.session.commit()
+
+    def tearDown(self):
+        self.agent.shutdown()
+        self.agent.server_close()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_stores_history_for_reachable_servers(self):
+        self.assertEqual(poll_remote_servers(), 1)
+        self.assertEqual(SystemMetric.query.filter_by(server_id=self.up.id).count(), 1)
+        self.assertEqual(NetworkMetric.query.filter_by(server_id=self.up.id).count(), 1)
+        self.assertEqual(SystemMetric.query.filter_by(server_id=self.down.id).count(), 0)
+        db.session.expire_all()
+        self.assertIsNotNone(db.session.get(Server, self.up.id).last_seen)
+
+        # Polling does not count as pushing: the next round scrapes it again
+        self.assertEqual(poll_remote_servers(), 1)
+
+    def test_skips_servers_that_push(self):
+        response = self.app.test_client().post('/api/ingest', json={'samples': [sample()]},
+                                               headers={'X-API-Key': 'agent-key'})
+        self.assertEqual(response.status_code, 200)
+        db.session.expire_all()
+        self.assertIsNotNone(db.session.get(Server, self.up.id).last_push_at)
+        self.assertEqual(poll_remote_servers(), 0)
+
+    def test_viewing_a_pull_mode_server_does_not_stop_polling(self):
+        user = User(username='viewer', email='viewer@example.com')
+        user.set_password('viewer')
+        db.session.add(user)
+        db.session.commit()
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'viewer', 'password': 'viewer'})
+
+        response = client.get(f'/api/metrics?server_id={self.up.id}')
+        self.assertEqual(response.get_json()['cpu']['percent'], 12.5)
+        db.session.expire_all()
+        self.assertIsNone(db.session.get(Server, self.up.id).last_seen)
+
+        self.assertEqual(poll_remote_servers(), 1)
+        self.assertEqual(SystemMetric.query.filter_by(server_id=self.up.id).count(), 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
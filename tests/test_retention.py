@@ -0,0 +1,77 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from app import create_app
+from app.models import db, Server, SystemMetric, NetworkMetric, AlertRule, AlertHistory, MetricRollup1m
+from app.retention import delete_in_chunks, is_partitioned, run_retention
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    DATA_RETENTION_DAYS = 30
+    RETENTION_CHUNK_SIZE = 50
+    RETENTION_CHUNK_PAUSE = 0
+
+class RetentionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(config_object=TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.now = datetime.now(timezone.utc)
+        server = Server(name='web', hostname='web', api_key='key')
+        db.session.add(server)
+        db.session.flush()
+        self.server_id = server.id
+
+        # 240 expired and 60 current samples per table
+        for i in range(300):
+            timestamp = self.now - timedelta(days=40 if i < 240 else 1, seconds=i)
+            db.session.add(SystemMetric(server_id=server.id, timestamp=timestamp, cpu_percent=1.0,
+                                        memory_total=1, memory_used=1, memory_percent=1.0))
+            db.session.add(NetworkMetric(server_id=server.id, timestamp=timestamp, bytes_sent=1, bytes_recv=1))
+        rule = AlertRule(name='cpu', metric_type='cpu', threshold=90, comparison='>', user_id=1)
+        db.session.add(rule)
+        db.session.flush()
+        db.session.add_all([
+            AlertHistory(rule_id=rule.id, server_id=server.id, metric_value=95, triggered_at=self.now - timedelta(days=100)),
+            AlertHistory(rule_id=rule.id, server_id=server.id, metric_value=95, triggered_at=self.now - timedelta(days=10)),
+            MetricRollup1m(server_id=server.id, metric='cpu_percent', bucket=self.now - timedelta(days=31),
+                           sample_count=1, value_sum=1.0),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_run_retention_deletes_expired_rows_in_chunks(self):
+        self.assertFalse(is_partitioned('system_metrics'))
+        report = run_retention(self.app.config, now=self.now)
+        self.assertEqual(report['system_metrics'], {'partitions_dropped': 0, 'rows_deleted': 240, 'complete': True})
+        self.assertEqual(report['network_metrics']['rows_deleted'], 240)
+        self.assertEqual(report['metric_rollups_1m']['rows_deleted'], 1)
+        self.assertEqual(report['alert_history']['rows_deleted'], 1)
+        self.assertEqual(SystemMetric.query.count(), 60)
+        self.assertEqual(NetworkMetric.query.count(), 60)
+        self.assertEqual(AlertHistory.query.count(), 1)
+
+        # Nothing left to do on the next run
+        report = run_retention(self.app.config, now=self.now)
+        self.assertEqual(report['system_metrics']['rows_deleted'], 0)
+
+    def test_time_budget_stops_between_chunks(self):
+        cutoff = self.now - timedelta(days=30)
+        deleted, complete = delete_in_chunks(SystemMetric, SystemMetric.timestamp, cutoff,
+                                             chunk_size=50, deadline=0)
+        self.assertEqual((deleted, complete), (50, False))
+        self.assertEqual(SystemMetric.query.count(), 250)
+
+        deleted, complete = delete_in_chunks(SystemMetric, SystemMetric.timestamp, cutoff, chunk_size=50)
+        self.assertEqual((deleted, complete), (190, True))
+        self.assertEqual(SystemMetric.query.count(), 60)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,7 +1,12 @@
 import unittest
+import math
+import gzip
 import json
+from datetime import datetime, timedelta, timezone
 from app import create_app
-from app.models import db, User, ServiceHealth
+from app.series import decode_msgpack
+from app.models import (db, User, UserPreference, ServiceHealth, Server, SystemMetric, NetworkMetric,
+                        AlertRule, AlertHistory, MetricRollup1m)
 from config import Config
 
 class TestConfig(Config):
@@ -58,6 +63,256 @@ class RoutesTestCase(unittest.TestCase):
         data = json.loads(response.data)
         self.assertIn('cpu', data)
         self.assertIn('memory', data)
+        self.assertIn('age', data['snapshot'])
+
+    def test_metrics_fields(self):
+        self.login('admin', 'admin')
+        data = json.loads(self.client.get('/api/metrics?fields=cpu,memory').data)
+        self.assertEqual(set(data), {'cpu', 'memory', 'snapshot'})
+
+        response = self.client.get('/api/metrics?fields=cpu,sockets')
+        self.assertEqual(response.status_code, 400)
+
+        stats = json.loads(self.client.get('/api/metrics/collectors').data)['collectors']
+        self.assertEqual(set(stats), {'cpu', 'memory', 'disk', 'io', 'network', 'connections'})
+        self.assertGreaterEqual(stats['cpu']['calls'], 1)
+
+    def test_metrics_history_uses_rollups_for_long_ranges(self):
+        self.login('admin', 'admin')
+        response = self.client.get('/api/metrics/history?hours=720')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['resolution'], '1h')
+
+        response = self.client.get('/api/metrics/history?hours=1')
+        self.assertEqual(json.loads(response.data)['resolution'], 'raw')
+
+        response = self.client.get('/api/metrics/history?resolution=2m')
+        self.assertEqual(response.status_code, 400)
+
+    def test_metrics_history_downsamples_to_preference(self):
+        self.login('admin', 'admin')
+        server = Server.query.filter_by(is_local=True).first()
+        start = datetime.now(timezone.utc) - timedelta(minutes=50)
+        db.session.add_all([
+            SystemMetric(server_id=server.id, timestamp=start + timedelta(seconds=i), cpu_percent=95.0 if i == 777 else 10.0,
+                         memory_total=1, memory_used=1, memory_percent=50.0)
+            for i in range(2000)
+        ])
+        db.session.add(UserPreference(user_id=User.query.first().id, chart_data_points=120))
+        db.session.commit()
+
+        data = json.loads(self.client.get('/api/metrics/history?hours=1&resolution=raw').data)
+        self.assertEqual(data['total_points'], 2000)
+        self.assertLessEqual(len(data['data']), 120)
+        self.assertEqual(data['downsample'], 'lttb')
+        self.assertIn(95.0, [point['cpu_percent'] for point in data['data']])
+
+        data = json.loads(self.client.get('/api/metrics/history?hours=1&resolution=raw&max_points=5000').data)
+        self.assertEqual(len(data['data']), 2000)
+        self.assertIsNone(data['downsample'])
+
+        response = self.client.get('/api/metrics/history?hours=1&downsample=average')
+        self.assertEqual(response.status_code, 400)
+
+    def test_metrics_history_since_cursor(self):
+        self.login('admin', 'admin')
+        server = Server.query.filter_by(is_local=True).first()
+        start = datetime.now(timezone.utc) - timedelta(minutes=10)
+
+        def add_samples(offsets):
+            db.session.add_all([
+                SystemMetric(server_id=server.id, timestamp=start + timedelta(seconds=i), cpu_percent=float(i),
+                             memory_total=1, memory_used=1, memory_percent=50.0)
+                for i in offsets
+            ])
+            db.session.commit()
+
+        add_samples(range(5))
+        response = self.client.get('/api/metrics/history?hours=1&resolution=raw')
+        data = json.loads(response.data)
+        self.assertEqual(len(data['data']), 5)
+        etag = response.headers['ETag']
+
+        # Nothing new: 304 both for the full window and for the cursor
+        response = self.client.get('/api/metrics/history?hours=1&resolution=raw', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        url = f"/api/metrics/history?hours=1&since={data['next_cursor']}"
+        response = self.client.get(url)
+        self.assertEqual(json.loads(response.data)['data'], [])
+        response = self.client.get(url, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        # Only the new rows come back, including one sharing the last timestamp
+        add_samples([4, 5, 6])
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        delta = json.loads(response.data)
+        self.assertEqual(delta['resolution'], 'raw')
+        self.assertEqual([point['cpu_percent'] for point in delta['data']], [4.0, 5.0, 6.0])
+        response = self.client.get(f"/api/metrics/history?hours=1&since={delta['next_cursor']}")
+        self.assertEqual(json.loads(response.data)['data'], [])
+
+        since = (start + timedelta(seconds=5)).isoformat()
+        response = self.client.get('/api/metrics/history', query_string={'hours': 1, 'resolution': 'raw', 'since': since})
+        self.assertEqual([point['cpu_percent'] for point in json.loads(response.data)['data']], [6.0])
+
+        response = self.client.get('/api/metrics/history?since=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+    def test_metrics_history_since_cursor_resends_open_bucket(self):
+        self.login('admin', 'admin')
+        server = Server.query.filter_by(is_local=True).first()
+        bucket = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(minutes=5)
+        rollup = MetricRollup1m(server_id=server.id, metric='cpu_percent', bucket=bucket, sample_count=1,
+                                value_sum=10.0, value_min=10.0, value_max=10.0, value_last=10.0, last_at=bucket)
+        db.session.add(rollup)
+        db.session.commit()
+
+        data = json.loads(self.client.get('/api/metrics/history?hours=1&resolution=1m').data)
+        self.assertEqual(len(data['data']), 1)
+
+        response = self.client.get('/api/metrics/history?hours=1&resolution=1m')
+        etag = response.headers['ETag']
+        # Rewritten in place with the same sample count: the ETag must change
+        rollup.value_sum, rollup.value_last = 20.0, 10.0
+        db.session.commit()
+        response = self.client.get('/api/metrics/history?hours=1&resolution=1m', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+        rollup.sample_count, rollup.value_sum = 2, 30.0
+        db.session.commit()
+        delta = json.loads(self.client.get(f"/api/metrics/history?hours=1&since={data['next_cursor']}").data)
+        self.assertEqual(delta['resolution'], '1m')
+        self.assertEqual([point['cpu_percent'] for point in delta['data']], [15.0])
+
+    def test_alert_history_since_cursor(self):
+        self.login('admin', 'admin')
+        server = Server.query.filter_by(is_local=True).first()
+        rule = AlertRule(name='cpu', metric_type='cpu', threshold=90, comparison='>', user_id=User.query.first().id)
+        db.session.add(rule)
+        db.session.commit()
+
+        def add_alert(value):
+            db.session.add(AlertHistory(rule_id=rule.id, server_id=server.id, metric_value=value, message='high'))
+            db.session.commit()
+
+        add_alert(91.0)
+        response = self.client.get('/api/alerts/history')
+        data = json.loads(response.data)
+        self.assertEqual(len(data['history']), 1)
+        response = self.client.get('/api/alerts/history', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        # The notification worker marks delivery after the row was created
+        AlertHistory.query.update({'email_sent': True})
+        db.session.commit()
+        response = self.client.get('/api/alerts/history', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.data)['history'][0]['email_sent'])
+
+        add_alert(95.0)
+        delta = json.loads(self.client.get(f"/api/alerts/history?since={data['next_cursor']}").data)
+        self.assertEqual([h['metric_value'] for h in delta['history']], [95.0])
+        delta = json.loads(self.client.get(f"/api/alerts/history?since={delta['next_cursor']}").data)
+        self.assertEqual(delta['history'], [])
+
+        # More new alerts than the limit: paged forward, none skipped
+        cursor = delta['next_cursor']
+        for value in range(5):
+            add_alert(float(value))
+        seen = []
+        for _ in range(3):
+            page = json.loads(self.client.get(f"/api/alerts/history?limit=2&since={cursor}").data)
+            seen.extend(h['metric_value'] for h in page['history'])
+            cursor = page['next_cursor']
+        self.assertEqual(seen, [0.0, 1.0, 2.0, 3.0, 4.0])
+
+    def test_metrics_history_columnar_formats(self):
+        self.login('admin', 'admin')
+        server = Server.query.filter_by(is_local=True).first()
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        db.session.add_all([
+            SystemMetric(server_id=server.id, timestamp=start + timedelta(seconds=i), cpu_percent=float(i),
+                         memory_total=1, memory_used=1, memory_percent=50.0, cpu_temp_c=None if i == 1 else 40.0)
+            for i in range(3)
+        ])
+        bucket = start.replace(minute=0)
+        for metric, value in (('cpu_percent', 20.0), ('memory_percent', 50.0)):
+            db.session.add(MetricRollup1m(server_id=server.id, metric=metric, bucket=bucket, sample_count=2,
+                                          value_sum=2 * value, value_min=value - 1, value_max=value + 1,
+                                          value_last=value, last_at=bucket))
+        db.session.commit()
+        query = {'hours': 24 * 365, 'since': '2025-12-31T23:59:00Z', 'resolution': 'raw'}
+
+        data = json.loads(self.client.get('/api/metrics/history', query_string=dict(query, format='columns')).data)
+        self.assertEqual(data['data']['t'], [1767225600.0, 1767225601.0, 1767225602.0])
+        self.assertEqual(data['data']['cpu_percent'], [0.0, 1.0, 2.0])
+        self.assertEqual(data['data']['cpu_temp_c'], [40.0, None, 40.0])
+        self.assertEqual(data['total_points'], 3)
+
+        response = self.client.get('/api/metrics/history', query_string=dict(query, format='msgpack'))
+        self.assertEqual(response.mimetype, 'application/msgpack')
+        document = decode_msgpack(response.data)
+        self.assertEqual(document['resolution'], 'raw')
+        self.assertEqual(document['data']['t'].dtype.str, '<f8')
+        self.assertEqual(document['data']['cpu_percent'].tolist(), [0.0, 1.0, 2.0])
+        self.assertTrue(math.isnan(document['data']['cpu_temp_c'][1]))
+
+        # Rollups: same keys as the row layout
+        query['resolution'] = '1m'
+        rows = json.loads(self.client.get('/api/metrics/history', query_string=query).data)['data']
+        columns = json.loads(self.client.get('/api/metrics/history', query_string=dict(query, format='columns')).data)['data']
+        self.assertEqual(columns['t'], [1767225600.0])
+        for key, value in rows[0].items():
+            if key != 'timestamp':
+                self.assertEqual(columns[key], [value])
+
+        response = self.client.get('/api/metrics/history?format=xml')
+        self.assertEqual(response.status_code, 400)
+
+    def test_ingest_batch_from_agent(self):
+        server = Server(name='web-1', hostname='web-1', api_key='agent-key', is_active=True)
+        db.session.add(server)
+        db.session.commit()
+        samples = [{
+            'timestamp': 1767225600 + i * 5,
+            'system': {'cpu_percent': 10.0 + i, 'memory_total': 100, 'memory_used': 50, 'memory_percent': 50.0},
+            'network': {'bytes_sent': 1000 * i, 'bytes_recv': 2000 * i}
+        } for i in range(3)]
+
+        response = self.client.post('/api/ingest', json={'samples': samples}, headers={'X-API-Key': 'wrong'})
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.post(
+            '/api/ingest', data=gzip.compress(json.dumps({'samples': samples}).encode()),
+            headers={'X-API-Key': 'agent-key', 'Content-Encoding': 'gzip', 'Content-Type': 'application/json'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), {'accepted': 3, 'rows': 6})
+        self.assertEqual(SystemMetric.query.filter_by(server_id=server.id).count(), 3)
+        self.assertEqual(NetworkMetric.query.filter_by(server_id=server.id).count(), 3)
+        db.session.expire_all()
+        last_seen = db.session.get(Server, server.id).last_seen.replace(tzinfo=timezone.utc)
+        self.assertGreater(last_seen, datetime.now(timezone.utc) - timedelta(minutes=1))
+
+        response = self.client.post('/api/ingest', json={'samples': [{'system': {'cpu_percent': 'high'}}]},
+                                    headers={'X-API-Key': 'agent-key'})
+        self.assertEqual(response.status_code, 400)
+
+        # Non-finite values and out-of-range timestamps are rejected, not a 500
+        for body in ('{"samples": [{"timestamp": 1e300}]}', '{"samples": [{"timestamp": Infinity}]}',
+                     '{"samples": [{"network": {"bytes_sent": Infinity, "bytes_recv": 1}}]}'):
+            response = self.client.post('/api/ingest', data=body, content_type='application/json',
+                                        headers={'X-API-Key': 'agent-key'})
+            self.assertEqual(response.status_code, 400, body)
+
+        # A small gzip body must not inflate past INGEST_MAX_BODY_BYTES
+        self.app.config['INGEST_MAX_BODY_BYTES'] = 1024
+        response = self.client.post(
+            '/api/ingest', data=gzip.compress(b' ' * 10 ** 6),
+            headers={'X-API-Key': 'agent-key', 'Content-Encoding': 'gzip', 'Content-Type': 'application/json'}
+        )
+        self.assertEqual(response.status_code, 413)
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
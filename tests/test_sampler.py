@@ -0,0 +1,110 @@
+import time
+import unittest
+from collections import namedtuple
+from unittest import mock
+from app.sampler import MetricsSampler
+from agent.cpu import CpuSampler
+
+cputimes = namedtuple('scputimes', ['user', 'system', 'idle', 'iowait', 'steal'])
+
+
+class MetricsSamplerCase(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+        self.collected = []
+
+        def collect(fields=None):
+            self.calls += 1
+            self.collected.append(fields)
+            data = {'cpu': {'percent': float(self.calls)}, 'connections': {'total': 1}}
+            return {key: value for key, value in data.items() if fields is None or key in fields}
+
+        self.sampler = MetricsSampler(collect=collect, interval=60)
+
+    def test_fresh_snapshot_is_reused(self):
+        first = self.sampler.get_snapshot()
+        second = self.sampler.get_snapshot()
+        self.assertIs(first, second)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_snapshot_is_resampled(self):
+        first = self.sampler.get_snapshot()
+        second = self.sampler.get_snapshot(max_age=-1)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(second.data['cpu']['percent'], 2.0)
+        self.assertGreaterEqual(second.timestamp, first.timestamp)
+
+    def test_snapshot_is_read_only(self):
+        snapshot = self.sampler.get_snapshot()
+        with self.assertRaises(TypeError):
+            snapshot.data['cpu'] = {}
+
+    def test_only_requested_fields_are_collected(self):
+        snapshot = self.sampler.get_snapshot(fields=['cpu'])
+        self.assertEqual(list(snapshot.data), ['cpu'])
+        self.assertEqual(self.collected, [['cpu']])
+        self.assertIs(self.sampler.get_snapshot(fields=['cpu']), snapshot)
+
+        # A field the snapshot lacks is sampled once, together with the wanted ones
+        snapshot = self.sampler.get_snapshot(fields=['connections'])
+        self.assertEqual(self.collected[-1], ['connections', 'cpu'])
+        self.assertIs(self.sampler.get_snapshot(fields=['cpu']), snapshot)
+
+        # Demand expires after the window; a request without fields wants everything
+        later = time.monotonic() + self.sampler.demand_window + 1
+        with mock.patch('app.sampler.time.monotonic', return_value=later):
+            self.assertEqual(self.sampler.wanted(), set())
+        self.sampler.want(None)
+        self.assertIsNone(self.sampler.wanted())
+        self.assertEqual(set(self.sampler.get_snapshot().data), {'cpu', 'connections'})
+
+    def test_idle_sampler_collects_nothing(self):
+        self.sampler.start(interval=0.01)
+        try:
+            self.sampler._stop_event.wait(0.05)
+        finally:
+            self.sampler.stop(timeout=1)
+        self.assertEqual(self.calls, 0)
+
+    def test_background_thread_publishes_snapshots(self):
+        self.sampler.want(['cpu'])
+        self.sampler.start(interval=0.01)
+        try:
+            for _ in range(100):
+                if self.sampler.latest() is not None:
+                    break
+                self.sampler._stop_event.wait(0.01)
+            self.assertIsNotNone(self.sampler.latest())
+        finally:
+            self.sampler.stop(timeout=1)
+        self.assertFalse(self.sampler.running)
+
+
+
+class CpuSamplerCase(unittest.TestCase):
+    def sample(self, cpu_sampler, total, per_core):
+        with mock.patch('psutil.cpu_times', side_effect=lambda percpu=False: per_core if percpu else total):
+            return cpu_sampler.sample()
+
+    def test_utilisation_between_ticks(self):
+        cpu_sampler = CpuSampler()
+        self.sample(cpu_sampler, cputimes(10, 10, 80, 0, 0),
+                    [cputimes(5, 5, 40, 0, 0), cputimes(5, 5, 40, 0, 0)])
+        result = self.sample(cpu_sampler, cputimes(40, 20, 110, 20, 10),
+                             [cputimes(35, 10, 45, 10, 0), cputimes(5, 10, 65, 10, 10)])
+        # 100 ticks elapsed: 30 user + 10 system + 10 steal busy, 30 idle, 20 iowait
+        self.assertEqual(result['percent'], 50.0)
+        self.assertEqual(result['iowait'], 20.0)
+        self.assertEqual(result['steal'], 10.0)
+        self.assertEqual(result['per_core'], [70.0, 30.0])
+
+    def test_does_not_block(self):
+        cpu_sampler = CpuSampler()
+        with mock.patch('time.sleep') as sleep:
+            cpu_sampler.sample()
+            cpu_sampler.sample()
+        sleep.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+from app import create_app
+from app.models import db, User, Server
+from app.sampler import MetricsSampler
+from app.stream import HEARTBEAT, MetricsBroadcaster, broadcaster
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    STREAM_MAX_DURATION = 0.5
+
+def parse_frame(frame):
+    fields = dict(line.split(': ', 1) for line in frame.decode().strip().split('\n'))
+    return fields['event'], json.loads(fields['data'])
+
+class MetricsBroadcasterCase(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+        def collect(fields=None):
+            self.calls += 1
+            return {'cpu': {'percent': float(self.calls)}}
+        self.sampler = MetricsSampler(collect=collect, interval=60)
+        self.broadcaster = MetricsBroadcaster(max_subscribers=3)
+        self.sampler.listeners.append(self.broadcaster.publish)
+
+    def test_snapshot_is_encoded_once_for_all_subscribers(self):
+        subscriptions = [self.broadcaster.subscribe() for _ in range(3)]
+        with mock.patch.object(MetricsBroadcaster, 'encode', wraps=MetricsBroadcaster.encode) as encode:
+            self.sampler.sample()
+        self.assertEqual(encode.call_count, 1)
+        frames = [subscription.next(0) for subscription in subscriptions]
+        self.assertTrue(all(frame is frames[0] for frame in frames))
+        event, data = parse_frame(frames[0])
+        self.assertEqual(event, 'metrics')
+        self.assertEqual(data['cpu']['percent'], 1.0)
+        self.assertIn('age', data['snapshot'])
+
+        # Full: further clients are refused
+        self.assertIsNone(self.broadcaster.subscribe())
+        self.broadcaster.unsubscribe(subscriptions[0])
+        self.assertIsNotNone(self.broadcaster.subscribe())
+
+    def test_slow_subscriber_only_keeps_newest_frame(self):
+        subscription = self.broadcaster.subscribe()
+        for _ in range(50):
+            self.sampler.sample()
+        _, data = parse_frame(subscription.next(0))
+        self.assertEqual(data['cpu']['percent'], 50.0)
+        self.assertEqual(subscription.skipped, 49)
+        self.assertIsNone(subscription.next(0))
+
+    def test_stream_sends_heartbeats_and_ends(self):
+        subscription = self.broadcaster.subscribe()
+        threading.Timer(0.15, self.sampler.sample).start()
+        started = time.monotonic()
+        chunks = list(self.broadcaster.stream(subscription, heartbeat=0.05, max_duration=0.4))
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(chunks[0], b'retry: 3000\n\n')
+        self.assertIn(HEARTBEAT, chunks)
+        self.assertEqual(sum(1 for chunk in chunks if chunk.startswith(b'id: ')), 1)
+        self.assertEqual(self.broadcaster.stats()['subscribers'], 0)
+
+class StreamRouteCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(config_object=TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        user = User(username='admin', email='admin@example.com', is_admin=True)
+        user.set_password('admin')
+        self.remote = Server(name='remote', hostname='10.0.0.2', api_key='key', is_local=False)
+        db.session.add_all([user, self.remote])
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.client.post('/auth/login', data={'username': 'admin', 'password': 'admin'})
+
+    def tearDown(self):
+        broadcaster.close()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_stream_serves_snapshots(self):
+        response = self.client.get('/api/stream/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        frames = [frame for frame in response.data.split(b'\n\n') if frame.startswith(b'id: ')]
+        self.assertGreaterEqual(len(frames), 1)
+        event, data = parse_frame(frames[0])
+        self.assertIn('cpu', data)
+        self.assertEqual(broadcaster.stats()['subscribers'], 0)
+
+    def test_remote_server_is_refused(self):
+        response = self.client.get(f'/api/stream/metrics?server_id={self.remote.id}')
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)